@@ -1,7 +1,7 @@
 import logging
 
 from argparse import Namespace
-from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 
 try:
     from botocore import client as Client
@@ -17,8 +17,13 @@ except ImportError:  # pragma: no cover
 
 
 from .config import Profile, error_handler
-from .exceptions import AlreadyLoggedIn, AlreadyLoggedOut
-from .saml import authenticate, refresh
+from .exceptions import (
+    AWSCLILogin,
+    AlreadyLoggedIn,
+    AlreadyLoggedOut,
+    LoginsFailed,
+)
+from .saml import SamlResponse, authenticate, refresh
 from ._typing import Role
 from .util import (
     get_selection,
@@ -27,8 +32,9 @@ from .util import (
 logger = logging.getLogger(__package__)
 
 
-def save_sts_token(profile: Profile, client: Client, saml: str,
-                   role: Role, duration: int = 0) -> datetime:
+def assume_role_with_saml(client: Client, saml: str, role: Role,
+                          duration: int = 0) -> Dict:
+    """ Return an STS token for `role` obtained with a SAML assertion. """
     params = dict(
         RoleArn=role[1],
         PrincipalArn=role[0],
@@ -43,13 +49,55 @@ def save_sts_token(profile: Profile, client: Client, saml: str,
 
     token = client.assume_role_with_saml(**params)
     logger.info("Retrieved temporary Amazon credentials for role: " + role[1])
+    return token
+
+
+def save_sts_token(profile: Profile, client: Client, saml: str,
+                   role: Role, duration: int = 0) -> Dict:
+    token = assume_role_with_saml(client, saml, role, duration)
     profile.save_credentials(token, role)
     return token
 
 
-def login(profile: Profile, session: Session, interactive: bool = True):
-    session.set_credentials(None, None)  # Disable credential lookup
-    client = session.create_client('sts')
+def idp_login(profile: Profile,
+              interactive: bool = True) -> SamlResponse:
+    """Log in to the IdP of `profile`.
+
+    Cookies are tried first. If they are refused, and `interactive` is
+    True, the user's credentials are used instead.
+
+    Returns:
+        The SAML response, which unpacks to a base 64 encoded SAML
+        assertion string, and a list of tuples containing a SAML
+        provider ARN and a role ARN.
+    """
+    try:
+        return refresh(
+            profile.ecp_endpoint_url,
+            profile.cookies,
+            profile.verify_ssl_certificate,
+            timeout=profile.timeout,
+            max_attempts=profile.max_attempts,
+            assertion_file=profile.assertion_file,
+        )
+    except Exception:
+        if interactive:
+            creds = profile.get_credentials()
+            return authenticate(profile.ecp_endpoint_url,
+                                profile.cookies, *creds,
+                                profile.verify_ssl_certificate,
+                                timeout=profile.timeout,
+                                max_attempts=profile.max_attempts,
+                                assertion_file=profile.assertion_file)
+        else:
+            raise
+
+
+def login(profile: Profile, session: Session, interactive: bool = True,
+          client: Optional[Client] = None):
+    if client is None:
+        session.set_credentials(None, None)  # Disable credential lookup
+        client = session.create_client('sts')
 
     # Exit if already logged in
     if interactive:
@@ -64,20 +112,7 @@ def login(profile: Profile, session: Session, interactive: bool = True):
         # Must know username to lookup cookies
         profile.get_username()
 
-    try:
-        saml, roles = refresh(
-            profile.ecp_endpoint_url,
-            profile.cookies,
-            profile.verify_ssl_certificate,
-        )
-    except Exception:
-        if interactive:
-            creds = profile.get_credentials()
-            saml, roles = authenticate(profile.ecp_endpoint_url,
-                                       profile.cookies, *creds,
-                                       profile.verify_ssl_certificate)
-        else:
-            raise
+    saml, roles = idp_login(profile, interactive)
 
     duration = profile.duration
     role = get_selection(roles, profile.role_arn, interactive,
@@ -86,6 +121,103 @@ def login(profile: Profile, session: Session, interactive: bool = True):
     return save_sts_token(profile, client, saml, role, duration)
 
 
+def _load_profiles(profile: Profile, failed: List[str]) -> List[Profile]:
+    """Return every login profile, reusing `profile` for its own.
+
+    The names of profiles that could not be loaded are appended to
+    `failed`.
+    """
+    from .aio import profile_names
+    from .credentials import LazySession
+
+    profiles = []
+    for name in profile_names():
+        if name == profile.name:
+            profiles.append(profile)
+            continue
+
+        try:
+            session = LazySession(name)
+            profiles.append(Profile(session, None))  # type: ignore[arg-type]
+        except AWSCLILogin as e:
+            logger.error(f"{name}: {e}")
+            failed.append(name)
+    return profiles
+
+
+def login_all(profile: Profile, session: Session) -> None:
+    """Log in to every login profile.
+
+    Profiles sharing an ECP endpoint and username are logged in with a
+    single IdP login, so the user is asked to authenticate at most
+    once per group. The roles of a group are then assumed concurrently
+    by aio.assume_roles.
+    Profiles that are already logged in are skipped unless
+    force_refresh is set on `profile`. Command line options only apply
+    to `profile`.
+
+    Raises:
+        LoginsFailed: If any profile could not be logged in.
+    """
+    import asyncio
+
+    from .aio import assume_roles
+
+    groups: Dict[Tuple[str, Optional[str]], List[Profile]] = {}
+    failed: List[str] = []
+    for member in _load_profiles(profile, failed):
+        try:
+            member.raise_if_logged_in()
+        except AlreadyLoggedIn:
+            if not profile.force_refresh:
+                logger.info(f"{member.name}: Already logged in")
+                continue
+        key = (member.ecp_endpoint_url, member.username)
+        groups.setdefault(key, []).append(member)
+
+    session.set_credentials(None, None)  # Disable credential lookup
+    client = session.create_client('sts')
+
+    for members in groups.values():
+        leader = profile if profile in members else members[0]
+        try:
+            leader.get_username()
+            saml, roles = idp_login(leader)
+        except Exception as e:
+            logger.error(f"{leader.ecp_endpoint_url}: {e}")
+            failed += [m.name for m in members]
+            continue
+
+        selected: List[Tuple[Profile, Role]] = []
+        for member in members:
+            member.username = leader.username
+            try:
+                role = get_selection(roles, member.role_arn, True,
+                                     member.account_names)
+                selected.append((member, role))
+            except AWSCLILogin as e:
+                logger.error(f"{member.name}: {e}")
+                failed.append(member.name)
+
+        results = asyncio.run(assume_roles(client, saml, selected))
+        for (member, _), result in zip(selected, results):
+            if isinstance(result, BaseException):
+                logger.error(f"{member.name}: {result}")
+                failed.append(member.name)
+
+    if failed:
+        raise LoginsFailed(failed)
+
+
+def login_args(args: Namespace):
+    nargs = Namespace()
+
+    nargs.all_profiles = args.all_profiles
+    del args.all_profiles
+
+    return nargs
+
+
 def logout_args(args: Namespace):
     nargs = Namespace()
 
@@ -106,6 +238,13 @@ def logout(profile: Profile, session: Session, xargs: Namespace,
     profile.remove_identity_files()
 
 
-@error_handler(skip_args=False, validate=True)
-def main(profile: Profile, session: Session, interactive: bool = True):
+@error_handler(skip_args=False, validate=True, extra_args_handler=login_args)
+def main(profile: Profile, session: Session, xargs: Namespace,
+         interactive: bool = True):
+    if xargs.all_profiles:
+        login_all(profile, session)
+        return
+
+    # Locking the profile while the user authenticates would stall aws
+    # commands refreshing it. Credentials are written atomically.
     login(profile, session, interactive)
@@ -1,5 +1,117 @@
-from typing import Dict, Tuple
+from typing import Any, Dict, Iterator, Optional, Tuple
 
 Headers = Dict[str, str]
 Creds = Tuple[str, str, Dict[str, str]]
 Role = Tuple[str, str]
+Timeout = Tuple[Optional[float], Optional[float]]  # (connect, read)
+
+# The (provider, role) pair at the start of a RoleArn
+_PAIR = slice(2)
+
+
+class RoleArn(Tuple[str, str]):
+    """A SAML provider ARN and a role ARN.
+
+    A RoleArn is a (provider, role) tuple, so it compares equal to,
+    hashes, iterates, unpacks and indexes like the tuples it replaces.
+    The partition, account id, path and name of the role are split
+    from its ARN once, on creation, and stored after the pair.
+
+    Args:
+        provider: The SAML provider ARN.
+        arn: The role ARN, arn:partition:iam::account:role/path/name.
+
+    Raises:
+        ValueError: If `arn` is not a role ARN.
+    """
+    __slots__ = ()
+
+    def __new__(cls, provider: str, arn: str) -> 'RoleArn':
+        parts = arn.split(':', 5)
+        if len(parts) != 6 or parts[0] != 'arn' or not parts[1] or \
+                parts[2] != 'iam' or parts[3] or not parts[4].isdigit() or \
+                not parts[5].startswith('role/') or \
+                parts[5].endswith('/') or ':' in parts[5]:
+            raise ValueError(f"Invalid role ARN: {arn}")
+        return cls._from_valid(provider, arn)
+
+    @classmethod
+    def _from_valid(cls, provider: str, arn: str) -> 'RoleArn':
+        """ Returns a RoleArn for a role ARN known to be valid. """
+        _, partition, _, _, account_id, resource = arn.split(':', 5)
+        i = resource.rindex('/') + 1
+        return tuple.__new__(cls, (provider, arn, partition, account_id,
+                                   resource[4:i], resource[i:]))
+
+    def __getnewargs__(self) -> Tuple[str, str]:
+        return self._pair()
+
+    @classmethod
+    def of(cls, role: Role) -> 'RoleArn':
+        """ Returns `role` as a RoleArn. """
+        return role if isinstance(role, cls) else cls(*role)
+
+    # The parsed parts are not part of the tuple's value
+    def _pair(self) -> Tuple[str, str]:
+        return tuple.__getitem__(self, _PAIR)  # type: ignore[return-value]
+
+    def __len__(self) -> int:
+        return 2
+
+    def __getitem__(self, key: Any) -> Any:
+        return self._pair()[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._pair())
+
+    def __contains__(self, item: object) -> bool:
+        return item in self._pair()
+
+    def __hash__(self) -> int:
+        return hash(self._pair())
+
+    def __eq__(self, other: object) -> bool:
+        return self._pair() == other
+
+    def __ne__(self, other: object) -> bool:
+        return self._pair() != other
+
+    def __lt__(self, other: Tuple[str, ...]) -> bool:
+        return self._pair() < other
+
+    def __le__(self, other: Tuple[str, ...]) -> bool:
+        return self._pair() <= other
+
+    def __gt__(self, other: Tuple[str, ...]) -> bool:
+        return self._pair() > other
+
+    def __ge__(self, other: Tuple[str, ...]) -> bool:
+        return self._pair() >= other
+
+    def __repr__(self) -> str:
+        return repr(self._pair())
+
+    @property
+    def provider(self) -> str:
+        return tuple.__getitem__(self, 0)
+
+    @property
+    def arn(self) -> str:
+        return tuple.__getitem__(self, 1)
+
+    @property
+    def partition(self) -> str:
+        return tuple.__getitem__(self, 2)
+
+    @property
+    def account_id(self) -> str:
+        return tuple.__getitem__(self, 3)
+
+    @property
+    def path(self) -> str:
+        """ The role's path, such as /division/, or / if it has none. """
+        return tuple.__getitem__(self, 4)
+
+    @property
+    def name(self) -> str:
+        return tuple.__getitem__(self, 5)
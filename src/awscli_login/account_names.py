@@ -4,14 +4,19 @@ import logging
 import os
 
 from argparse import Namespace
-from typing import List, Tuple
+from typing import List, Sequence, Tuple
 
 from botocore.session import Session
 
 from .config import error_handler, Profile
-from .exceptions import AlreadyLoggedOut, AuthnFailed, PleaseLogin
+from .exceptions import (
+    AlreadyLoggedOut,
+    AuthnFailed,
+    CookiesExpired,
+    PleaseLogin,
+)
 from .saml import refresh
-from ._typing import Role
+from ._typing import Role, RoleArn
 
 ACCT_FILE = os.path.join(os.path.expanduser("~"), '.aws-login', 'alias')
 ACCT_SECTION = "accounts"
@@ -73,13 +78,12 @@ def get_account_name(profile, session, sts, saml, role):
         return None
 
 
-def role_arns2accountid_role_arn_list(roles: List[Role]) \
+def role_arns2accountid_role_arn_list(roles: Sequence[Role]) \
         -> List[Tuple[str, Role]]:
     account_roles: List[Tuple[str, Role]] = []
 
     for role in roles:
-        account_id: str = role[1].split(':')[4]
-        account_roles.append((account_id, role))
+        account_roles.append((RoleArn.of(role).account_id, role))
 
     return account_roles
 
@@ -92,15 +96,19 @@ def _edit_account_names(profile: Profile, session: Session, xargs: Namespace):
     try:
         profile.raise_if_logged_out()
 
-        saml, roles = refresh(
+        response = refresh(
             profile.ecp_endpoint_url,
             profile.cookies,
             profile.verify_ssl_certificate,
+            timeout=profile.timeout,
+            max_attempts=profile.max_attempts,
+            assertion_file=profile.assertion_file,
         )
-    except (AlreadyLoggedOut, AuthnFailed):
+    except (AlreadyLoggedOut, AuthnFailed, CookiesExpired):
         raise PleaseLogin
 
-    account_roles = role_arns2accountid_role_arn_list(roles)
+    # The assertion is only encoded if an account name is looked up
+    account_roles = role_arns2accountid_role_arn_list(response.roles)
     accounts = {}
     missing = set()
 
@@ -109,7 +117,8 @@ def _edit_account_names(profile: Profile, session: Session, xargs: Namespace):
             if account_id in profile.account_names:  # Prefer custom name
                 name = profile.account_names[account_id]
             else:  # Lookup name on AWS if no custom name found
-                name = get_account_name(profile, session, sts, saml, role)
+                name = get_account_name(profile, session, sts,
+                                        response.assertion, role)
                 if not name:
                     logger.info("Unable to retrieve account name for "
                                 f"account {account_id} usring role {role[1]}")
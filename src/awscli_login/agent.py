@@ -0,0 +1,292 @@
+""" A long running agent that serves credentials over a Unix socket.
+
+The agent keeps login profiles, botocore sessions and STS clients in
+memory so that the credential_process does not pay for starting
+Python, importing botocore, and parsing configuration on every aws
+command. The client half of this module is imported by the
+credential_process and must only import the Python standard library.
+"""
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import threading
+
+from os import environ, path
+from typing import Any, Callable, Dict, Optional
+
+from .cache import login_root
+
+AGENT_DIR = 'awscli-login'
+AGENT_SOCKET = 'agent.sock'
+
+# Seconds a client waits for the agent to accept a request before
+# falling back to running the credential_process in-process. Once
+# accepted, the client waits as long as the agent says a login of the
+# profile may take.
+ACCEPT_TIMEOUT = 5
+
+# Seconds allowed for the call to STS, botocore's default connect and
+# read timeouts.
+STS_TIMEOUT = 120
+
+logger = logging.getLogger(__name__)
+
+
+def socket_path() -> Optional[str]:
+    """ Return the path to the agent socket, None if unsupported. """
+    runtime_dir = environ.get('XDG_RUNTIME_DIR')
+    if not runtime_dir or not hasattr(socket, 'AF_UNIX'):
+        return None
+
+    return path.join(runtime_dir, AGENT_DIR, AGENT_SOCKET)
+
+
+def request_credentials(name: str) -> Optional[int]:
+    """Print credentials for profile `name` retrieved from the agent.
+
+    Args:
+        name: The login profile name.
+
+    Returns:
+        The exit code returned by the agent, or None if the agent is
+        not running or declined the request.
+    """
+    spath = socket_path()
+    if spath is None:
+        return None
+
+    request = {'profile': name, 'root': login_root()}
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(ACCEPT_TIMEOUT)
+            s.connect(spath)
+            s.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            with s.makefile('rb') as f:
+                response = json.loads(f.readline())
+                if 'code' not in response:  # Accepted
+                    s.settimeout(response['timeout'])
+                    response = json.loads(f.readline())
+    except (KeyError, OSError, TypeError, ValueError):
+        return None
+
+    code = response.get('code')
+    if code == 0:
+        print(json.dumps(response['credentials']))
+    elif code is not None:
+        print(response['error'], file=sys.stderr)
+
+    return code
+
+
+def login_timeout(profile: Any) -> Optional[float]:
+    """Return the seconds a login by the agent may take, or None if the
+    profile's IdP requests do not time out.
+
+    The login waits for any process already refreshing the profile,
+    then makes up to max_attempts requests to the IdP, and calls STS.
+    """
+    from .lock import LOCK_TIMEOUT
+    from .saml import BACKOFF_MAX
+
+    connect, read = profile.timeout
+    if connect is None or read is None:
+        return None
+
+    attempts = max(1, profile.max_attempts)
+    return LOCK_TIMEOUT + attempts * (connect + read + BACKOFF_MAX) + \
+        STS_TIMEOUT
+
+
+class Agent:
+    """ Answers credential requests using profiles held in memory. """
+
+    class Entry:
+        """ A login profile with its botocore session and STS client. """
+
+        def __init__(self, name: str) -> None:
+            from botocore.session import Session
+            from .config import Profile
+
+            self.lock = threading.Lock()
+            self.session = Session(profile=name)
+            self.session.set_credentials(None, None)  # Disable lookup
+            self.profile = Profile(self.session, None, validate=False)
+            self.stamp = self._stamp()
+            self._sts = None
+
+        @property
+        def sts(self):
+            """ STS client created on first use then kept warm. """
+            if self._sts is None:
+                self._sts = self.session.create_client('sts')
+            return self._sts
+
+        def _stamp(self):
+            """ Return modification times of the profile's files. """
+            files = (self.profile.config_file,
+                     self.profile.credentials_file,
+                     self.profile.legacy_credentials_file,
+                     self.profile.alias_file)
+            return tuple(path.getmtime(f) if path.exists(f) else None
+                         for f in files)
+
+        def reload_if_changed(self) -> None:
+            """ Reload the profile if another process changed its files. """
+            stamp = self._stamp()
+            if stamp != self.stamp:
+                logger.info("Reloading login profile: " + self.profile.name)
+                self.profile.reload(validate=False)
+                self.stamp = stamp
+
+    def __init__(self) -> None:
+        self.root = login_root()
+        self._entries: Dict[str, Agent.Entry] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, name: str) -> 'Agent.Entry':
+        with self._lock:
+            if name not in self._entries:
+                self._entries[name] = Agent.Entry(name)
+            return self._entries[name]
+
+    def credentials(self, name: str,
+                    accept: Callable[[Optional[float]], None] = lambda t: None
+                    ) -> Dict[str, Any]:
+        """Return an agent response containing credentials for `name`.
+
+        Args:
+            name: The login profile name.
+            accept: Called with the seconds the response may take, once
+                the profile is loaded.
+        """
+        from .__main__ import login
+        from .config import ERROR_UNKNOWN
+        from .exceptions import AWSCLILogin
+
+        try:
+            entry = self._entry(name)
+            accept(login_timeout(entry.profile))
+            with entry.lock:
+                entry.reload_if_changed()
+                profile = entry.profile
+
+                profile.raise_if_logged_out()
+                if profile.are_credentials_expired():
+                    # Serialize with aws-login processes refreshing the
+                    # same profile, and reuse their credentials
+                    with profile.lock():
+                        profile.reload_credentials()
+                        if profile.are_credentials_expired():
+                            token = login(profile, entry.session,
+                                          interactive=False,
+                                          client=entry.sts)
+                        else:
+                            token = profile.load_credentials()
+                    entry.stamp = entry._stamp()
+                else:
+                    token = profile.load_credentials()
+        except AWSCLILogin as e:
+            logger.info(f"{name}: {e}")
+            return {'code': e.code, 'error': str(e)}
+        except Exception as e:
+            logger.error(f"{name}: {e}", exc_info=True)
+            return {'code': ERROR_UNKNOWN, 'error': str(e)}
+
+        creds = dict(token['Credentials'], Version=1)
+        creds['Expiration'] = creds['Expiration'].isoformat()
+        return {'code': 0, 'credentials': creds}
+
+    def handle(self, request: Dict[str, Any],
+               accept: Callable[[Optional[float]], None] = lambda t: None
+               ) -> Dict[str, Any]:
+        """ Return the response to a client request. """
+        if request.get('root') != self.root:
+            # Client uses a different AWSCLI_LOGIN_ROOT
+            return {'code': None}
+
+        return self.credentials(request['profile'], accept)
+
+
+class AgentRequestHandler(socketserver.StreamRequestHandler):
+    """ Reads one JSON request line and writes one JSON response line. """
+
+    def handle(self) -> None:
+        try:
+            request = json.loads(self.rfile.readline())
+            response = self.server.agent.handle(  # type: ignore
+                request, self.accept)
+        except (KeyError, TypeError, ValueError):
+            response = {'code': None}
+
+        self.write(response)
+
+    def accept(self, timeout: Optional[float]) -> None:
+        """ Tell the client how long the response may take. """
+        self.write({'timeout': timeout})
+
+    def write(self, message: Dict[str, Any]) -> None:
+        self.wfile.write(json.dumps(message).encode('utf-8') + b'\n')
+
+
+def _is_listening(spath: str) -> bool:
+    """ Return True if an agent is accepting connections on `spath`. """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(spath)
+        except OSError:
+            return False
+    return True
+
+
+def make_server(spath: str) -> socketserver.BaseServer:
+    """Bind an agent to the Unix socket `spath`.
+
+    Raises:
+        AgentUnavailable: If another agent is listening on `spath`.
+    """
+    from .exceptions import AgentUnavailable
+
+    os.makedirs(path.dirname(spath), mode=0o700, exist_ok=True)
+    if path.exists(spath):
+        if _is_listening(spath):
+            raise AgentUnavailable(f"already running on {spath}")
+        os.remove(spath)  # Left behind by a dead agent
+
+    server = socketserver.ThreadingUnixStreamServer(  # type: ignore
+        spath, AgentRequestHandler)
+    server.daemon_threads = True
+    server.agent = Agent()  # type: ignore[attr-defined]
+    os.chmod(spath, 0o600)
+
+    return server
+
+
+def serve(verbose: int = 0) -> int:
+    """ Run the credential agent until interrupted. """
+    from .exceptions import AgentUnavailable, AWSCLILogin
+    from .logger import configConsoleLogger
+
+    configConsoleLogger(verbose)
+    spath = socket_path()
+
+    try:
+        if spath is None:
+            raise AgentUnavailable("XDG_RUNTIME_DIR is not set.")
+        server = make_server(spath)
+    except AWSCLILogin as e:
+        logger.error(str(e))
+        return e.code
+
+    logger.info("Credential agent listening on: " + spath)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Received interrupt. Shutting down...")
+    finally:
+        server.server_close()
+        os.remove(spath)
+
+    return 0
@@ -0,0 +1,223 @@
+""" An asyncio login pipeline refreshing many profiles in one process.
+
+botocore is synchronous and awscli_login does not depend on an asyncio
+HTTP client, so the blocking stages of a login, the ECP exchange with
+the IdP and the call to STS, each run in a worker thread while the
+event loop interleaves the stages of other profiles. Connections to
+each IdP are pooled, and a semaphore bounds how many profiles log in
+at once.
+
+Example:
+    >>> results = asyncio.run(refresh_profiles(['dev', 'prod']))
+"""
+import asyncio
+import logging
+
+from configparser import ConfigParser
+from os import path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from botocore.session import Session
+
+from . import saml
+from .cache import login_root
+from .config import Profile
+from .const import CONFIG_FILE, CONNECT_TIMEOUT, MAX_ATTEMPTS, READ_TIMEOUT
+from .lock import FileLock
+from ._typing import Headers, Role, Timeout
+from .util import get_selection
+
+# Default number of profiles logging in at once.
+CONCURRENCY = 10
+
+logger = logging.getLogger(__name__)
+
+
+def profile_names() -> List[str]:
+    """ Return the names of the profiles in ~/.aws-login/config. """
+    config = ConfigParser()
+    config.read(path.join(login_root(), CONFIG_FILE))
+    return config.sections()
+
+
+async def refresh(url: str, cookies: str, verify_cert: bool = True,
+                  timeout: Timeout = (CONNECT_TIMEOUT, READ_TIMEOUT),
+                  max_attempts: int = MAX_ATTEMPTS,
+                  assertion_file: Optional[str] = None
+                  ) -> saml.SamlResponse:
+    """ Awaitable saml.refresh. """
+    return await asyncio.to_thread(saml.refresh, url, cookies, verify_cert,
+                                   timeout, max_attempts, assertion_file)
+
+
+async def authenticate(url: str, cookies: str, username: str, password: str,
+                       headers: Headers, verify_cert: bool = True,
+                       timeout: Timeout = (CONNECT_TIMEOUT, READ_TIMEOUT),
+                       max_attempts: int = MAX_ATTEMPTS,
+                       assertion_file: Optional[str] = None
+                       ) -> saml.SamlResponse:
+    """ Awaitable saml.authenticate. """
+    return await asyncio.to_thread(saml.authenticate, url, cookies, username,
+                                   password, headers, verify_cert, timeout,
+                                   max_attempts, assertion_file)
+
+
+async def save_sts_token(profile: Profile, client: Any, saml: str,
+                         role: Role, duration: int = 0) -> Any:
+    """ Awaitable awscli_login.__main__.save_sts_token. """
+    from .__main__ import save_sts_token
+
+    return await asyncio.to_thread(save_sts_token, profile, client, saml,
+                                   role, duration)
+
+
+def _assume_role(profile: Profile, client: Any, saml: str,
+                 role: Role) -> Any:
+    """ Assume `role` and save the token to `profile` while locked. """
+    from .__main__ import assume_role_with_saml
+
+    token = assume_role_with_saml(client, saml, role, profile.duration)
+    with profile.lock():
+        profile.write_identity_files(role)
+        profile.save_credentials(token, role)
+    return token
+
+
+async def assume_roles(client: Any, saml: str,
+                       selected: Iterable[Tuple[Profile, Role]],
+                       concurrency: int = CONCURRENCY) -> List[Any]:
+    """Assume the role selected for each profile with one assertion.
+
+    Args:
+        client: An STS client without credentials.
+        saml: A base 64 encoded SAML assertion.
+        selected: Each profile and the role to assume for it.
+        concurrency: Maximum number of roles being assumed at once.
+
+    Returns:
+        The STS token saved to each profile, or the exception raised
+        assuming its role.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def assume(profile: Profile, role: Role) -> Any:
+        async with semaphore:
+            return await asyncio.to_thread(_assume_role, profile, client,
+                                           saml, role)
+
+    return await asyncio.gather(
+        *(assume(profile, role) for profile, role in selected),
+        return_exceptions=True)
+
+
+async def login(profile: Profile, client: Any) -> Any:
+    """Log in non-interactively using the cookies of `profile`.
+
+    Args:
+        profile: The login profile.
+        client: An STS client without credentials.
+
+    Returns:
+        The STS token, which is also saved to the profile.
+    """
+    assertion, roles = await refresh(
+        profile.ecp_endpoint_url, profile.cookies,
+        profile.verify_ssl_certificate, profile.timeout, profile.max_attempts,
+        profile.assertion_file)
+
+    role = get_selection(roles, profile.role_arn, False,
+                         profile.account_names)
+    await asyncio.to_thread(profile.write_identity_files, role)
+    return await save_sts_token(profile, client, assertion, role,
+                                profile.duration)
+
+
+def _load(name: str) -> Tuple[Profile, Any]:
+    """ Return the login profile `name` and an STS client for it. """
+    session = Session(profile=name)
+    session.set_credentials(None, None)  # Disable credential lookup
+    profile = Profile(session, None)
+    profile.raise_if_logged_out()
+    return profile, session.create_client('sts')
+
+
+def _reload_expired(profile: Profile) -> bool:
+    """ Reload `profile` and return True if its credentials expired. """
+    profile.reload_credentials()
+    return profile.are_credentials_expired()
+
+
+async def _acquire(lock: FileLock) -> bool:
+    """Awaitable lock.acquire.
+
+    If the caller is cancelled while the worker thread waits, the lock
+    is released as soon as the thread takes it.
+    """
+    def release(future: 'asyncio.Future[bool]') -> None:
+        if not future.cancelled() and future.exception() is None:
+            lock.release()
+
+    acquiring = asyncio.ensure_future(asyncio.to_thread(lock.acquire))
+    try:
+        return await asyncio.shield(acquiring)
+    except asyncio.CancelledError:
+        acquiring.add_done_callback(release)
+        raise
+
+
+async def refresh_profile(name: str,
+                          semaphore: Optional[asyncio.Semaphore] = None,
+                          ) -> Any:
+    """Return unexpired credentials for `name`, logging in if needed.
+
+    Like credentials.fetch_credentials, logins take turns with other
+    processes refreshing the same profile. Profiles are read and
+    written in worker threads, since waiting on their files blocks.
+
+    Args:
+        name: The login profile name.
+        semaphore: Bounds the number of concurrent logins.
+
+    Returns:
+        The profile's STS token.
+    """
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(1)
+
+    async with semaphore:
+        profile, client = await asyncio.to_thread(_load, name)
+        if not profile.are_credentials_expired():
+            return profile.load_credentials()
+
+        lock = profile.lock()
+        await _acquire(lock)
+        try:
+            if not await asyncio.to_thread(_reload_expired, profile):
+                return profile.load_credentials()
+
+            logger.info("Refreshing credentials for profile: " + name)
+            return await login(profile, client)
+        finally:
+            lock.release()
+
+
+async def refresh_profiles(names: Iterable[str],
+                           concurrency: int = CONCURRENCY,
+                           ) -> Dict[str, Any]:
+    """Refresh the credentials of many profiles concurrently.
+
+    Args:
+        names: Login profile names.
+        concurrency: Maximum number of profiles logging in at once.
+
+    Returns:
+        The STS token of each profile, or the exception raised
+        refreshing it.
+    """
+    names = list(names)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    results = await asyncio.gather(
+        *(refresh_profile(name, semaphore) for name in names),
+        return_exceptions=True)
+
+    return dict(zip(names, results))
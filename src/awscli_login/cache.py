@@ -0,0 +1,212 @@
+""" Import-light access to the cached STS credentials.
+
+This module is loaded by the credential_process on every aws command
+that uses a login profile. It must only import modules from the Python
+standard library so that a cache hit never pays for botocore, lxml,
+requests, or keyring.
+"""
+import json
+import os
+
+from configparser import ConfigParser
+from datetime import datetime
+from os import environ, path
+from os.path import expanduser
+from struct import Struct
+from time import time
+from typing import Dict, Optional, Tuple
+
+from .const import CACHE_DIR, CREDENTIALS_DIR, CREDENTIALS_FILE, LOCK_DIR
+
+# Each file in ~/.aws-login/cache holds the credential_process output
+# for one profile, prefixed by a header containing a magic number, the
+# credentials' expiration, and the time after which they should be
+# refreshed in the background. Times are seconds since the epoch.
+MAGIC = b'AWL1'
+HEADER = Struct('<4sdd')
+
+# Seconds after which a background refresh lock is considered stale.
+# A failed refresh leaves its lock in place, so this is also the delay
+# before the next attempt.
+REFRESH_LOCK_TIMEOUT = 60
+
+
+def login_root() -> str:
+    """ Return the directory containing ~/.aws-login. """
+    root = environ.get('AWSCLI_LOGIN_ROOT')
+    return root if root is not None else expanduser('~')
+
+
+def load_cached_credentials(name: str) -> Optional[Dict]:
+    """Return unexpired credentials cached for profile `name`.
+
+    Args:
+        name: The login profile name.
+
+    Returns:
+        A credentials token, or None if the profile is logged out,
+        expired, or its cached credentials are incomplete.
+    """
+    root = login_root()
+    config = ConfigParser()
+    if not config.read(path.join(root, CREDENTIALS_DIR, name)):
+        # Not yet migrated to per-profile credentials files
+        config.read(path.join(root, CREDENTIALS_FILE))
+
+    if not config.has_section(name):
+        return None
+
+    profile = config[name]
+    if not profile.get('aws_role_arn'):
+        return None
+
+    try:
+        expiration = datetime.fromisoformat(profile['expiration'])
+        if expiration <= datetime.now(tz=expiration.tzinfo):
+            return None
+
+        return {
+            'Credentials': {
+                'AccessKeyId': profile['aws_access_key_id'],
+                'SecretAccessKey': profile['aws_secret_access_key'],
+                'SessionToken': profile['aws_session_token'],
+                'Expiration': expiration,
+            }
+        }
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def render_credentials(token: Dict) -> str:
+    """ Return the credential_process JSON output for `token`. """
+    creds = dict(token['Credentials'], Version=1)
+    try:
+        creds['Expiration'] = creds['Expiration'].isoformat()
+    except AttributeError:
+        pass  # Expiration is already a string
+
+    return json.dumps(creds)
+
+
+def _timestamp(expiration) -> float:
+    """ Return a datetime or ISO 8601 string as seconds since the epoch. """
+    if isinstance(expiration, str):
+        expiration = datetime.fromisoformat(expiration)
+    return expiration.timestamp()
+
+
+def write_atomic(filename: str, data: bytes) -> None:
+    """Replace the contents of a file with `data` atomically.
+
+    Readers see either the old or the new contents, never a partial
+    write, even if the writer crashes. The file is written with
+    mode 600.
+    """
+    from tempfile import mkstemp
+
+    # Each writer, including each thread, gets its own temporary file
+    fd, tmp = mkstemp(prefix=path.basename(filename) + '.', suffix='.tmp',
+                      dir=path.dirname(filename) or None)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, filename)
+    except BaseException:
+        remove_cache(tmp)
+        raise
+
+
+def write_cache(filename: str, token: Dict, refresh_ahead: int = 0) -> None:
+    """Pre-render the credential_process output for `token`.
+
+    The file is written atomically with mode 600.
+
+    Args:
+        filename: Path to the profile's cache file.
+        token: A credentials token as returned by STS.
+        refresh_ahead: Seconds before expiration to start refreshing
+            the credentials in the background. At most half of the
+            remaining lifetime of the credentials is used.
+    """
+    now = time()
+    expiration = _timestamp(token['Credentials']['Expiration'])
+    refresh = max(expiration - refresh_ahead, (now + expiration) / 2)
+    write_atomic(filename, HEADER.pack(MAGIC, expiration, refresh) +
+                 (render_credentials(token) + '\n').encode('utf-8'))
+
+
+def read_cache(filename: str) -> Tuple[Optional[str], bool]:
+    """Return pre-rendered credential_process output.
+
+    Args:
+        filename: Path to the profile's cache file.
+
+    Returns:
+        The cached output, or None if it is missing, invalid, or the
+        credentials have expired. The second value is True if the
+        credentials should be refreshed in the background.
+    """
+    try:
+        with open(filename, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None, False
+
+    if len(data) < HEADER.size:
+        return None, False
+
+    now = time()
+    magic, expiration, refresh = HEADER.unpack_from(data)
+    if magic != MAGIC or expiration <= now:
+        return None, False
+
+    return data[HEADER.size:].decode('utf-8'), refresh <= now
+
+
+def remove_cache(filename: str) -> None:
+    """ Remove a cache file if it exists. """
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
+
+
+def cache_file(name: str) -> str:
+    """ Return the path to the cache file of profile `name`. """
+    return path.join(login_root(), CACHE_DIR, name)
+
+
+def refresh_lock_file(name: str) -> str:
+    """ Return the path to the background refresh lock of `name`. """
+    return path.join(login_root(), LOCK_DIR, name + '.refresh')
+
+
+def acquire_refresh_lock(name: str) -> bool:
+    """Take the background refresh lock of profile `name`.
+
+    Returns:
+        True if the lock was taken, False if another process holds it.
+    """
+    filename = refresh_lock_file(name)
+    os.makedirs(path.dirname(filename), mode=0o700, exist_ok=True)
+
+    for _ in range(2):
+        try:
+            os.close(os.open(filename, os.O_CREAT | os.O_EXCL, 0o600))
+            return True
+        except FileExistsError:
+            try:
+                if time() - path.getmtime(filename) < REFRESH_LOCK_TIMEOUT:
+                    return False
+            except FileNotFoundError:
+                continue  # Released while we looked at it
+            remove_cache(filename)  # Stale lock
+
+    return False
+
+
+def release_refresh_lock(name: str) -> None:
+    """ Release the background refresh lock of profile `name`. """
+    remove_cache(refresh_lock_file(name))
@@ -1,4 +1,5 @@
 """ This module is used to process ~/.aws-login/config """
+import hashlib
 import logging
 import os
 import sys
@@ -10,31 +11,30 @@ from configparser import ConfigParser, SectionProxy
 from datetime import datetime
 from functools import partial, wraps
 from getpass import getuser, getpass
+from io import StringIO
 from os import environ, makedirs, path
 from os.path import expanduser
 from pathlib import Path
-from typing import Any, Dict, FrozenSet, Optional
+from typing import TYPE_CHECKING, Any, Dict, FrozenSet, Optional
 from urllib.parse import urlparse
 
-try:
-    from awscli.customizations.configure.writer import ConfigFileWriter
-except ImportError:  # pragma: no cover
-    pass
-
-try:
-    from botocore.session import Session
-except ImportError:  # pragma: no cover
-    class Session():  # type: ignore
-        pass
-
-try:
-    from keyring import get_password, set_password
-except ImportError:  # pragma: no cover
-    pass
-
+from .cache import remove_cache, write_atomic, write_cache
 from .const import (
+    ACCT_ALIAS_FILE,
+    ASSERTION_DIR,
+    CACHE_DIR,
+    CONFIG_DIR,
+    CONFIG_FILE,
+    CONNECT_TIMEOUT,
+    CREDENTIALS_DIR,
+    CREDENTIALS_FILE,
     DUO_HEADER_FACTOR,
     DUO_HEADER_PASSCODE,
+    IDENTITY_DIR,
+    JAR_DIR,
+    LOCK_DIR,
+    MAX_ATTEMPTS,
+    READ_TIMEOUT,
 )
 from .exceptions import (
     AWSCLILogin,
@@ -42,21 +42,21 @@ from .exceptions import (
     AlreadyLoggedOut,
     ExistingTape,
     InvalidFactor,
+    InvalidProfileValue,
     MissingTape,
     ProfileMissingArgs,
     ProfileNotFound,
     VcrFailedToLoad,
 )
+from .lock import FileLock
 from .logger import configConsoleLogger
-from .util import secure_touch, config_vcr
-from ._typing import Creds, Role
+from ._typing import Creds, Role, RoleArn
 
-CONFIG_DIR = '.aws-login'
-CONFIG_FILE = path.join(CONFIG_DIR, 'config')
-JAR_DIR = path.join(CONFIG_DIR, 'cookies')
-CREDENTIALS_FILE = path.join(CONFIG_DIR, 'credentials')
-ACCT_ALIAS_FILE = path.join(CONFIG_DIR, 'alias')
-IDENTITY_DIR = path.join(CONFIG_DIR, 'identity')
+# Profiles are loaded by the credential_process to check for unexpired
+# credentials, so botocore, awscli, and keyring are only imported when
+# they are used.
+if TYPE_CHECKING:  # pragma: no cover
+    from botocore.session import Session
 
 ERROR_NONE = 0
 ERROR_UNKNOWN = 1
@@ -67,6 +67,20 @@ DISABLE = ["0", "no", "false", "off", "disable"]
 logger = logging.getLogger(__name__)
 
 
+def get_password(service: str, username: str) -> Optional[str]:
+    """ Lazily imported keyring.get_password. """
+    from keyring import get_password
+
+    return get_password(service, username)
+
+
+def set_password(service: str, username: str, password: str) -> None:
+    """ Lazily imported keyring.set_password. """
+    from keyring import set_password
+
+    set_password(service, username, password)
+
+
 class Profile:
     """
     This class reads the current login profile from ~/.aws-login/config
@@ -89,9 +103,15 @@ class Profile:
     http_header_factor: str
     http_header_passcode: str
     verify_ssl_certificate: bool = True
+    refresh_ahead: int = 0
+    connect_timeout: float = CONNECT_TIMEOUT
+    read_timeout: float = READ_TIMEOUT
+    max_attempts: int = MAX_ATTEMPTS
+    cache_saml_assertion: bool = False
 
     # path to profile configuration file
     config_file: str
+    credentials_dir: str
     credentials_file: str
     alias_file: str
 
@@ -113,6 +133,11 @@ class Profile:
             'http_header_factor': None,
             'http_header_passcode': None,
             'verify_ssl_certificate': True,
+            'refresh_ahead': 0,
+            'connect_timeout': CONNECT_TIMEOUT,
+            'read_timeout': READ_TIMEOUT,
+            'max_attempts': MAX_ATTEMPTS,
+            'cache_saml_assertion': False,
     }
 
     _cli_only: Dict[str, Any] = {
@@ -140,14 +165,23 @@ class Profile:
 
         self.home = root if root is not None else expanduser('~')
         self.config_file = path.join(self.home, CONFIG_FILE)
-        self.credentials_file = path.join(self.home, CREDENTIALS_FILE)
+        self.credentials_dir = path.join(self.home, CREDENTIALS_DIR)
+        self.credentials_file = path.join(self.credentials_dir, self.name)
+        self.legacy_credentials_file = path.join(self.home, CREDENTIALS_FILE)
         self.alias_file = path.join(self.home, ACCT_ALIAS_FILE)
         self.identity_dir = path.join(self.home, IDENTITY_DIR, self.name)
         self.identity_role_file = path.join(self.identity_dir, 'role')
         self.identity_acct_file = path.join(self.identity_dir, 'acct')
+        self.cache_dir = path.join(self.home, CACHE_DIR)
+        self.cache_file = path.join(self.cache_dir, self.name)
+        self.lock_file = path.join(self.home, LOCK_DIR, self.name)
+        self.credentials_lock_file = self.legacy_credentials_file + '.lock'
 
         makedirs(path.join(self.home, CONFIG_DIR), mode=0o700, exist_ok=True)
         makedirs(path.join(self.home, JAR_DIR), mode=0o700, exist_ok=True)
+        makedirs(path.join(self.home, LOCK_DIR), mode=0o700, exist_ok=True)
+        makedirs(self.credentials_dir, mode=0o700, exist_ok=True)
+        makedirs(self.cache_dir, mode=0o700, exist_ok=True)
 
     def _set_attrs(self, validate: bool) -> None:
         """ Load login profile from configuration. """
@@ -189,7 +223,7 @@ class Profile:
             if value:
                 setattr(self, attr, False)
 
-    def __init__(self, session: Session, args: Optional[Namespace],
+    def __init__(self, session: 'Session', args: Optional[Namespace],
                  validate: bool = True) -> None:
         """Load login profile.
 
@@ -218,13 +252,32 @@ class Profile:
                 return path.join(self.home, JAR_DIR, filename)
             else:
                 return None
+        elif item == 'assertion_file':
+            if self.cache_saml_assertion:
+                return self._assertion_file(self.username)
+            else:
+                return None
+        elif item == 'timeout':
+            # A timeout of zero waits forever
+            return (self.connect_timeout or None, self.read_timeout or None)
         else:
             mesg = "'%s' object has no attribute '%s'"
             raise AttributeError(mesg % (self.__class__.__name__, item))
 
     def __dir__(self):
         """ Allows dir to work with dynamic attributes. """
-        return super().__dir__() + ['cookies']
+        return super().__dir__() + ['assertion_file', 'cookies', 'timeout']
+
+    def _assertion_file(self, username: Optional[str]) -> Optional[str]:
+        """ Return the file caching assertions of `username` from the IdP. """
+        if not username or not self.ecp_endpoint_url:
+            return None
+
+        # Keyed by endpoint, since usernames are only unique per IdP
+        url = self.ecp_endpoint_url.encode('utf-8')
+        digest = hashlib.sha256(url).hexdigest()[:16]
+        filename = f'{username}.{digest}.json'
+        return path.join(self.home, ASSERTION_DIR, filename)
 
     def raise_if_logged_in(self) -> None:
         """ Throws an exception if already logged in. """
@@ -290,10 +343,13 @@ class Profile:
                 # Type cast string to correct type
                 # based on the default value
                 if value != default:
-                    if type(default) is bool:
-                        value = section.getboolean(attr)
-                    elif type(default) is int:
-                        value = int(value)
+                    try:
+                        if type(default) is bool:
+                            value = section.getboolean(attr)
+                        elif type(default) in (int, float):
+                            value = type(default)(value)
+                    except ValueError:
+                        raise InvalidProfileValue(self.name, attr, value)
             else:
                 value = default
 
@@ -387,6 +443,9 @@ class Profile:
     # TODO Add validation...
     def update(self) -> None:
         """ Interactively update the profile. """
+        from awscli.customizations.configure.writer import ConfigFileWriter
+        from .util import secure_touch
+
         new_values = {}
         writer = ConfigFileWriter()
 
@@ -417,15 +476,34 @@ class Profile:
         self._set_attrs_from_credentials_file()
         self._set_attrs_from_alias_file()
 
-    def are_credentials_expired(self) -> bool:
-        """ Return True if credentials are expired. """
+    def lock(self) -> FileLock:
+        """Return a lock serializing logins to this profile.
+
+        Example:
+            >>> with profile.lock():
+            ...     profile.reload_credentials()
+        """
+        return FileLock(self.lock_file)
+
+    def reload_credentials(self) -> None:
+        """ Reloads credentials from ~/.aws-login/credentials.d. """
+        self._set_attrs_from_credentials_file()
+
+    def are_credentials_expired(self, window: int = 0) -> bool:
+        """Return True if credentials are expired.
+
+        Args:
+            window: Also return True if the credentials expire within
+                this many seconds.
+        """
         creds = self._profile_credentials
         if creds is None:
             return True
 
         try:
             expiration = datetime.fromisoformat(creds['expiration'])
-            if expiration > datetime.now(tz=expiration.tzinfo):
+            now = datetime.now(tz=expiration.tzinfo)
+            if (expiration - now).total_seconds() > window:
                 return False
         except (ValueError, TypeError, KeyError) as e:
             logger.debug(f"Invalid or missing credentials: {e}")
@@ -451,26 +529,63 @@ class Profile:
             return None
 
     def _write_credentials_obj(self, message: str):
-        """ Write _credentials_obj to ~/.aws-login/credentials. """
-        with open(self.credentials_file, 'w') as configfile:
-            self._credentials_obj.write(configfile)
-            logger.info(message)
+        """ Write _credentials_obj to ~/.aws-login/credentials.d. """
+        _write_credentials(self.credentials_file, self._credentials_obj)
+        logger.info(message)
+
+    def _write_cache(self, token: Dict) -> None:
+        """ Pre-render credential_process output to ~/.aws-login/cache. """
+        try:
+            write_cache(self.cache_file, token, self.refresh_ahead)
+        except (OSError, ValueError) as e:
+            logger.info(f"Unable to cache credentials: {e}")
+            remove_cache(self.cache_file)
 
     def remove_all_credentials(self) -> None:
-        """ Remove all Amazon tokens & roles in ~/.aws-login/credentials. """
+        """ Remove all Amazon tokens & roles in ~/.aws-login/credentials.d. """
+        from .saml import forget_assertions
+
+        for filename in os.listdir(self.cache_dir):
+            remove_cache(path.join(self.cache_dir, filename))
+
+        assertion_dir = path.join(self.home, ASSERTION_DIR)
+        if path.isdir(assertion_dir):
+            for filename in os.listdir(assertion_dir):
+                remove_cache(path.join(assertion_dir, filename))
+        forget_assertions()
+
+        self._migrate_credentials_file()
+        for filename in os.listdir(self.credentials_dir):
+            remove_cache(path.join(self.credentials_dir, filename))
+
         self._credentials_obj = ConfigParser()
-        self._write_credentials_obj(
-           "Removed temporary STS credentials for all profiles.")
+        self._profile_credentials = None
+        logger.info("Removed temporary STS credentials for all profiles.")
 
     def remove_credentials(self) -> bool:
-        """ Remove Amazon token and role in ~/.aws-login/credentials. """
+        """ Remove Amazon token and role in ~/.aws-login/credentials.d. """
+        from .saml import forget_assertions
+
+        remove_cache(self.cache_file)
+
+        # The user's assertion would log them back in without the IdP
+        username: Optional[str] = self.username
+        if not username and self._profile_credentials is not None:
+            username = self._profile_credentials.get('username')
+        assertion_file = self._assertion_file(username)
+        if assertion_file is not None:
+            remove_cache(assertion_file)
+        forget_assertions(self.ecp_endpoint_url)
+
         status = self._credentials_obj.remove_section(self.name)
-        self._write_credentials_obj(
+        remove_cache(self.credentials_file)
+        self._profile_credentials = None
+        logger.info(
             f"Removed temporary STS credentials from profile: {self.name}")
         return status
 
     def save_credentials(self, token: Dict, role: Role):
-        """ Caches an Amazon token and role in ~/.aws-login/credentials. """
+        """ Caches an Amazon token and role in ~/.aws-login/credentials.d. """
         config = self._credentials_obj
         profile = self._profile_credentials
         creds = token['Credentials']
@@ -494,9 +609,32 @@ class Profile:
 
         self._write_credentials_obj(
             "Saved temporary STS credentials to profile: {self.name}")
+        self._write_cache(token)
+
+    def _migrate_credentials_file(self) -> None:
+        """ Split ~/.aws-login/credentials into per-profile files. """
+        if not path.exists(self.legacy_credentials_file):
+            return
+
+        with FileLock(self.credentials_lock_file):
+            config = ConfigParser()
+            if not config.read(self.legacy_credentials_file):
+                return  # Migrated by another process
+
+            for name in config.sections():
+                filename = path.join(self.credentials_dir, name)
+                if not path.exists(filename):
+                    shard = ConfigParser()
+                    shard[name] = config[name]
+                    _write_credentials(filename, shard)
+
+            os.remove(self.legacy_credentials_file)
+            logger.info("Migrated credentials to: " + self.credentials_dir)
 
     def _set_attrs_from_credentials_file(self):
         """ Load username and role from credentials file. """
+        self._migrate_credentials_file()
+
         config = ConfigParser()
         config.read(self.credentials_file)
         self._credentials_obj = config
@@ -537,9 +675,7 @@ class Profile:
         rmdir(self.identity_dir)
 
     def write_identity_files(self, role: Role):
-        role_arn = role[1].split(':')
-        account_id = role_arn[4]
-        role_name = role_arn[5].split('/')[1]
+        arn = RoleArn.of(role)
 
         def writef(filename: str, data: str):
             with open(filename, 'w') as f:
@@ -547,8 +683,15 @@ class Profile:
 
         makedirs(self.identity_dir, mode=0o700, exist_ok=True)
         writef(self.identity_acct_file,
-               self.account_names.get(account_id, account_id))
-        writef(self.identity_role_file, role_name)
+               self.account_names.get(arn.account_id, arn.account_id))
+        writef(self.identity_role_file, arn.name)
+
+
+def _write_credentials(filename: str, config: ConfigParser) -> None:
+    """ Atomically write a credentials file with mode 600. """
+    buf = StringIO()
+    config.write(buf)
+    write_atomic(filename, buf.getvalue().encode('utf-8'))
 
 
 def _error_handler(Profile, skip_args=True, validate=False,
@@ -556,7 +699,7 @@ def _error_handler(Profile, skip_args=True, validate=False,
     """ Helper function to generate a logging & exception decorator. """
     def decorator(f):
         @wraps(f)
-        def wrapper(args: Namespace, session: Session):
+        def wrapper(args: Namespace, session: 'Session'):
             exp: Optional[Exception] = None
             exc_info = None
             code = ERROR_NONE
@@ -569,6 +712,8 @@ def _error_handler(Profile, skip_args=True, validate=False,
                     configConsoleLogger(args.verbose)
                     del args.verbose
 
+                    from .util import config_vcr
+
                     filename, load = config_vcr(args)
                     profile = Profile(session, args, validate)
                 else:
@@ -1,3 +1,5 @@
+from os import path
+
 FACTORS = ['auto', 'push', 'passcode', 'sms', 'phone']
 YES = ['y', 'yes']
 
@@ -14,3 +16,27 @@ ERROR_INVALID_CRED_PROC_WRONG_PROFILE_ARG = \
     "credential_process:%s: --profile not set to current profile '%s'."
 ERROR_INVALID_CRED_PROC_MISSING_PROFILE_ARG = \
     "credential_process:%s: --profile argument not set."
+
+# Defaults for requests to the IdP. Reads wait on the user to approve
+# a Duo push, which times out after 60 seconds.
+CONNECT_TIMEOUT = 10.0
+READ_TIMEOUT = 90.0
+MAX_ATTEMPTS = 3
+
+# Responses from the IdP larger than this many bytes are refused. Even
+# users entitled to tens of thousands of roles fall well within it.
+MAX_RESPONSE_SIZE = 32 * 2 ** 20
+
+# AWS config variable enabling the plugin's credential provider
+PROVIDER_VARIABLE = 'aws_login_provider'
+
+CONFIG_DIR = '.aws-login'
+CONFIG_FILE = path.join(CONFIG_DIR, 'config')
+JAR_DIR = path.join(CONFIG_DIR, 'cookies')
+CREDENTIALS_FILE = path.join(CONFIG_DIR, 'credentials')
+CREDENTIALS_DIR = path.join(CONFIG_DIR, 'credentials.d')
+ACCT_ALIAS_FILE = path.join(CONFIG_DIR, 'alias')
+IDENTITY_DIR = path.join(CONFIG_DIR, 'identity')
+CACHE_DIR = path.join(CONFIG_DIR, 'cache')
+LOCK_DIR = path.join(CONFIG_DIR, 'locks')
+ASSERTION_DIR = path.join(CONFIG_DIR, 'assertions')
@@ -8,29 +8,64 @@ import sys
 
 from argparse import Namespace
 from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, Optional
 
-from botocore.session import Session
-
-from .__main__ import main as aws_login, login, logout
 from ._version import version
-from .account_names import edit_account_names
-from .config import Profile, error_handler
+from .cache import (
+    acquire_refresh_lock,
+    cache_file,
+    load_cached_credentials,
+    read_cache,
+    release_refresh_lock,
+    render_credentials,
+)
+
+# Importing botocore, lxml, requests, and keyring costs hundreds of
+# milliseconds. They are only loaded once the cached credentials can
+# not be used, so a cache hit costs little more than starting Python.
+if TYPE_CHECKING:  # pragma: no cover
+    from botocore.session import Session
+    from .config import Profile
+
+
+class LazySession:
+    """A botocore Session created on first use.
+
+    Profiles only need the session's profile name, so botocore is not
+    imported, and ~/.aws/config is not read, unless a login is needed.
+    Like botocore, a missing profile is read from AWS_DEFAULT_PROFILE,
+    then AWS_PROFILE.
+    """
+
+    def __init__(self, profile: Optional[str] = None) -> None:
+        if profile is None:
+            profile = os.environ.get('AWS_DEFAULT_PROFILE',
+                                     os.environ.get('AWS_PROFILE'))
+        self.profile = profile
+        self._session: Optional['Session'] = None
+
+    def __getattr__(self, item: str) -> Any:
+        if item == '_session':  # Not yet initialized
+            raise AttributeError(item)
+
+        if self._session is None:
+            from botocore.session import Session
+
+            self._session = Session(profile=self.profile)
+        return getattr(self._session, item)
 
 
 def print_credentials(token):
-    if token is not None:
-        creds = token['Credentials']
-        creds['Version'] = 1
-        creds['Expiration'] = creds['Expiration'].isoformat()
-    else:
-        creds = {
-            "Version": 1,
-            "AccessKeyId": "",
-            "SecretAccessKey": "",
-            "SessionToken": "",
-            "Expiration": datetime(1970, 1, 1),
+    if token is None:
+        token = {
+            'Credentials': {
+                "AccessKeyId": "",
+                "SecretAccessKey": "",
+                "SessionToken": "",
+                "Expiration": datetime(1970, 1, 1),
+            }
         }
-    print(json.dumps(creds))
+    print(render_credentials(token))
 
 
 def init_parser():
@@ -55,6 +90,16 @@ def init_parser():
         "--debug-info",
         action='store_true',
         help="Display debug information")
+    parser.add_argument(
+        "--agent",
+        action='store_true',
+        help="Run a credential agent serving the credential_process")
+    parser.add_argument(
+        "--refresh-all",
+        action='store_true',
+        help="Refresh the expired credentials of every login profile")
+    parser.add_argument("--refresh", action='store_true',
+                        help=argparse.SUPPRESS)
 
     hidden = parser.add_mutually_exclusive_group()
     for flag in ["--login", "--logout", "--alias"]:
@@ -63,19 +108,131 @@ def init_parser():
     return parser
 
 
-def get_credentials(profile: Profile, session: Session):
+def login(profile: 'Profile', session: 'Session', interactive: bool = True,
+          client=None):
+    """ Lazily imported awscli_login.__main__.login. """
+    from .__main__ import login
+
+    return login(profile, session, interactive, client)
+
+
+def fetch_credentials(profile: 'Profile', session: 'Session', client=None,
+                      window: int = 0):
+    """Return unexpired credentials, logging in if they are expired.
+
+    Concurrent processes refreshing the same profile take turns. The
+    first logs in while the others wait, then return the credentials
+    it saved instead of logging in again.
+
+    Args:
+        profile: The login profile.
+        session: A botocore session for the profile.
+        client: An STS client to log in with. By default one is
+            created from `session`, whose credentials are disabled.
+        window: Also log in if the credentials expire within this
+            many seconds.
+    """
+    profile.raise_if_logged_out()
+    if profile.are_credentials_expired(window):
+        with profile.lock():
+            profile.reload_credentials()
+            if profile.are_credentials_expired(window):
+                return login(profile, session, interactive=False,
+                             client=client)
+    return profile.load_credentials()
+
+
+def get_credentials(profile: 'Profile', session: 'Session'):
     """Get credentials and print them."""
+    print_credentials(fetch_credentials(profile, session))
+
+
+def refresh_credentials(profile: 'Profile', session: 'Session'):
+    """Get new credentials without printing them."""
     profile.raise_if_logged_out()
-    if profile.are_credentials_expired():
-        token = login(profile, session, interactive=False)
+    with profile.lock():
+        output, due = read_cache(profile.cache_file)
+        if output is None or due:  # Not refreshed while we waited
+            login(profile, session, interactive=False)
+
+
+def start_refresh(name: str) -> None:
+    """Refresh the credentials of profile `name` in the background.
+
+    The refresh runs in a detached process so that the caller, the
+    aws command, does not wait on it. Only one refresh per profile is
+    started at a time.
+    """
+    if not acquire_refresh_lock(name):
+        return
+
+    import subprocess
+
+    kwargs: Dict[str, Any] = {}
+    if sys.platform == 'win32':
+        kwargs['creationflags'] = subprocess.DETACHED_PROCESS | \
+            subprocess.CREATE_NEW_PROCESS_GROUP
     else:
-        token = profile.load_credentials()
-    print_credentials(token)
+        kwargs['start_new_session'] = True
+
+    try:
+        subprocess.Popen(
+            [sys.executable, '-m', 'awscli_login.credentials',
+             '--profile', name, '--refresh'],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            **kwargs,
+        )
+    except OSError:
+        release_refresh_lock(name)
+
+
+def _main(args: Namespace, session: 'Session') -> int:
+    from .config import error_handler
+
+    return error_handler()(get_credentials)(args, session)
+
+
+def _refresh(args: Namespace, session: 'Session') -> int:
+    from .config import error_handler
+
+    code = error_handler()(refresh_credentials)(args, session)
+    if code == 0 and args.profile:
+        # On failure the lock is left to go stale, which delays the
+        # next attempt instead of retrying on every aws command.
+        release_refresh_lock(args.profile)
+    return code
+
 
+def refresh_all(verbose: int = 0) -> int:
+    """Refresh every login profile concurrently in this process.
 
-@error_handler()
-def _main(profile: Profile, session: Session):
-    get_credentials(profile, session)
+    Profiles that are logged out are skipped.
+
+    Returns:
+        Zero if every logged in profile was refreshed, else one.
+    """
+    import asyncio
+    import logging
+
+    from .aio import profile_names, refresh_profiles
+    from .config import ERROR_NONE, ERROR_UNKNOWN
+    from .exceptions import AlreadyLoggedOut
+    from .logger import configConsoleLogger
+
+    configConsoleLogger(verbose)
+    logger = logging.getLogger(__package__)
+
+    code = ERROR_NONE
+    results = asyncio.run(refresh_profiles(profile_names()))
+    for name, result in results.items():
+        if isinstance(result, AlreadyLoggedOut):
+            logger.info(f"{name}: {result}")
+        elif isinstance(result, Exception):
+            logger.error(f"{name}: {result}")
+            code = ERROR_UNKNOWN
+    return code
 
 
 def debug_info():
@@ -113,20 +270,56 @@ def debug_info():
 def main():
     # https://docs.aws.amazon.com/cli/latest/userguide/cli-configure-sourcing-external.html
     args = init_parser().parse_args()
-    session = Session(profile=args.profile)
+    if args.agent:
+        from .agent import serve
+        return serve(args.verbose)
+    if args.refresh_all:
+        return refresh_all(args.verbose)
+
+    if args.profile and not (args.debug_info or args.login or args.logout
+                             or args.alias or args.refresh):
+        output, refresh = read_cache(cache_file(args.profile))
+        if output is not None:
+            sys.stdout.write(output)
+            if refresh:
+                sys.stdout.flush()
+                start_refresh(args.profile)
+            return 0
+
+        # Credentials saved before the cache existed
+        token = load_cached_credentials(args.profile)
+        if token is not None:
+            print_credentials(token)
+            return 0
+
+        from .agent import request_credentials
+
+        code = request_credentials(args.profile)
+        if code is not None:
+            return code
+
+    session = LazySession(args.profile)
     if args.debug_info:
         debug_info()
     elif args.login:
+        from .__main__ import main as aws_login
+
         ns = Namespace(**json.load(args.login))
         if ns.debug_info:
             debug_info()
             return
         return aws_login(ns, session)
     elif args.logout:
+        from .__main__ import logout
+
         return logout(Namespace(**json.load(args.logout)), session)
     elif args.alias:
+        from .account_names import edit_account_names
+
         ns = Namespace(**json.load(args.alias))
         edit_account_names(ns, session)
+    elif args.refresh:
+        return _refresh(args, session)
     else:
         return _main(args, session)
 
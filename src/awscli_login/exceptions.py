@@ -1,4 +1,6 @@
 """ A collection of custom exceptions """
+from typing import List
+
 from .const import FACTORS
 
 
@@ -96,6 +98,29 @@ class RoleParseFail(SAML):
         super().__init__(mesg % role)
 
 
+class CookiesExpired(SAML):
+    code = 19
+
+    def __init__(self, url: str) -> None:
+        super().__init__(f"No unexpired IdP session cookies for: {url}")
+
+
+class ResponseTooLarge(SAML):
+    code = 20
+
+    def __init__(self, url: str, limit: int) -> None:
+        super().__init__(f"ECP Endpoint response exceeds {limit} bytes: {url}")
+
+
+class LxmlRequired(SAML):
+    code = 21
+
+    def __init__(self) -> None:
+        super().__init__("This SAML response can only be sent to AWS "
+                         "with lxml installed. Please run: "
+                         "pip install 'awscli-login[lxml]'")
+
+
 class TooManyInvalidSelections(ConfigError):
     code = 11
 
@@ -178,3 +203,26 @@ class PleaseLogin(ConfigError):
     def __init__(self) -> None:
         mesg = "Please log in first:\n\naws login"
         super().__init__(mesg)
+
+
+class AgentUnavailable(ConfigError):
+    code = 17
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(f"Unable to start credential agent: {reason}")
+
+
+class LoginsFailed(ConfigError):
+    code = 18
+
+    def __init__(self, profiles: List[str]) -> None:
+        super().__init__("Failed to log in to profile(s): " +
+                         ", ".join(profiles))
+
+
+class InvalidProfileValue(ConfigError):
+    code = 22
+
+    def __init__(self, profile: str, attr: str, value: str) -> None:
+        super().__init__(f"The login profile ({profile}) has an invalid "
+                         f"value for {attr}: {value}!")
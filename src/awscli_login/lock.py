@@ -0,0 +1,120 @@
+""" Advisory file locks shared by concurrent aws-login processes.
+
+The locks are held by the operating system on behalf of an open file
+descriptor, so a lock is released when its holder exits or crashes and
+can never be left behind. A holder that hangs is detected by a timeout.
+"""
+import logging
+import os
+import sys
+
+from time import monotonic, sleep
+from types import TracebackType
+from typing import Optional, Type
+
+if sys.platform == 'win32':  # pragma: no cover
+    import msvcrt
+
+    def _try_lock(fd: int) -> bool:
+        """ Take an exclusive lock on `fd` without blocking. """
+        try:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    def _unlock(fd: int) -> None:
+        """ Release the lock on `fd`. """
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _try_lock(fd: int) -> bool:
+        """ Take an exclusive lock on `fd` without blocking. """
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
+
+    def _unlock(fd: int) -> None:
+        """ Release the lock on `fd`. """
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait on a lock before assuming its holder is hung.
+LOCK_TIMEOUT = 60
+
+# Seconds between attempts to take a lock.
+POLL_INTERVAL = 0.05
+
+
+class FileLock:
+    """An exclusive lock on a file that is not reentrant.
+
+    When used as a context manager a timed out wait logs a warning and
+    the block runs without the lock, so a hung process can not stop
+    others from getting credentials.
+
+    Example:
+        >>> with FileLock('/tmp/example.lock'):
+        ...     pass
+
+    Args:
+        filename: Path to the lock file. It is created if missing.
+        timeout: Seconds to wait before giving up on the lock.
+    """
+
+    def __init__(self, filename: str, timeout: float = LOCK_TIMEOUT) -> None:
+        self.filename = filename
+        self.timeout = timeout
+        self._fd: Optional[int] = None
+
+    def _holder(self) -> str:
+        """ Return the pid recorded by the current holder. """
+        try:
+            with open(self.filename) as f:
+                return f.read().strip() or 'unknown'
+        except OSError:
+            return 'unknown'
+
+    def acquire(self) -> bool:
+        """Wait up to timeout seconds for the lock.
+
+        Returns:
+            True if the lock was taken, False if the wait timed out.
+        """
+        fd = os.open(self.filename, os.O_RDWR | os.O_CREAT, 0o600)
+        deadline = monotonic() + self.timeout
+
+        while not _try_lock(fd):
+            if monotonic() >= deadline:
+                os.close(fd)
+                logger.warning(f"Timed out waiting on {self.filename} "
+                               f"held by pid {self._holder()}")
+                return False
+            sleep(POLL_INTERVAL)
+
+        # Record the holder to help diagnose timeouts
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode('ascii'))
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        """ Release the lock if it is held. """
+        if self._fd is not None:
+            _unlock(self._fd)
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self) -> 'FileLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type: Optional[Type[BaseException]],
+                 exc: Optional[BaseException],
+                 tb: Optional[TracebackType]) -> None:
+        self.release()
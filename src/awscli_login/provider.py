@@ -0,0 +1,176 @@
+""" A botocore credential provider serving login profiles in process.
+
+The plugin inserts the provider into the credential chain of the aws
+command's session, ahead of the credential_process provider, so that
+botocore does not start a second Python interpreter to run aws-login.
+Profiles are served if their credential_process runs aws-login for the
+same profile, or if they set aws_login_provider to true.
+
+The provider also backs the sessions returned by awscli_login.session.
+"""
+import json
+import logging
+import threading
+
+from datetime import datetime
+from os import path
+from typing import Any, Dict, Optional
+
+from botocore.credentials import (
+    CredentialProvider,
+    CredentialResolver,
+    RefreshableCredentials,
+)
+from botocore.exceptions import (
+    CredentialRetrievalError,
+    ProfileNotFound,
+    UnknownCredentialError,
+)
+from botocore.session import Session
+from botocore.utils import ensure_boolean
+
+from .cache import cache_file, read_cache, render_credentials
+from .const import PROVIDER_VARIABLE
+
+# botocore raises an error if refreshed credentials expire within its
+# mandatory refresh timeout, so credentials expiring this soon, in
+# seconds, are refreshed instead of returned.
+REFRESH_WINDOW = 10 * 60
+
+logger = logging.getLogger(__name__)
+
+
+def is_provider_enabled(config: Dict[str, Any], name: str) -> bool:
+    """Return True if the provider should serve profile `name`.
+
+    Args:
+        config: The profile's botocore configuration.
+        name: The profile name.
+    """
+    if ensure_boolean(config.get(PROVIDER_VARIABLE, False)):
+        return True
+
+    proc = config.get('credential_process')
+    if not proc:
+        return False
+
+    args = proc.split()
+    cmd = path.splitext(path.basename(args[0]))[0]
+    try:
+        return cmd == 'aws-login' and \
+            args[args.index('--profile') + 1] == name
+    except (ValueError, IndexError):
+        return False
+
+
+class AWSLoginProvider(CredentialProvider):
+    """Serves login profiles without running aws-login.
+
+    Args:
+        session: A botocore session for the login profile.
+        always: If True, serve the profile even if it is not
+            configured to use awscli_login.
+    """
+    METHOD = 'awscli-login'
+
+    def __init__(self, session: Session, always: bool = False) -> None:
+        self._session = session
+        self._always = always
+        self._credentials: Optional[RefreshableCredentials] = None
+        self._lock = threading.Lock()
+
+    @property
+    def _name(self) -> str:
+        return self._session.profile if self._session.profile else 'default'
+
+    def load(self):
+        if not self._always:
+            try:
+                config = self._session.get_scoped_config()
+            except ProfileNotFound:
+                return None
+
+            if not is_provider_enabled(config, self._name):
+                return None
+
+        # Threads racing to load the session's credentials share them
+        with self._lock:
+            if self._credentials is None:
+                logger.debug("Serving credentials for profile: " +
+                             self._name)
+                self._credentials = RefreshableCredentials \
+                    .create_from_metadata(self._fetch(), self._fetch,
+                                          self.METHOD)
+        return self._credentials
+
+    def _fetch(self) -> Dict[str, Any]:
+        """ Return credentials metadata as expected by botocore. """
+        output, refresh = read_cache(cache_file(self._name))
+        if output is not None and _expires_within(output, REFRESH_WINDOW):
+            output = None
+
+        if output is None:
+            output = self._login()
+        elif refresh:
+            from .credentials import start_refresh
+
+            start_refresh(self._name)
+
+        creds = json.loads(output)
+        return {
+            'access_key': creds['AccessKeyId'],
+            'secret_key': creds['SecretAccessKey'],
+            'token': creds['SessionToken'],
+            'expiry_time': creds['Expiration'],
+        }
+
+    def _login(self) -> str:
+        """ Return rendered credentials, logging in if they are expired. """
+        from botocore import UNSIGNED
+        from botocore.config import Config
+        from .config import Profile
+        from .credentials import fetch_credentials
+        from .exceptions import AWSCLILogin
+
+        try:
+            profile = Profile(self._session, None, validate=False)
+            # AssumeRoleWithSAML is unsigned. Disabling the session's
+            # credentials, as aws-login does, would discard ours.
+            client = self._session.create_client(
+                'sts', config=Config(signature_version=UNSIGNED))
+            token = fetch_credentials(profile, self._session, client,
+                                      REFRESH_WINDOW)
+        except AWSCLILogin as e:
+            raise CredentialRetrievalError(provider=self.METHOD,
+                                           error_msg=str(e))
+
+        if token is None:
+            raise CredentialRetrievalError(provider=self.METHOD,
+                                           error_msg="Invalid credentials")
+        return render_credentials(token)
+
+
+def _expires_within(output: str, seconds: int) -> bool:
+    """ Return True if rendered credentials expire within `seconds`. """
+    expiration = datetime.fromisoformat(json.loads(output)['Expiration'])
+    now = datetime.now(tz=expiration.tzinfo)
+    return (expiration - now).total_seconds() <= seconds
+
+
+def insert_provider(session: Session) -> None:
+    """ Insert an AWSLoginProvider before the credential_process. """
+    try:
+        resolver = session.get_component('credential_provider')
+        resolver.insert_before('custom-process', AWSLoginProvider(session))
+    except (ProfileNotFound, UnknownCredentialError):
+        # The profile does not exist, which is reported by the command
+        # if it needs credentials, or botocore lacks a custom-process
+        return
+
+
+def create_session(profile: Optional[str] = None) -> Session:
+    """ Return a botocore session served only by an AWSLoginProvider. """
+    session = Session(profile=profile)
+    resolver = CredentialResolver([AWSLoginProvider(session, always=True)])
+    session.register_component('credential_provider', resolver)
+    return session
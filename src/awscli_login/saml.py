@@ -1,50 +1,103 @@
+import json
 import logging
 import re
+import threading
 
 try:
     import lxml.etree as ET
-except ImportError:  # pragma: no cover
-    pass
+except ImportError:
+    import xml.etree.ElementTree as ET  # type: ignore[no-redef]
 
 from base64 import b64encode
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from functools import cached_property
 from http.cookiejar import LWPCookieJar
-from typing import Optional, List, Tuple
+from io import BytesIO
+from os import makedirs, path
+from random import uniform
+from time import sleep, time
+from typing import IO, Any, Dict, Iterator, NamedTuple, Optional, List, Tuple
 from typing import cast
+from urllib.parse import urlparse
 from uuid import uuid4
+from xml.sax.saxutils import escape, quoteattr
 
 try:
-    from lxml.etree import XMLSyntaxError
-    from lxml.etree import tostring, Element, SubElement
-    from requests import Session
+    from requests import Response, Session
     from requests.cookies import RequestsCookieJar
+    from requests.exceptions import ConnectionError as RequestsConnectionError
+    from requests.exceptions import ConnectTimeout
 except ImportError:
-    class SubElement:  # type: ignore
-        pass
+    pass
 
+from .cache import write_atomic
+from .const import (
+    CONNECT_TIMEOUT,
+    MAX_ATTEMPTS,
+    MAX_RESPONSE_SIZE,
+    READ_TIMEOUT,
+)
 from .exceptions import (
     AuthnFailed,
+    CookiesExpired,
     InvalidSOAP,
+    LxmlRequired,
     MissingCookieJar,
+    ResponseTooLarge,
     RoleParseFail,
 )
-from ._typing import Role, Headers
+from ._typing import Role, RoleArn, Headers, Timeout
 from .util import secure_touch
 
 try:
-    from urllib3.exceptions import InsecureRequestWarning
+    from .transport import transport
+except ImportError:  # pragma: no cover
+    pass
+
+try:
+    from urllib3.exceptions import InsecureRequestWarning, NewConnectionError
     from urllib3 import disable_warnings
 except ImportError:
     pass
 
 SAML_SUCCESS = "urn:oasis:names:tc:SAML:2.0:status:Success"
 
+# Failed attempts wait a random time up to BACKOFF * 2 ** attempt
+# seconds, capped at BACKOFF_MAX, so that clients do not retry in step.
+BACKOFF = 0.5
+BACKOFF_MAX = 10.0
+
+# Bytes read from the IdP at a time
+CHUNK_SIZE = 64 * 1024
+
+# Cached SAML assertions are used until this many seconds before they
+# expire, leaving time to call STS.
+ASSERTION_MARGIN = 60
+
+# Unexpired assertions keyed by ECP endpoint URL and cookie jar
+_assertions: Dict[Tuple[str, str], 'SamlResponse'] = {}
+_assertions_lock = threading.Lock()
+
 ns = {
        'S': 'http://schemas.xmlsoap.org/soap/envelope/',
        'saml2': 'urn:oasis:names:tc:SAML:2.0:assertion',
        'saml2p': 'urn:oasis:names:tc:SAML:2.0:protocol',
 }
 
+# An ECP SAML AuthNRequest for the Amazon SP, formatted with its ID and
+# IssueInstant
+AUTHN_REQUEST = (
+    b'<S:Envelope xmlns:S="http://schemas.xmlsoap.org/soap/envelope/"'
+    b' xmlns:saml2="urn:oasis:names:tc:SAML:2.0:assertion"'
+    b' xmlns:saml2p="urn:oasis:names:tc:SAML:2.0:protocol">'
+    b'<S:Body><saml2p:AuthnRequest'
+    b' AssertionConsumerServiceURL="https://signin.aws.amazon.com/saml"'
+    b' ID="%(id)s" IssueInstant="%(now)s"'
+    b' ProtocolBinding="urn:oasis:names:tc:SAML:2.0:bindings:PAOS"'
+    b' Version="2.0"><saml2:Issuer>urn:amazon:webservices</saml2:Issuer>'
+    b'</saml2p:AuthnRequest></S:Body></S:Envelope>'
+)
+
 logger = logging.getLogger(__name__)
 
 
@@ -53,6 +106,329 @@ def utcnow() -> datetime:
     return datetime.utcnow()
 
 
+def _tag(prefix: str, name: str) -> str:
+    return '{%s}%s' % (ns[prefix], name)
+
+
+ROLE_ATTRIBUTE = 'https://aws.amazon.com/SAML/Attributes/Role'
+
+_ENVELOPE = _tag('S', 'Envelope')
+_BODY = _tag('S', 'Body')
+_RESPONSE = _tag('saml2p', 'Response')
+_STATUS = _tag('saml2p', 'Status')
+_STATUS_CODE = _tag('saml2p', 'StatusCode')
+_ASSERTION = _tag('saml2', 'Assertion')
+_CONDITIONS = _tag('saml2', 'Conditions')
+_SUBJECT = _tag('saml2', 'Subject')
+_SUBJECT_CONFIRMATION = _tag('saml2', 'SubjectConfirmation')
+_SUBJECT_CONFIRMATION_DATA = _tag('saml2', 'SubjectConfirmationData')
+_ATTRIBUTE_STATEMENT = _tag('saml2', 'AttributeStatement')
+_ATTRIBUTE = _tag('saml2', 'Attribute')
+_ATTRIBUTE_VALUE = _tag('saml2', 'AttributeValue')
+
+
+class Namespaces(NamedTuple):
+    """ Namespace prefixes in scope at the start of a SAML Response. """
+    inherited: Dict[str, str]  # Declared by its ancestors
+    declared: Dict[str, str]  # Declared by the Response itself
+
+
+def iter_saml(source: IO[bytes]) -> Iterator[Tuple[str, Any]]:
+    """
+    Streams a SAML SOAP response from an IdP, yielding what it finds
+    as it is parsed:
+
+        ('response', Namespaces): The start of the saml2p:Response.
+        ('status', str): The top level SAML status code.
+        ('expires', str): The NotOnOrAfter limit of the assertion's
+            conditions, or of the confirmation of its subject. None if
+            the limit is missing.
+        ('role', str): The value of a role attribute.
+
+    Role values are discarded once parsed, so memory use does not grow
+    with the number of roles. The response is parsed by lxml if it is
+    installed, and by the standard library otherwise.
+
+    Args:
+        source: A file containing a SOAP response from an IdP.
+
+    Raises:
+        ParseError: If the SOAP response contains syntax errors.
+    """
+    depth = 0  # Depth of the Response once found
+    stack: List[Any] = []
+    tags: List[str] = []
+    scopes: List[Dict[str, str]] = []
+    declared: Dict[str, str] = {}
+
+    for event, item in ET.iterparse(source,
+                                    events=('start-ns', 'start', 'end')):
+        if event == 'start-ns':
+            prefix, uri = item
+            declared[prefix or ''] = uri
+            continue
+
+        if event == 'start':
+            tag = item.tag
+            if not depth:
+                if tag == _RESPONSE and tags == [_ENVELOPE, _BODY]:
+                    inherited: Dict[str, str] = {}
+                    for scope in scopes:
+                        inherited.update(scope)
+                    depth = len(tags)
+                    yield 'response', Namespaces(inherited, declared)
+            elif tag == _STATUS_CODE:
+                if tags[depth:] == [_RESPONSE, _STATUS]:
+                    yield 'status', item.get('Value')
+            elif tag == _CONDITIONS:
+                if tags[depth:] == [_RESPONSE, _ASSERTION]:
+                    yield 'expires', item.get('NotOnOrAfter')
+            elif tag == _SUBJECT_CONFIRMATION_DATA:
+                if tags[depth:] == [_RESPONSE, _ASSERTION, _SUBJECT,
+                                    _SUBJECT_CONFIRMATION]:
+                    yield 'expires', item.get('NotOnOrAfter')
+
+            stack.append(item)
+            tags.append(tag)
+            scopes.append(declared)
+            declared = {}
+            continue
+
+        stack.pop()
+        tags.pop()
+        scopes.pop()
+
+        if item.tag == _ATTRIBUTE_VALUE and depth and \
+                tags[depth:] == [_RESPONSE, _ASSERTION,
+                                 _ATTRIBUTE_STATEMENT, _ATTRIBUTE] and \
+                stack[-1].get('Name') == ROLE_ATTRIBUTE:
+            yield 'role', item.text or ''
+
+            # Role values are the bulk of large responses
+            item.clear()
+            stack[-1].remove(item)
+
+
+class SamlResponse:
+    """
+    A SAML SOAP response from an IdP.
+
+    The SOAP response is streamed once, with iter_saml, collecting its
+    status, role attribute values and the limits of its assertion. The
+    roles, expiration and encoded assertion are each parsed from them
+    when first used. Unpacking a SamlResponse yields the encoded
+    assertion and the roles:
+
+        >>> assertion, roles = SamlResponse(soap)
+
+    Args:
+        soap: A byte string containing a SOAP response from an IdP.
+
+    Raises:
+        ParseError: If the SOAP response contains syntax errors.
+    """
+
+    def __init__(self, soap: bytes) -> None:
+        self._soap = soap
+        self._namespaces: Optional[Namespaces] = None
+        self._values: List[str] = []
+        self._limits: List[Optional[str]] = []
+        self.status: Optional[str] = None
+
+        for kind, value in iter_saml(BytesIO(soap)):
+            if kind == 'response':
+                self._namespaces = value
+            elif kind == 'status':
+                if self.status is None:
+                    self.status = value
+            elif kind == 'expires':
+                self._limits.append(value)
+            else:
+                self._values.append(value)
+
+    @classmethod
+    def from_assertion(cls, assertion: str, roles: List[Role],
+                       expires: Optional[datetime] = None
+                       ) -> 'SamlResponse':
+        """ Returns a successful response previously extracted. """
+        response = cls.__new__(cls)
+        response._soap = b''
+        response._namespaces = None
+        response._values = []
+        response._limits = []
+        response.status = SAML_SUCCESS
+        # Seed the cached properties, which are never computed
+        vars(response).update(assertion=assertion,
+                              roles=[RoleArn.of(role) for role in roles],
+                              expires=expires)
+        return response
+
+    def __iter__(self) -> Iterator[Any]:
+        yield self.assertion
+        yield self.roles
+
+    def __repr__(self) -> str:
+        return f"SamlResponse(status={self.status!r})"
+
+    @property
+    def success(self) -> bool:
+        """ True if the IdP returned a SAML success code. """
+        return self.status == SAML_SUCCESS
+
+    def raise_if_failed(self) -> None:
+        """
+        Raises:
+            AuthnFailed: If a SAML success code was not returned.
+        """
+        if not self.success:
+            raise AuthnFailed
+
+    @cached_property
+    def roles(self) -> List[RoleArn]:
+        """
+        A list of RoleArns, each a tuple of a SAML provider ARN and a
+        role ARN.
+
+        Raises:
+            RoleParseFail: If a role attribute can not be parsed.
+        """
+        roles = parse_role_values(self._values)
+        self._values = []  # No longer needed
+        return roles
+
+    @cached_property
+    def expires(self) -> Optional[datetime]:
+        """ When the assertion expires, or None if it does not. """
+        # The assertion is valid until its conditions, or the
+        # confirmation of its subject, expire
+        expires = []
+        for limit in self._limits:
+            try:
+                expires.append(_parse_instant(limit))  # type: ignore
+            except (AttributeError, ValueError):  # Missing or malformed
+                continue
+
+        return min(expires) if expires else None
+
+    @cached_property
+    def assertion(self) -> str:
+        """
+        The base 64 encoded SAML Response, as expected by STS.
+
+        The Response is encoded straight from the SOAP response when
+        it can stand alone, or with the declarations of the namespaces
+        it inherits added to it. Otherwise the SOAP response is parsed
+        again, and the Response serialized by lxml.
+
+        Raises:
+            LxmlRequired: If the Response must be serialized and lxml is
+                not installed. xml.etree renames namespace prefixes,
+                which invalidates the signature of the assertion.
+        """
+        span = None
+        if self._namespaces is not None:
+            span = response_span(self._soap, self._namespaces)
+
+        if span is None:
+            if ET.__name__ != 'lxml.etree':
+                raise LxmlRequired
+            resp = ET.fromstring(self._soap).find('S:Body/saml2p:Response', ns)
+            return b64encode(ET.tostring(resp)).decode("us-ascii")
+
+        start, name_end, end = span
+        xml: Any = memoryview(self._soap)[start:end]
+
+        # Declare namespaces the Response uses but does not declare
+        assert self._namespaces is not None
+        missing = [(prefix, uri) for prefix, uri
+                   in self._namespaces.inherited.items()
+                   if prefix not in self._namespaces.declared and
+                   (not prefix or
+                    self._soap.find(prefix.encode() + b':', start, end) != -1)]
+        if missing:
+            xml = self._soap[start:name_end] + \
+                b''.join(_xmlns(prefix, uri) for prefix, uri in missing) + \
+                self._soap[name_end:end]
+
+        return b64encode(xml).decode("us-ascii")
+
+
+def _xmlns(prefix: str, uri: str) -> bytes:
+    """ Return an attribute declaring namespace `prefix`. """
+    name = 'xmlns:' + prefix if prefix else 'xmlns'
+    return f' {name}={quoteattr(uri)}'.encode('utf-8')
+
+
+_XML_ENCODING = re.compile(
+    rb'\s*<\?xml[^>]*\sencoding\s*=\s*["\']([A-Za-z0-9._-]+)["\']')
+
+# Whitespace, comments and processing instructions, which may surround
+# the Response in the SOAP Body
+_MISC = rb'(?:\s|<!--(?s:.*?)-->|<\?(?s:.*?)\?>)*'
+
+
+def response_span(soap: bytes, namespaces: Namespaces
+                  ) -> Optional[Tuple[int, int, int]]:
+    """
+    Locates a SAML Response element in the SOAP response it was parsed
+    from, so that it can be encoded without serializing it again.
+
+    The Response must be the only element in the SOAP Body, though
+    comments and processing instructions may surround it. Documents
+    that are not encoded in UTF-8, or have a DTD, are not searched,
+    since the Response's bytes would not be parsed the same on their
+    own.
+
+    Args:
+        soap: A byte string containing a SOAP response from an IdP.
+        namespaces: The namespaces in scope at the start of the
+            Response, as yielded by iter_saml.
+
+    Returns:
+        The start offset of the Response in `soap`, the offset of the
+        end of its tag name, and its end offset, or None if it could
+        not be located.
+    """
+    if soap.startswith((b'\xfe\xff', b'\xff\xfe')) or \
+            soap[:1] == b'\x00' or soap[1:2] == b'\x00':  # UTF-16 or 32
+        return None
+
+    match = _XML_ENCODING.match(soap)
+    if match and match.group(1).upper() not in (b'UTF-8', b'US-ASCII'):
+        return None
+
+    def qname(uri: str, scope: Dict[str, str], name: bytes
+              ) -> Optional[bytes]:
+        prefixes = [p for p, u in scope.items() if u == uri]
+        if len(prefixes) != 1:
+            return None
+        return prefixes[0].encode() + b':' + name if prefixes[0] else name
+
+    body_tag = qname(ns['S'], namespaces.inherited, b'Body')
+    tag = qname(ns['saml2p'], {**namespaces.inherited, **namespaces.declared},
+                b'Response')
+    if body_tag is None or tag is None:
+        return None
+
+    match = re.compile(b'<' + re.escape(body_tag) + rb'(\s[^>]*)?>' +
+                       _MISC + b'<' + re.escape(tag) + rb'[\s/>]').search(soap)
+    if match is None or soap.find(b'<!DOCTYPE', 0, match.start()) != -1:
+        return None
+    name_end = match.end() - 1
+    start = name_end - len(tag) - 1
+
+    end = soap.rfind(b'</' + tag + b'>', start)
+    if end == -1:
+        return None
+    end += len(tag) + 3
+
+    if not re.compile(_MISC + b'</' + re.escape(body_tag) + rb'[\s>]') \
+            .match(soap, end):
+        return None
+
+    return start, name_end, end
+
+
 def raise_if_saml_failed(soap: bytes) -> None:
     """
     Parses a SAML SOAP response to determine if authentication
@@ -64,40 +440,93 @@ def raise_if_saml_failed(soap: bytes) -> None:
 
     Raises:
         AuthnFailed: If a SAML success code was not returned.
-        XMLSyntaxError: If the SOAP response contains syntax errors.
+        ParseError: If the SOAP response contains syntax errors.
+    """
+    SamlResponse(soap).raise_if_failed()
+
+
+def backoff(attempt: int) -> float:
+    """ Return seconds to wait after failed attempt number `attempt`. """
+    return uniform(0, min(BACKOFF_MAX, BACKOFF * 2 ** attempt))
+
+
+def not_sent(e: RequestsConnectionError) -> bool:
+    """ Return True if `e` was raised before a request could be sent. """
+    if isinstance(e, ConnectTimeout):
+        return True
+    reason = getattr(e.args[0], 'reason', None) if e.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def read_content(r: Response, url: str,
+                 max_size: int = MAX_RESPONSE_SIZE) -> bytes:
     """
-    xml = ET.fromstring(soap)
+    Reads the body of a streamed response from an IdP.
+
+    Args:
+        r: A response requested with stream=True.
+        url: ECP endpoint URL for the IdP.
+        max_size: maximum number of bytes to read
 
-    elem = xml.find('S:Body/saml2p:Response/saml2p:Status' +
-                    '/saml2p:StatusCode' +
-                    '[@Value="' + SAML_SUCCESS + '"]', ns)
+    Raises:
+        ResponseTooLarge: If the body is longer than `max_size` bytes.
+    """
+    length = r.headers.get('Content-Length', '')
+    if length.isdigit() and int(length) > max_size:
+        r.close()
+        raise ResponseTooLarge(url, max_size)
 
-    if elem is None:
-        raise AuthnFailed
+    chunks, size = [], 0
+    for chunk in r.iter_content(CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_size:
+            r.close()
+            raise ResponseTooLarge(url, max_size)
+        chunks.append(chunk)
+    return b''.join(chunks)
 
 
 def saml_login(url: str, jar: LWPCookieJar,
                username: Optional[str] = None, password: Optional[str] = None,
                headers: Optional[Headers] = None, verify_cert: bool = True,
-               ) -> bytes:
+               timeout: Timeout = (CONNECT_TIMEOUT, READ_TIMEOUT),
+               max_attempts: int = MAX_ATTEMPTS,
+               max_size: int = MAX_RESPONSE_SIZE) -> SamlResponse:
     """
     Generates and posts a SAML AuthNRequest to an IdP.
 
+    Connections that fail before the request is sent are retried with
+    a random backoff. Without a username and password, server errors
+    (5xx) and dropped connections are retried too. With them, they are
+    not, nor are read timeouts, since the IdP may already have sent
+    the user a Duo push. The response is streamed, and refused if it
+    is larger than `max_size` bytes.
+
     Args:
         url: ECP endpoint URL for the IdP.
         username: Username to provide to the IdP.
         password: Password to provide to the IdP.
         headers: optional headers to provide to the IdP.
         verify_cert: whether to verify IdP SSL cert
+        timeout: connect and read timeouts in seconds, None waits forever
+        max_attempts: maximum number of POSTs to the IdP
+        max_size: maximum size of the response in bytes
 
     Returns:
-        The SOAP response from the IdP.
+        The successful SAML response from the IdP.
+
+    Raises:
+        AuthnFailed: If a SAML success code was not returned.
+        InvalidSOAP: If the IdP did not return a SOAP response.
+        ResponseTooLarge: If the response is larger than `max_size`.
     """
 
     if not verify_cert:
         disable_warnings(InsecureRequestWarning)
 
+    # Sessions are cheap, and keep each caller's cookie jar separate
     s = Session()
+    s.mount(*transport(url, verify_cert))
     s.cookies = cast(RequestsCookieJar, jar)
     s.headers.update({'Content-Type': 'text/xml', 'charset': 'utf-8'})
 
@@ -105,22 +534,152 @@ def saml_login(url: str, jar: LWPCookieJar,
     auth = (username, password) if username and password else None
     logger.debug("POST %r\nheaders: %r\npayload %r" %
                  (url, headers, envelope))
-    r = s.post(url, data=envelope, headers=headers, auth=auth,
-               verify=verify_cert)
-    logger.debug("POST returned: %r" % r.content)
+
+    max_attempts = max(1, max_attempts)
+    for attempt in range(1, max_attempts + 1):
+        logger.info(f"POST {url} (attempt {attempt} of {max_attempts})")
+        try:
+            r = s.post(url, data=envelope, headers=headers, auth=auth,
+                       verify=verify_cert, timeout=timeout, stream=True)
+        except RequestsConnectionError as e:
+            if attempt == max_attempts or auth and not not_sent(e):
+                raise
+            error = str(e)
+        else:
+            if r.status_code < 500 or attempt == max_attempts or auth:
+                break
+            error = f"{r.status_code} {r.reason}"
+            r.close()
+
+        delay = backoff(attempt)
+        logger.warning(f"POST {url} failed (attempt {attempt} of "
+                       f"{max_attempts}): {error}. Retrying in "
+                       f"{delay:.1f} seconds.")
+        sleep(delay)
+
+    soap = read_content(r, url, max_size)
+    logger.debug(f"POST returned {r.status_code} with {len(soap)} bytes")
 
     r.raise_for_status()
     try:
-        raise_if_saml_failed(r.content)
-    except XMLSyntaxError:
+        response = SamlResponse(soap)
+    except ET.ParseError:
         raise InvalidSOAP(url)
-    return r.content
+
+    response.raise_if_failed()
+    return response
+
+
+def _parse_instant(value: str) -> datetime:
+    """ Return a SAML timestamp as a naive datetime in UTC. """
+    value = re.sub(r'\.[0-9]+', '', value.strip())  # Drop fractions
+    instant = datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+    if instant.tzinfo is not None:
+        instant = instant.astimezone(timezone.utc).replace(tzinfo=None)
+    return instant
+
+
+def cached_assertion(url: str, cookies: str,
+                     filename: Optional[str] = None
+                     ) -> Optional[SamlResponse]:
+    """
+    Returns a cached SAML response that is not about to expire.
+
+    Args:
+        url: ECP endpoint URL for the IdP.
+        cookies: A path to the cookie jar used to get the assertion.
+        filename: An optional file the assertion may be cached in.
+
+    Returns:
+        The cached SAML response, or None if no usable assertion is
+        cached.
+    """
+    deadline = utcnow() + timedelta(seconds=ASSERTION_MARGIN)
+
+    with _assertions_lock:
+        response = _assertions.get((url, path.abspath(cookies)))
+    if response is None and filename is not None:
+        try:
+            with open(filename) as f:
+                cached = json.load(f)
+            if cached['url'] == url:
+                response = SamlResponse.from_assertion(
+                    cached['assertion'],
+                    cached['roles'],
+                    datetime.fromisoformat(cached['expires']))
+        except (OSError, ValueError, KeyError, TypeError):
+            response = None
+
+    if response is None or response.expires is None or \
+            response.expires <= deadline:
+        return None
+    return response
+
+
+def forget_assertions(url: Optional[str] = None) -> None:
+    """
+    Forgets SAML responses cached in memory.
+
+    Args:
+        url: If given, only forget responses from this ECP endpoint URL.
+    """
+    with _assertions_lock:
+        for key in list(_assertions):
+            if url is None or key[0] == url:
+                del _assertions[key]
+
+
+def cache_assertion(url: str, cookies: str, response: SamlResponse,
+                    filename: Optional[str] = None) -> SamlResponse:
+    """
+    Caches a SAML response until its assertion expires.
+
+    Assertions are cached in memory, and in `filename` if given, which
+    is written with mode 600. Assertions without an expiration are not
+    cached.
+
+    Args:
+        url: ECP endpoint URL for the IdP.
+        cookies: A path to the cookie jar used to get the assertion.
+        response: The SAML response from the IdP.
+        filename: An optional file to cache the assertion in.
+
+    Returns:
+        The SAML response.
+    """
+    if response.expires is None:
+        return response
+
+    with _assertions_lock:
+        _assertions[(url, path.abspath(cookies))] = response
+
+    if filename is not None:
+        data = json.dumps({
+            'url': url,
+            'expires': response.expires.isoformat(),
+            'assertion': response.assertion,
+            'roles': response.roles,
+        }).encode('utf-8')
+
+        # Profiles sharing an endpoint and username share the file, and
+        # are refreshed concurrently by refresh_profiles
+        with _assertions_lock:
+            makedirs(path.dirname(filename), mode=0o700, exist_ok=True)
+            write_atomic(filename, data)
+        logger.info("Cached SAML assertion: " + filename)
+
+    return response
 
 
 def authenticate(url: str, cookies: str,
                  username: str, password: str,
                  headers: Headers,
-                 verify_cert: bool = True) -> Tuple[str, List[Role]]:
+                 verify_cert: bool = True,
+                 timeout: Timeout = (CONNECT_TIMEOUT, READ_TIMEOUT),
+                 max_attempts: int = MAX_ATTEMPTS,
+                 assertion_file: Optional[str] = None
+                 ) -> SamlResponse:
     """
     Authenitcate with user credentials to IdP.
 
@@ -131,13 +690,18 @@ def authenticate(url: str, cookies: str,
         password: Password to provide to the IdP.
         headers: Optional headers to provide to the IdP.
         verify_cert: whether to verify IdP SSL cert
+        timeout: connect and read timeouts in seconds, None waits forever
+        max_attempts: maximum number of POSTs to the IdP
+        assertion_file: optional file to cache the SAML assertion in
 
     Returns:
-        A base 64 encoded SAML assertion string, and a list of
-        tuples containing a SAML provider ARN and a Role ARN.
+        The SAML response, which unpacks to a base 64 encoded SAML
+        assertion string, and a list of tuples containing a SAML
+        provider ARN and a Role ARN.
     """
     jar = LWPCookieJar(cookies)
-    soap = saml_login(url, jar, username, password, headers, verify_cert)
+    response = saml_login(url, jar, username, password, headers,
+                          verify_cert, timeout, max_attempts)
 
     mesg = "Successfully authenticated with username/password"
     logger.info(mesg + " to endpoint: " + url)
@@ -146,23 +710,52 @@ def authenticate(url: str, cookies: str,
     jar.save(ignore_discard=True)
     logger.info(f"Saved cookies to jar: {jar.filename}")
 
-    return parse_soap_response(soap)
+    return cache_assertion(url, cookies, response, assertion_file)
+
+
+def has_live_cookie(jar: LWPCookieJar, url: str) -> bool:
+    """ Return True if `jar` has an unexpired cookie for the host of `url`. """
+    host = (urlparse(url).hostname or '').lower()
+    now = int(time())
+
+    for cookie in jar:
+        domain = cookie.domain.lstrip('.').lower()
+        if (host == domain or host.endswith('.' + domain)) and \
+                not cookie.is_expired(now):
+            return True
+    return False
 
 
 def refresh(url: str, cookies: str,
-            verify_cert: bool = True) -> Tuple[str, List[Role]]:
+            verify_cert: bool = True,
+            timeout: Timeout = (CONNECT_TIMEOUT, READ_TIMEOUT),
+            max_attempts: int = MAX_ATTEMPTS,
+            assertion_file: Optional[str] = None) -> SamlResponse:
     """
     Reauthenticate with cookies to IdP.
 
+    A cached SAML assertion that is not about to expire is returned
+    without contacting the IdP. If the IdP's cookies have expired
+    CookiesExpired is raised, also without contacting the IdP.
+
     Args:
         url: ECP endpoint URL for the IdP.
         cookies: A path to a cookie jar.
         verify_cert: whether to verify IdP SSL cert
+        timeout: connect and read timeouts in seconds, None waits forever
+        max_attempts: maximum number of POSTs to the IdP
+        assertion_file: optional file to cache the SAML assertion in
 
     Returns:
-        A base 64 encoded SAML assertion string, and a list of
-        tuples containing a SAML provider ARN and a role ARN.
+        The SAML response, which unpacks to a base 64 encoded SAML
+        assertion string, and a list of tuples containing a SAML
+        provider ARN and a role ARN.
     """
+    cached = cached_assertion(url, cookies, assertion_file)
+    if cached is not None:
+        logger.info("Using cached SAML assertion for endpoint: " + url)
+        return cached
+
     jar = LWPCookieJar(cookies)
     try:
         jar.load(ignore_discard=True)
@@ -170,15 +763,19 @@ def refresh(url: str, cookies: str,
     except FileNotFoundError:
         raise MissingCookieJar(url)
 
-    soap = saml_login(url, jar, verify_cert=verify_cert)
+    if not has_live_cookie(jar, url):
+        raise CookiesExpired(url)
+
+    response = saml_login(url, jar, verify_cert=verify_cert,
+                          timeout=timeout, max_attempts=max_attempts)
 
     mesg = "Successfully authenticated with cookies"
     logger.info(mesg + " to endpoint: " + url)
 
-    return parse_soap_response(soap)
+    return cache_assertion(url, cookies, response, assertion_file)
 
 
-def parse_soap_response(soap: bytes) -> Tuple[str, List[Role]]:
+def parse_soap_response(soap: bytes) -> Tuple[str, List[RoleArn]]:
     """
     Parses SAML SOAP response for SAML assertion and SAML attributes:
     provider & role ARN(s).
@@ -190,18 +787,11 @@ def parse_soap_response(soap: bytes) -> Tuple[str, List[Role]]:
         A base 64 encoded SAML assertion string, and a list of
         tuples containing a SAML provider ARN and a role ARN.
     """
-    body = ET.fromstring(soap)
-    resp = body.find('S:Body/saml2p:Response', ns)
-
-    roles = resp.findall("saml2:Assertion/" +
-                         "saml2:AttributeStatement/saml2:Attribute[@Name=" +
-                         "'https://aws.amazon.com/SAML/Attributes/Role']/" +
-                         "saml2:AttributeValue", ns)
-
-    return b64encode(tostring(resp)).decode("us-ascii"), parse_role_arns(roles)
+    assertion, roles = SamlResponse(soap)
+    return assertion, roles
 
 
-def parse_role_arns(roles: List[SubElement]) -> List[Role]:
+def parse_role_arns(roles: List[Any]) -> List[RoleArn]:
     """
     Parses SAML Attributes for SAML provider and Role ARNS.
 
@@ -215,20 +805,51 @@ def parse_role_arns(roles: List[SubElement]) -> List[Role]:
     Raises:
         SAML: If unable to find a SAML provider or Role ARN.
     """
+    return parse_role_values([role.text for role in roles])
+
+
+# An IAM role or SAML provider ARN, with surrounding whitespace
+_IAM_ARN = re.compile(r'\s*(arn:[^:,\s]+:iam::[0-9]+:(role|saml-provider)'
+                      r'/[^:,]*[^:,/\s])\s*')
+
+
+def parse_role_values(values: List[str]) -> List[RoleArn]:
+    """
+    Parses the values of SAML role attributes for SAML provider and
+    Role ARNS.
+
+    Each value holds one or more comma separated pairs of a SAML
+    provider ARN and a role ARN, in either order.
+
+    Args:
+        values: List of SAML role attribute values.
+
+    Returns:
+        A list of RoleArns, each a tuple of a SAML provider ARN and a
+        Role ARN.
+
+    Raises:
+        RoleParseFail: If unable to find a SAML provider or Role ARN.
+    """
     role_arns = []
-    role_regex = re.compile('.*(arn:aws:iam::([0-9]+):role/([^,:]+)).*')
-    saml_regex = re.compile(
-        '.*(arn:aws:iam::([0-9]+):saml-provider/([^,:]+)).*'
-    )
+    match = _IAM_ARN.fullmatch
 
-    for role in roles:
-        arn = role_regex.match(role.text)
-        saml = saml_regex.match(role.text)
+    for value in values:
+        arns = [arn for arn in value.split(',') if arn and not arn.isspace()]
+        if not arns or len(arns) % 2:
+            raise RoleParseFail(value)
 
-        if arn and saml:
-            role_arns.append((saml.group(1), arn.group(1)))
-        else:
-            raise RoleParseFail(role.text)
+        for i in range(0, len(arns), 2):
+            first, second = match(arns[i]), match(arns[i + 1])
+            if first is None or second is None:
+                raise RoleParseFail(value)
+
+            if first[2] == 'saml-provider' and second[2] == 'role':
+                role_arns.append(RoleArn._from_valid(first[1], second[1]))
+            elif first[2] == 'role' and second[2] == 'saml-provider':
+                role_arns.append(RoleArn._from_valid(second[1], first[1]))
+            else:
+                raise RoleParseFail(value)
 
     return role_arns
 
@@ -243,23 +864,7 @@ def authn_request() -> bytes:
     now = utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
     uuid = '_' + str.upper(str(uuid4())).replace('-', '')
 
-    SOAP = "{%s}" % ns['S']
-    SAML2 = "{%s}" % ns['saml2']
-    SAML2P = "{%s}" % ns['saml2p']
-
-    envelope = Element(SOAP + "Envelope", nsmap=ns)
-    body = SubElement(envelope, SOAP + "Body")
-
-    attr = {
-       'AssertionConsumerServiceURL': "https://signin.aws.amazon.com/saml",
-       'ID': uuid,
-       'IssueInstant': now,
-       'ProtocolBinding': "urn:oasis:names:tc:SAML:2.0:bindings:PAOS",
-       'Version': '2.0',
+    return AUTHN_REQUEST % {
+        b'id': escape(uuid, {'"': '&quot;'}).encode('utf-8'),
+        b'now': escape(now, {'"': '&quot;'}).encode('utf-8'),
     }
-    authn_request = SubElement(body, SAML2P + "AuthnRequest", **attr)
-
-    issuer = SubElement(authn_request, SAML2 + "Issuer")
-    issuer.text = "urn:amazon:webservices"
-
-    return tostring(envelope)
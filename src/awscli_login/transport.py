@@ -0,0 +1,113 @@
+""" Pooled HTTPS transports for requests to IdP endpoints.
+
+Every request to an IdP endpoint shares one connection pool, so a
+refresh that falls back to authenticate, or a long running process
+such as the credential agent, reuses an open connection instead of
+paying for a new TCP and TLS handshake. When a pooled connection has
+been closed, the next connection resumes the previous TLS session,
+which saves a round trip and the server's key exchange.
+
+TLS sessions are only held in memory. Python's ssl module can not
+serialize them, so they can not be shared with later processes. Run
+the credential agent to keep connections warm across aws commands.
+"""
+import ssl
+import threading
+
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
+
+_transports: Dict[Tuple[str, bool], 'IdPAdapter'] = {}
+_transports_lock = threading.Lock()
+
+
+class ResumableSSLSocket(ssl.SSLSocket):
+    """ An SSLSocket that saves its TLS session when closed. """
+
+    def close(self) -> None:
+        context = self.context
+        if isinstance(context, ResumingSSLContext):
+            context.save_session(self)
+        super().close()
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """An SSLContext that resumes the last TLS session with each server.
+
+    TLS 1.3 servers send session tickets after the handshake, so a
+    session is saved when its socket is closed.
+    """
+    sslsocket_class = ResumableSSLSocket
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__()
+        self._sessions: Dict[Optional[str], ssl.SSLSession] = {}
+        self._sessions_lock = threading.Lock()
+
+    def save_session(self, sock: ssl.SSLSocket) -> None:
+        """ Save the TLS session of `sock` for its server. """
+        try:
+            session = sock.session
+        except (OSError, ValueError):
+            return
+
+        if session is not None:
+            with self._sessions_lock:
+                self._sessions[sock.server_hostname] = session
+
+    def wrap_socket(self, sock, server_side=False,  # type: ignore
+                    do_handshake_on_connect=True, suppress_ragged_eofs=True,
+                    server_hostname=None, session=None):
+        if session is None and not server_side:
+            with self._sessions_lock:
+                session = self._sessions.get(server_hostname)
+
+        return super().wrap_socket(
+            sock, server_side, do_handshake_on_connect,
+            suppress_ragged_eofs, server_hostname, session)
+
+
+def create_context() -> ResumingSSLContext:
+    """Return a client context for IdP connections.
+
+    Unlike urllib3's default context, session tickets are requested.
+    urllib3 sets the verify mode and CA certificates of each connection,
+    and matches hostnames itself when the context does not.
+    """
+    context = ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.hostname_checks_common_name = False
+    return context
+
+
+class IdPAdapter(HTTPAdapter):
+    """ An HTTPAdapter resuming TLS sessions on new connections. """
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        kwargs['ssl_context'] = create_context()
+        super().init_poolmanager(*args, **kwargs)
+
+
+def transport(url: str, verify_cert: bool = True) -> Tuple[str, IdPAdapter]:
+    """
+    Returns the pooled transport for an IdP endpoint.
+
+    Args:
+        url: ECP endpoint URL for the IdP.
+        verify_cert: whether the IdP SSL cert is verified. Its TLS
+            context is configured to match, so each setting gets its
+            own transport.
+
+    Returns:
+        The URL prefix the transport serves, and the transport.
+    """
+    parts = urlparse(url)
+    prefix = f"{parts.scheme}://{parts.netloc}/"
+
+    with _transports_lock:
+        key = (prefix, verify_cert)
+        if key not in _transports:
+            _transports[key] = IdPAdapter()
+        return prefix, _transports[key]
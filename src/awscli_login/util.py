@@ -24,6 +24,7 @@ except ImportError:  # pragma: no cover
 
 try:
     from botocore.session import Session
+    from botocore.utils import ensure_boolean
 except ImportError:  # pragma: no cover
     class Session:  # type: ignore
         pass
@@ -34,6 +35,7 @@ from .const import (
     ERROR_INVALID_CRED_PROC_WRONG_PROFILE_ARG,
     ERROR_INVALID_PROFILE_ROLE,
     OVERWRITE_PROFILE,
+    PROVIDER_VARIABLE,
     WARNING_PROFILE_CONTAINS_CREDS,
     YES,
 )
@@ -46,7 +48,7 @@ from .exceptions import (
     TooManyInvalidSelections,
     UserExit,
 )
-from ._typing import Role
+from ._typing import Role, RoleArn
 
 logger = logging.getLogger(__name__)
 
@@ -58,12 +60,8 @@ def sort_roles(role_arns: List[Role]) \
     r: List[Tuple[str, List[Tuple[int, str]]]] = []
 
     for index, arn in enumerate(role_arns):
-        acct: str = arn[1].split(':')[4]
-        role: str = arn[1].split(':')[5].split('/')[1]
-
-        role_list = accounts.get(acct, list())
-        role_list.append((index, role))
-        accounts[acct] = role_list
+        role = RoleArn.of(arn)
+        accounts.setdefault(role.account_id, []).append((index, role.name))
 
     for acct in sorted(accounts.keys()):
         accounts[acct].sort(key=lambda x: x[1])
@@ -307,8 +305,12 @@ def update_credential_file(session: Session, profile: str):
 def raise_if_credential_process_not_set(
         session: Session, profile: str) -> None:
     """ Raises 'CredentialProcessNotSet' if 'credential_process'
-        not set for the active profile.
+        not set for the active profile, unless the profile is served
+        by the plugin's credential provider.
     """
+    if ensure_boolean(_aws_get(session, PROVIDER_VARIABLE) or False):
+        return
+
     proc = _aws_get(session, 'credential_process')
     if proc is None:
         raise CredentialProcessNotSet(profile)
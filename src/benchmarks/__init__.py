@@ -0,0 +1,7 @@
+""" Latency benchmarks for the aws-login credential_process.
+
+Run from the src directory, or with src on PYTHONPATH::
+
+    $ python -m benchmarks --output baseline.json
+    $ python -m benchmarks --compare baseline.json
+"""
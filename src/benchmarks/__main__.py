@@ -0,0 +1,85 @@
+"""Benchmark the aws-login credential_process.
+
+Results are written as JSON. With --compare, median times, and peak
+memory of the memory benchmarks, are compared against a baseline and
+the exit status is 1 if any benchmark regressed.
+"""
+import argparse
+import json
+import sys
+
+from . import suite  # noqa: F401 Registers the benchmarks
+from .harness import BENCHMARKS, MIN_DELTA, THRESHOLD, compare, \
+    print_comparison, run
+
+
+def init_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "benchmarks",
+        nargs='*',
+        metavar="BENCHMARK",
+        help="Benchmarks to run (default: all). One of: " +
+             ", ".join(BENCHMARKS))
+    parser.add_argument(
+        "-n",
+        "--repeat",
+        default=20,
+        type=int,
+        help="Number of timed runs per benchmark (default: %(default)s)")
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=argparse.FileType('w'),
+        default=sys.stdout,
+        help="File to write JSON results to (default: stdout)")
+    parser.add_argument(
+        "-c",
+        "--compare",
+        type=argparse.FileType('r'),
+        metavar="BASELINE",
+        help="JSON results to compare against")
+    parser.add_argument(
+        "--threshold",
+        default=THRESHOLD,
+        type=float,
+        help="Fractional slowdown of the median that is a regression "
+             "(default: %(default)s)")
+    parser.add_argument(
+        "--min-delta",
+        default=MIN_DELTA,
+        type=float,
+        help="Slowdowns of fewer milliseconds are never regressions "
+             "(default: %(default)s)")
+    return parser
+
+
+def main() -> int:
+    parser = init_parser()
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error("unknown benchmarks: " + ", ".join(sorted(unknown)))
+
+    report = run(args.benchmarks or list(BENCHMARKS), args.repeat)
+
+    json.dump(report, args.output, indent=2)
+    args.output.write('\n')
+
+    if args.compare:
+        rows = compare(report, json.load(args.compare), args.threshold,
+                       args.min_delta)
+        print_comparison(rows, {name: result.get('unit', 'ms') for name,
+                                result in report['results'].items()})
+        if any(regressed for *_, regressed in rows):
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+""" Timing, reporting and baseline comparison for the benchmarks. """
+import platform
+import statistics
+import sys
+import tracemalloc
+
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from awscli_login._version import version
+
+# A benchmark takes the number of runs and returns their times in
+# seconds, or for memory benchmarks their peak allocations in bytes.
+Benchmark = Callable[[int], List[float]]
+
+BENCHMARKS: Dict[str, Benchmark] = {}
+UNITS: Dict[str, str] = {}
+
+# Results are reported in these units, scaled from seconds or bytes
+SCALES = {'ms': 1000.0, 'MiB': 1.0 / 2 ** 20}
+
+# A result slower than the baseline by more than THRESHOLD times the
+# baseline and more than MIN_DELTA milliseconds, or MiB for memory
+# benchmarks, is a regression.
+THRESHOLD = 0.2
+MIN_DELTA = 2.0
+
+
+def benchmark(name: str, unit: str = 'ms'
+              ) -> Callable[[Benchmark], Benchmark]:
+    """A decorator registering a benchmark under `name`.
+
+    Args:
+        name: The benchmark's name.
+        unit: 'ms' for benchmarks returning times, or 'MiB' for
+            benchmarks returning peak allocations.
+    """
+    def decorator(f: Benchmark) -> Benchmark:
+        BENCHMARKS[name] = f
+        UNITS[name] = unit
+        return f
+    return decorator
+
+
+def measure(func: Callable[[], Any], repeat: int,
+            setup: Optional[Callable[[], Any]] = None) -> List[float]:
+    """Time `repeat` calls to `func`.
+
+    Args:
+        func: The code to time.
+        repeat: Number of timed calls.
+        setup: Untimed code to run before each call.
+
+    Returns:
+        The time of each call in seconds.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = perf_counter()
+        func()
+        times.append(perf_counter() - start)
+    return times
+
+
+def measure_memory(func: Callable[[], Any], repeat: int,
+                   setup: Optional[Callable[[], Any]] = None) -> List[float]:
+    """Trace the memory allocated by `repeat` calls to `func`.
+
+    Args:
+        func: The code to trace.
+        repeat: Number of traced calls.
+        setup: Untraced code to run before each call.
+
+    Returns:
+        The peak memory allocated during each call in bytes.
+    """
+    peaks = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        try:
+            func()
+            peaks.append(float(tracemalloc.get_traced_memory()[1]))
+        finally:
+            tracemalloc.stop()
+    return peaks
+
+
+def summarize(times: List[float], unit: str = 'ms') -> Dict[str, float]:
+    """ Return statistics in `unit` for a list of times or peaks. """
+    values = [t * SCALES[unit] for t in times]
+    return {
+        'min': min(values),
+        'median': statistics.median(values),
+        'mean': statistics.mean(values),
+        'stdev': statistics.stdev(values) if len(values) > 1 else 0.0,
+        'repeat': len(values),
+    }
+
+
+def run(names: List[str], repeat: int) -> Dict[str, Any]:
+    """ Run benchmarks and return a JSON serializable report. """
+    results = {}
+    for name in names:
+        print(f"Running {name}...", file=sys.stderr)
+        unit = UNITS[name]
+        results[name] = dict(summarize(BENCHMARKS[name](repeat), unit),
+                             unit=unit)
+
+    return {
+        'awscli_login': version,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any],
+            threshold: float = THRESHOLD, min_delta: float = MIN_DELTA,
+            ) -> List[Tuple[str, float, float, bool]]:
+    """Compare median times of a report against a baseline report.
+
+    Benchmarks missing from either report are skipped.
+
+    Returns:
+        A list of tuples containing a benchmark name, its baseline and
+        current median in milliseconds, and True if it regressed.
+    """
+    rows = []
+    for name, result in report['results'].items():
+        if name not in baseline['results']:
+            continue
+
+        old = baseline['results'][name]['median']
+        new = result['median']
+        regressed = new - old > max(old * threshold, min_delta)
+        rows.append((name, old, new, regressed))
+    return rows
+
+
+def print_comparison(rows: List[Tuple[str, float, float, bool]],
+                     units: Optional[Dict[str, str]] = None) -> None:
+    """ Print a comparison table to stderr. """
+    units = units or {}
+    print(f"{'benchmark':<24}{'baseline':>12}{'current':>12}{'change':>9}",
+          file=sys.stderr)
+    for name, old, new, regressed in rows:
+        change = (new - old) / old * 100 if old else 0.0
+        flag = '  REGRESSION' if regressed else ''
+        unit = units.get(name, 'ms')
+        print(f"{name:<24}{old:>9.2f}{unit:<3}{new:>9.2f}{unit:<3}"
+              f"{change:>+8.1f}%{flag}", file=sys.stderr)
@@ -0,0 +1,337 @@
+""" Benchmarks of the aws-login credential_process.
+
+Every benchmark runs in a temporary AWSCLI_LOGIN_ROOT and AWS config
+so that results do not depend on, or change, the user's own profiles.
+"""
+import io
+import os
+import subprocess
+import sys
+
+from contextlib import contextmanager, redirect_stdout
+from os import makedirs, path
+from tempfile import TemporaryDirectory
+from typing import Dict, Iterator, List
+from unittest.mock import patch
+
+import awscli_login
+
+from awscli_login.cache import remove_cache, write_cache
+from awscli_login.const import (
+    CACHE_DIR,
+    CONFIG_FILE,
+    CREDENTIALS_DIR,
+    JAR_DIR,
+)
+
+from tests.stub import (
+    COOKIES,
+    IDP_PATH,
+    ROLE_ARN,
+    STS_PATH,
+    StubServer,
+    expired_credentials,
+    tls_context,
+)
+
+from .harness import benchmark, measure, measure_memory
+
+PROFILE_COUNTS = (1, 100, 1000)
+ROLE_COUNTS = (1, 100, 1000)
+MEMORY_ROLE_COUNTS = (10, 1000, 50000)
+ROLE_VALUE_COUNT = 100000
+
+DATA = path.join(path.dirname(path.dirname(path.abspath(__file__))),
+                 'tests', 'data')
+
+TOKEN = {
+    'Credentials': {
+        'AccessKeyId': 'ABCDEFGHIJKLMNOPQRSTUVWXYZ',
+        'SecretAccessKey': '1234567890',
+        'SessionToken': 'reallycooltoken',
+        'Expiration': '2100-07-13T17:54:39+00:00',
+    }
+}
+
+
+def _write(filename: str, data: str) -> None:
+    makedirs(path.dirname(filename), mode=0o700, exist_ok=True)
+    with open(filename, 'w') as f:
+        f.write(data)
+
+
+def _profiles(count: int, url: str = 'https://idp.example.com/ecp') -> str:
+    """ Return an aws-login config file with `count` profiles. """
+    return ''.join(
+        f"[{'default' if i == 0 else f'profile{i}'}]\n"
+        f"ecp_endpoint_url = {url}\nusername = user\n"
+        f"role_arn = {ROLE_ARN}\nduration = 3600\n\n"
+        for i in range(count)
+    )
+
+
+@contextmanager
+def environment(count: int = 1, url: str = 'https://idp.example.com/ecp',
+                plugin: bool = False) -> Iterator[Dict[str, str]]:
+    """Create an isolated aws-login root and AWS config.
+
+    Args:
+        count: Number of aws-login profiles to configure.
+        url: The ECP endpoint URL of every profile.
+        plugin: If True, enable the awscli_login plugin in the AWS config.
+
+    Yields:
+        The environment, which is also applied to os.environ until
+        the context exits.
+    """
+    with TemporaryDirectory() as root:
+        _write(path.join(root, CONFIG_FILE), _profiles(count, url))
+        _write(path.join(root, JAR_DIR, 'user.txt'), COOKIES)
+        _write(path.join(root, '.aws', 'config'),
+               "[default]\nregion = us-east-1\n" +
+               ("[plugins]\nlogin = awscli_login\n" if plugin else ""))
+
+        env = dict(os.environ)
+        env.pop('XDG_RUNTIME_DIR', None)  # Never use a credential agent
+        env.update({
+            'AWSCLI_LOGIN_ROOT': root,
+            'AWS_CONFIG_FILE': path.join(root, '.aws', 'config'),
+            'AWS_SHARED_CREDENTIALS_FILE': path.join(root, '.aws',
+                                                     'credentials'),
+            'PYTHONPATH': path.dirname(path.dirname(awscli_login.__file__)),
+        })
+
+        with patch.dict(os.environ, env, clear=True):
+            yield env
+
+
+def _run(env: Dict[str, str], *args: str) -> None:
+    """ Run a Python subprocess that must succeed. """
+    subprocess.run([sys.executable, *args], env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+
+
+@benchmark('interpreter')
+def interpreter(repeat: int) -> List[float]:
+    """ Start and stop the Python interpreter. """
+    with environment() as env:
+        return measure(lambda: _run(env, '-c', 'pass'), repeat)
+
+
+@benchmark('import')
+def import_credentials(repeat: int) -> List[float]:
+    """ Start Python and import the credential_process entry point. """
+    with environment() as env:
+        return measure(
+            lambda: _run(env, '-c', 'import awscli_login.credentials'),
+            repeat)
+
+
+def _aws_noop(plugin: bool) -> None:
+    name = 'aws_noop_plugin' if plugin else 'aws_noop'
+
+    @benchmark(name)
+    def aws_noop(repeat: int) -> List[float]:
+        """Run `aws --version`, which loads plugins and builds the
+        command table. The difference between aws_noop_plugin and
+        aws_noop is the overhead the plugin adds to every aws command.
+        """
+        with environment(plugin=plugin) as env:
+            return measure(lambda: _run(env, '-m', 'awscli', '--version'),
+                           repeat)
+
+
+for plugin in (False, True):
+    _aws_noop(plugin)
+
+
+def _profile_init(count: int) -> None:
+    @benchmark(f'profile_init_{count}')
+    def profile_init(repeat: int) -> List[float]:
+        """ Load one login profile from a config with many profiles. """
+        from botocore.session import Session
+        from awscli_login.config import Profile
+
+        with environment(count):
+            session = Session(profile='default')
+            return measure(lambda: Profile(session, None), repeat)
+
+
+for count in PROFILE_COUNTS:
+    _profile_init(count)
+
+
+@benchmark('cache_hit')
+def cache_hit(repeat: int) -> List[float]:
+    """ Print cached credentials in process. """
+    from awscli_login.credentials import main
+
+    def run() -> None:
+        with redirect_stdout(io.StringIO()):
+            main()
+
+    with environment() as env:
+        root = env['AWSCLI_LOGIN_ROOT']
+        makedirs(path.join(root, CACHE_DIR))
+        write_cache(path.join(root, CACHE_DIR, 'default'), TOKEN)
+
+        with patch.object(sys, 'argv', ['aws-login', '--profile', 'default']):
+            return measure(run, repeat)
+
+
+@benchmark('cache_hit_process')
+def cache_hit_process(repeat: int) -> List[float]:
+    """ Run aws-login with cached credentials. """
+    with environment() as env:
+        root = env['AWSCLI_LOGIN_ROOT']
+        makedirs(path.join(root, CACHE_DIR))
+        write_cache(path.join(root, CACHE_DIR, 'default'), TOKEN)
+
+        return measure(lambda: _run(env, '-m', 'awscli_login.credentials',
+                                    '--profile', 'default'), repeat)
+
+
+@benchmark('cache_miss_process')
+def cache_miss_process(repeat: int) -> List[float]:
+    """ Run aws-login with expired credentials against a stub IdP/STS. """
+    with StubServer() as stub, environment(url=stub.url(IDP_PATH)) as env:
+        root = env['AWSCLI_LOGIN_ROOT']
+        env['AWS_ENDPOINT_URL_STS'] = stub.url(STS_PATH)
+
+        def expire() -> None:
+            _write(path.join(root, CREDENTIALS_DIR, 'default'),
+                   expired_credentials())
+            remove_cache(path.join(root, CACHE_DIR, 'default'))
+
+        return measure(lambda: _run(env, '-m', 'awscli_login.credentials',
+                                    '--profile', 'default'), repeat, expire)
+
+
+def _tls(resume: bool) -> None:
+    name = 'tls_resumed' if resume else 'tls_full'
+
+    @benchmark(name)
+    def tls(repeat: int) -> List[float]:
+        """POST to a stub IdP over a new HTTPS connection. The
+        difference between tls_full and tls_resumed is the time saved
+        by resuming the last TLS session.
+        """
+        from requests import Session
+        from awscli_login.transport import IdPAdapter
+
+        with StubServer(tls_context()) as stub:
+            url = stub.url(IDP_PATH)
+            session = Session()
+            adapter = IdPAdapter()
+
+            def connect() -> None:
+                nonlocal adapter
+                adapter.close()  # Drop the pooled connection
+                if not resume:
+                    adapter = IdPAdapter()
+                session.mount(url, adapter)
+
+            def post() -> None:
+                session.post(url, verify=False).raise_for_status()
+
+            connect()
+            post()  # Save a session to resume
+            return measure(post, repeat, connect)
+
+
+for resume in (False, True):
+    _tls(resume)
+
+
+def saml_response(count: int) -> bytes:
+    """ Return a successful SAML SOAP response granting `count` roles. """
+    with open(path.join(DATA, 'success.xml'), 'rb') as f:
+        soap = f.read()
+
+    role = soap.index(b'FriendlyName="Role"')
+    start = soap.index(b'<saml2:AttributeValue', role)
+    end = soap.index(b'</saml2:AttributeValue>', start) + \
+        len(b'</saml2:AttributeValue>')
+    value = soap[start:end]
+    values = b''.join(value.replace(b'TestShibAdmin', f'Role{i}'.encode())
+                      for i in range(count))
+    return soap[:start] + values + soap[end:]
+
+
+def _saml_parse(count: int) -> None:
+    @benchmark(f'saml_parse_{count}')
+    def saml_parse(repeat: int) -> List[float]:
+        """ Check, extract the roles of, and encode a SAML response. """
+        from awscli_login.saml import SamlResponse
+
+        soap = saml_response(count)
+
+        def parse() -> None:
+            response = SamlResponse(soap)
+            response.raise_if_failed()
+            response.expires
+            assertion, roles = response
+            assert len(roles) == count
+
+        return measure(parse, repeat)
+
+
+for count in ROLE_COUNTS:
+    _saml_parse(count)
+
+
+def _saml_memory(count: int) -> None:
+    @benchmark(f'saml_memory_{count}', unit='MiB')
+    def saml_memory(repeat: int) -> List[float]:
+        """Peak memory checking and extracting the roles of a SAML
+        response, excluding the response itself. tracemalloc only
+        traces Python's allocator, so memory used by libxml2 for the
+        parsed tree is not included.
+        """
+        from awscli_login.saml import SamlResponse
+
+        soap = saml_response(count)
+
+        def parse() -> None:
+            response = SamlResponse(soap)
+            response.raise_if_failed()
+            response.expires
+            assert len(response.roles) == count
+
+        return measure_memory(parse, repeat)
+
+
+for count in MEMORY_ROLE_COUNTS:
+    _saml_memory(count)
+
+
+def role_values(pairs: int, path: str = '', name: str = 'Role') -> List[str]:
+    """Return role attribute values granting ROLE_VALUE_COUNT roles, with
+    `pairs` provider and role ARN pairs in each value.
+    """
+    provider = 'arn:aws:iam::123456789012:saml-provider/idp'
+    arns = [f'arn:aws:iam::123456789012:role/{path}{name}{i},{provider}'
+            for i in range(ROLE_VALUE_COUNT)]
+    return [','.join(arns[i:i + pairs])
+            for i in range(0, ROLE_VALUE_COUNT, pairs)]
+
+
+def _role_parse(kind: str, pairs: int, path: str = '',
+                name: str = 'Role') -> None:
+    @benchmark(f'role_parse_{kind}{ROLE_VALUE_COUNT}')
+    def role_parse(repeat: int) -> List[float]:
+        """ Extract SAML provider and role ARNs from role attributes. """
+        from awscli_login.saml import parse_role_values
+
+        values = role_values(pairs, path, name)
+
+        def parse() -> None:
+            assert len(parse_role_values(values)) == ROLE_VALUE_COUNT
+
+        return measure(parse, repeat)
+
+
+_role_parse('', 1)
+# Role ARNs near the 512 character limit of role paths and names
+_role_parse('long_', 1, 'path/' * 50, 'R' * 54)
+_role_parse('pairs_', 10)
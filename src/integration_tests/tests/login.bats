@@ -35,12 +35,14 @@ load 'common'
 		Selection:
 	EOF
     assert_equal "$(<$AWS_SHARED_CREDENTIALS_FILE)" "$CREDS_AWS_FILE"
-    assert_exists "$AWSCLI_LOGIN_ROOT/.aws-login/credentials"
-    assert_equal "$(<$AWSCLI_LOGIN_ROOT/.aws-login/credentials)" "$CREDS"
+    assert_not_exists "$AWSCLI_LOGIN_ROOT/.aws-login/credentials"
+    assert_equal "$(<$AWSCLI_LOGIN_ROOT/.aws-login/credentials.d/default)" "$CREDS"
+    assert_exists "$AWSCLI_LOGIN_ROOT/.aws-login/cache/default"
 
     run aws logout
     assert_success
-    assert_equal "$(<$AWSCLI_LOGIN_ROOT/.aws-login/credentials)" ""
+    assert_not_exists "$AWSCLI_LOGIN_ROOT/.aws-login/credentials.d/default"
+    assert_not_exists "$AWSCLI_LOGIN_ROOT/.aws-login/cache/default"
 
     run aws logout
     assert_failure
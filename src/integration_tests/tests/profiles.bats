@@ -13,7 +13,7 @@ init() {
     # indicate the same UTC time. When login is run as a plugin you
     # get Z, when you run it from the credentials script as a
     # standalone you get +00:00. I don't know why.
-    ! read -r -d '' CREDS <<- EOF
+    ! read -r -d '' CREDS_DEFAULT <<- EOF
 		[default]$CR
 		aws_access_key_id = ABCDEFGHIJKLMNOPQRST$CR
 		aws_secret_access_key = SUPER DUPER SECRET KEY$CR
@@ -22,20 +22,10 @@ init() {
 		expiration = 2222-09-06T22:28:39+00:00$CR
 		aws_principal_arn = arn:aws:iam::123456789010:saml-provider/shibboleth.illinois.edu$CR
 		aws_role_arn = arn:aws:iam::123456789010:role/Team$CR
-		username = netid$CR
-		$CR
-		[test]$CR
-		aws_access_key_id = ABCDEFGHIJKLMNOPQRST$CR
-		aws_secret_access_key = SUPER DUPER SECRET KEY$CR
-		aws_session_token = BOGUS TOKEN$CR
-		aws_security_token = BOGUS TOKEN$CR
-		expiration = 2222-09-06T22:28:39+00:00$CR
-		aws_principal_arn = arn:aws:iam::123456789010:saml-provider/shibboleth.illinois.edu$CR
-		aws_role_arn = arn:aws:iam::123456789010:role/Team$CR
-		username = test
+		username = netid
 	EOF
 
-    ! read -r -d '' CREDS_AFTER_LOGOUT <<- EOF
+    ! read -r -d '' CREDS_TEST <<- EOF
 		[test]$CR
 		aws_access_key_id = ABCDEFGHIJKLMNOPQRST$CR
 		aws_secret_access_key = SUPER DUPER SECRET KEY$CR
@@ -47,6 +37,8 @@ init() {
 		username = test
 	EOF
 
+    CREDS_DIR="$AWSCLI_LOGIN_ROOT/.aws-login/credentials.d"
+    CACHE_DIR="$AWSCLI_LOGIN_ROOT/.aws-login/cache"
 }
 
 login_test() {
@@ -57,8 +49,11 @@ login_test() {
     assert_success
 
     assert_equal "$(<$AWS_SHARED_CREDENTIALS_FILE)" "$CREDS_AWS_FILE"
-    assert_exists "$AWSCLI_LOGIN_ROOT/.aws-login/credentials"
-    assert_equal "$(<$AWSCLI_LOGIN_ROOT/.aws-login/credentials)" "$CREDS"
+    assert_not_exists "$AWSCLI_LOGIN_ROOT/.aws-login/credentials"
+    assert_equal "$(<$CREDS_DIR/default)" "$CREDS_DEFAULT"
+    assert_equal "$(<$CREDS_DIR/test)" "$CREDS_TEST"
+    assert_exists "$CACHE_DIR/default"
+    assert_exists "$CACHE_DIR/test"
 }
 
 @test "Login and logout with two profiles" {
@@ -67,21 +62,24 @@ login_test() {
 
     run aws logout
     assert_success
-    assert_equal "$(<$AWSCLI_LOGIN_ROOT/.aws-login/credentials)" "$CREDS_AFTER_LOGOUT"
+    assert_not_exists "$CREDS_DIR/default"
+    assert_not_exists "$CACHE_DIR/default"
+    assert_equal "$(<$CREDS_DIR/test)" "$CREDS_TEST"
 
     run aws logout
     assert_failure
     assert_output "Already logged out!"
-    assert_equal "$(<$AWSCLI_LOGIN_ROOT/.aws-login/credentials)" "$CREDS_AFTER_LOGOUT"
+    assert_equal "$(<$CREDS_DIR/test)" "$CREDS_TEST"
 
     run aws --profile test logout
     assert_success
-    assert_equal "$(<$AWSCLI_LOGIN_ROOT/.aws-login/credentials)" ""
+    assert_not_exists "$CREDS_DIR/test"
+    assert_not_exists "$CACHE_DIR/test"
 
     run aws --profile test logout
     assert_failure
     assert_output "Already logged out!"
-    assert_equal "$(<$AWSCLI_LOGIN_ROOT/.aws-login/credentials)" ""
+    assert_not_exists "$CREDS_DIR/test"
 }
 
 @test "Logout --all" {
@@ -90,7 +88,10 @@ login_test() {
 
     run aws logout --all
     assert_success
-    assert_equal "$(<$AWSCLI_LOGIN_ROOT/.aws-login/credentials)" ""
+    assert_not_exists "$CREDS_DIR/default"
+    assert_not_exists "$CREDS_DIR/test"
+    assert_not_exists "$CACHE_DIR/default"
+    assert_not_exists "$CACHE_DIR/test"
 
     run aws logout
     assert_failure
@@ -100,5 +101,6 @@ login_test() {
     assert_failure
     assert_output "Already logged out!"
 
-    assert_equal "$(<$AWSCLI_LOGIN_ROOT/.aws-login/credentials)" ""
+    assert_not_exists "$CREDS_DIR/default"
+    assert_not_exists "$CREDS_DIR/test"
 }
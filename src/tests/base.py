@@ -6,13 +6,22 @@ import unittest
 from os import environ, makedirs, path, walk, unlink
 from os.path import dirname, relpath, join
 from tempfile import TemporaryDirectory
-from typing import Any, Callable, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional
 from unittest.mock import patch
 
-from awscli_login.config import CONFIG_FILE, CREDENTIALS_FILE
+from awscli_login.config import CONFIG_FILE, CREDENTIALS_DIR, CREDENTIALS_FILE
+from awscli_login.const import JAR_DIR
 
 from .util import exec_awscli, fork, isFileChangedBy, isFileTouchedBy, tree
 from .exceptions import NotRelativePathError
+from .stub import (
+    COOKIES,
+    IDP_PATH,
+    ROLE_ARN,
+    STS_PATH,
+    StubServer,
+    expired_credentials,
+)
 
 PERMISSIONS = [
     ('r', 'read'),
@@ -455,7 +464,10 @@ class CleanAWSLoginEnvironment(TempDir, CleanEnvironment):
 
     @property
     def login_credentials(self) -> str:
-        """Contents of the aws-login credentials file. """
+        """Contents of the aws-login single-file credentials store.
+
+        Profiles migrate this file to `tmpd/.aws-login/credentials.d`.
+        """
         return self.read(CREDENTIALS_FILE)
 
     @login_credentials.setter
@@ -469,7 +481,7 @@ class CleanAWSLoginEnvironment(TempDir, CleanEnvironment):
 
     def setUp(self) -> None:
         """Creates `tmpd/.aws-login/config` and patches `awscli_login.config`
-        to use it. """
+        and `awscli_login.cache` to use it. """
         self._clear_environ('AWSCLI_LOGIN_ROOT')
         super().setUp()
         makedirs(dirname(self.login_config_path), 0o700)
@@ -481,6 +493,13 @@ class CleanAWSLoginEnvironment(TempDir, CleanEnvironment):
         self.home = patcher.start()
         self.addCleanup(patcher.stop)
 
+        patcher = patch(
+                'awscli_login.cache.expanduser',
+                return_value=self.tmpd.name
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     def assertCredentialsFileEquals(self, credentials: str) -> None:
         """Assert aws-login credentials file equals given value.
 
@@ -497,6 +516,24 @@ class CleanAWSLoginEnvironment(TempDir, CleanEnvironment):
             'Did not expect:\n' + login_credentials + '---',
         )
 
+    def assertCredentialsShardEquals(self, name: str,
+                                     credentials: str) -> None:
+        """Assert aws-login credentials file of profile `name` equals value.
+
+        Args:
+            name: Profile name.
+            credentials: Value to compare credentials file to.
+
+        Raises:
+            AssertionError
+        """
+        shard = self.read(join(CREDENTIALS_DIR, name))
+        self.assertEqual(
+            shard,
+            credentials,
+            'Did not expect:\n' + shard + '---',
+        )
+
 
 class CleanAWSEnvironment(TempDir, CleanEnvironment):
     """Class for testing the AWS CLI.
@@ -603,6 +640,49 @@ class CleanTestEnvironment(CleanAWSLoginEnvironment, CleanAWSEnvironment):
     """Sets up a clean test environment in a temporary directory. """
 
 
+class StubTestEnvironment(CleanTestEnvironment):
+    """Sets up a clean test environment for login profiles using a
+    StubServer as their IdP and STS. """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self._clear_environ('AWS_ENDPOINT_URL_STS')
+
+    def configure_stub(self, stub: StubServer,
+                       profiles: Optional[Dict[str, str]] = None,
+                       expired: Iterable[str] = (), **options: str) -> None:
+        """Configure login profiles logging in to `stub`.
+
+        Each profile assumes ROLE_ARN, and each of its IdP users has an
+        unexpired IdP session cookie.
+
+        Args:
+            stub: A running StubServer.
+            profiles: The IdP username of each profile. By default a
+                default profile with the username user.
+            expired: Names of profiles given expired credentials.
+            options: Further settings of every profile.
+        """
+        if profiles is None:
+            profiles = {'default': 'user'}
+
+        self._set_environ('AWS_ENDPOINT_URL_STS', stub.url(STS_PATH))
+        settings = ''.join(f"{k} = {v}\n" for k, v in options.items())
+        self.login_config = ''.join(f"""[{name}]
+ecp_endpoint_url = {stub.url(IDP_PATH)}
+username = {username}
+role_arn = {ROLE_ARN}
+{settings}""" for name, username in profiles.items())
+
+        credentials = ''.join(expired_credentials(name) for name in expired)
+        if credentials:
+            self.login_credentials = credentials
+
+        makedirs(self._abspath(JAR_DIR), exist_ok=True)
+        for username in set(profiles.values()):
+            self.write(join(JAR_DIR, f'{username}.txt'), COOKIES)
+
+
 # These tests depend on wurlitzer. wurlitzer does NOT support Windows:
 # https://github.com/minrk/wurlitzer/issues/12
 @unittest.skipIf(sys.platform.startswith("win"), "Windows is NOT supported!")
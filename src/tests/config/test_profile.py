@@ -1,13 +1,23 @@
+import json
+import os
+
 from copy import copy
 from datetime import datetime
-from os import path
+from os import makedirs, path
 from os.path import isfile
 from typing import Any, Dict
+from unittest.mock import MagicMock
+
+import awscli_login.saml
 
-from awscli_login.config import JAR_DIR
+from awscli_login.cache import read_cache, write_cache
+from awscli_login.config import CREDENTIALS_DIR, JAR_DIR
+from awscli_login.const import ASSERTION_DIR
+from awscli_login.util import token as token_expires
 from awscli_login.exceptions import (
     AlreadyLoggedIn,
     AlreadyLoggedOut,
+    InvalidProfileValue,
     ProfileMissingArgs,
     ProfileNotFound,
 )
@@ -119,6 +129,48 @@ ecp_endpoint_url = foo
             'The username has not been set so cookies must be None!'
         )
 
+    def test_timeout(self):
+        """ Timeouts should default to waiting a limited time. """
+        self.assertEqual(self.profile.timeout, (10, 90))
+        self.assertEqual(self.profile.max_attempts, 3)
+
+    def test_timeout_disabled(self):
+        """ A timeout of zero should wait forever. """
+        self.login_config = """
+[default]
+ecp_endpoint_url = foo
+connect_timeout = 5
+read_timeout = 0
+    """
+        self.Profile()
+
+        self.assertEqual(self.profile.timeout, (5, None))
+
+    def test_timeout_float(self):
+        """ Timeouts may be fractions of a second. """
+        self.login_config = """
+[default]
+ecp_endpoint_url = foo
+connect_timeout = 2.5
+read_timeout = 0.5
+    """
+        self.Profile()
+
+        self.assertEqual(self.profile.timeout, (2.5, 0.5))
+
+    def test_invalid_value(self):
+        """ Values of the wrong type should raise a clear error. """
+        self.login_config = """
+[default]
+ecp_endpoint_url = foo
+connect_timeout = soon
+    """
+        with self.assertRaises(InvalidProfileValue) as e:
+            self.Profile()
+
+        self.assertEqual(str(e.exception), "The login profile (default) has "
+                         "an invalid value for connect_timeout: soon!")
+
     def test_raise_if_logged_in_no_credential_file(self):
         """Ensure no exception is raised if no credential file exists."""
         self.assertFalse(isfile(self.login_credentials_path))
@@ -413,10 +465,9 @@ aws_security_token = 789
         self.Profile(profile='default', no_args=True)
 
     def test_save_credentials(self):
-        """ Test save to ~/.aws-login/credentials """
+        """ Test save to ~/.aws-login/credentials.d """
 
-        credentials = self.login_credentials
-        credentials += """[default]
+        credentials = """[default]
 aws_access_key_id = a
 aws_secret_access_key = b
 aws_session_token = c
@@ -430,7 +481,139 @@ username = NetID
         role = ('love', 'thunder')
         self.profile.username = "NetID"
         self.profile.save_credentials(test_token('a', 'b', 'c'), role)
-        self.assertCredentialsFileEquals(credentials)
+        self.assertCredentialsShardEquals('default', credentials)
+        self.assertHasFilePerms(self.profile.credentials_file, owner='rw')
+
+    def test_save_credentials_concurrent(self):
+        """ Saving should keep profiles saved by other processes. """
+        role = ('love', 'thunder')
+        other = "[other]\naws_role_arn = zeus\n\n"
+        self.write(path.join(CREDENTIALS_DIR, 'other'), other)
+        self.profile.username = "NetID"
+        self.profile.save_credentials(test_token('a', 'b', 'c'), role)
+
+        self.assertCredentialsShardEquals('other', other)
+
+    def test_migrate_credentials_file(self):
+        """ A single credentials file should be split per profile. """
+        self.assertFalse(isfile(self.login_credentials_path))
+        self.assertCredentialsShardEquals('wtf', """[wtf]
+aws_access_key_id = 123
+aws_secret_access_key = 456
+aws_session_token = 789
+aws_security_token = 789
+
+""")
+        self.assertEqual(os.listdir(self.profile.credentials_dir), ['wtf'])
+
+    def test_migrate_credentials_file_keeps_shards(self):
+        """ Migration should not overwrite newer per-profile files. """
+        self.login_credentials = "[wtf]\naws_role_arn = old\n\n"
+        self.profile.reload_credentials()
+
+        self.assertFalse(isfile(self.login_credentials_path))
+        self.assertIn("aws_session_token = 789",
+                      self.read(path.join(CREDENTIALS_DIR, 'wtf')))
+
+    def test_reload_credentials(self):
+        """ Credentials saved by other processes should be reloaded. """
+        self.assertTrue(self.profile.are_credentials_expired())
+        self.login_credentials = """[default]
+aws_access_key_id = a
+aws_secret_access_key = b
+aws_session_token = c
+expiration = 2100-07-13T17:54:39+00:00
+"""
+        self.assertTrue(self.profile.are_credentials_expired())
+
+        with self.profile.lock():
+            self.profile.reload_credentials()
+
+        self.assertFalse(self.profile.are_credentials_expired())
+
+    def test_save_credentials_cache(self):
+        """ Saved credentials should be pre-rendered to the cache. """
+        role = ('love', 'thunder')
+        token = token_expires('a', 'b', 'c', "2100-07-13T17:54:39+00:00")
+        self.profile.save_credentials(token, role)
+
+        self.assertEqual(json.loads(read_cache(self.profile.cache_file)[0]), {
+            'AccessKeyId': 'a',
+            'SecretAccessKey': 'b',
+            'SessionToken': 'c',
+            'Expiration': "2100-07-13T17:54:39+00:00",
+            'Version': 1,
+        })
+
+    def test_remove_credentials_cache(self):
+        """ Removed credentials should be removed from the cache. """
+        role = ('love', 'thunder')
+        token = token_expires('a', 'b', 'c', "2100-07-13T17:54:39+00:00")
+        self.profile.save_credentials(token, role)
+        self.profile.remove_credentials()
+
+        self.assertIsNone(read_cache(self.profile.cache_file)[0])
+
+    def test_remove_all_credentials_cache(self):
+        """ Removing all credentials should empty the cache. """
+        role = ('love', 'thunder')
+        token = token_expires('a', 'b', 'c', "2100-07-13T17:54:39+00:00")
+        self.profile.save_credentials(token, role)
+        other = path.join(self.profile.cache_dir, 'other')
+        write_cache(other, token)
+
+        self.profile.remove_all_credentials()
+
+        self.assertEqual(os.listdir(self.profile.cache_dir), [])
+        self.assertEqual(os.listdir(self.profile.credentials_dir), [])
+
+    def cache_assertions(self) -> str:
+        """ Cache assertions for this profile's IdP and another's. """
+        self.addCleanup(awscli_login.saml._assertions.clear)
+        awscli_login.saml._assertions.update({
+            ('url', 'netid1.txt'): MagicMock(),
+            ('other', 'netid1.txt'): MagicMock(),
+        })
+
+        self.profile.cache_saml_assertion = True
+        filename = self.profile.assertion_file
+        self.profile.ecp_endpoint_url = 'other'
+        other = self.profile.assertion_file
+        self.profile.ecp_endpoint_url = 'url'
+        for name in (filename, other):
+            makedirs(path.dirname(name), exist_ok=True)
+            with open(name, 'w') as f:
+                f.write('{}')
+        return other
+
+    def test_assertion_file(self):
+        """ Assertions should be cached per user and ECP endpoint. """
+        other = self.cache_assertions()
+
+        self.assertNotEqual(self.profile.assertion_file, other)
+        self.assertEqual(path.dirname(self.profile.assertion_file),
+                         self._abspath(ASSERTION_DIR))
+        self.assertRegex(path.basename(other), r'^netid1\.\w+\.json$')
+
+    def test_remove_credentials_assertions(self):
+        """ Logging out should forget the profile's SAML assertions. """
+        other = self.cache_assertions()
+
+        self.profile.remove_credentials()
+
+        self.assertEqual(os.listdir(self._abspath(ASSERTION_DIR)),
+                         [path.basename(other)])
+        self.assertEqual(list(awscli_login.saml._assertions),
+                         [('other', 'netid1.txt')])
+
+    def test_remove_all_credentials_assertions(self):
+        """ Logging out of every profile should forget all assertions. """
+        self.cache_assertions()
+
+        self.profile.remove_all_credentials()
+
+        self.assertEqual(os.listdir(self._abspath(ASSERTION_DIR)), [])
+        self.assertEqual(awscli_login.saml._assertions, {})
 
 
 class TestLoadFromCredentialsFile(ProfileBase):
@@ -481,7 +664,7 @@ ecp_endpoint_url = url
         self.assertFalse(path.exists(self.profile.identity_dir))
         self.profile.write_identity_files([
             "foo",
-            "blah:blah:blah:blah:1234:foo/bar:blah",
+            "arn:aws:iam::1234:role/foo/bar",
         ])
 
         self.assertTrue(path.exists(self.profile.identity_dir))
@@ -1,5 +1,6 @@
 import unittest
 
+from contextlib import nullcontext
 from unittest.mock import (
     MagicMock,
 )
@@ -15,6 +16,9 @@ class MockProfile():
     force_refresh = False
     name = 'default'
     verify_ssl_certificate = True
+    timeout = (10, 90)
+    max_attempts = 3
+    assertion_file = None
     account_names: Dict[str, str] = {}
 
     def raise_if_logged_in(self):
@@ -26,6 +30,12 @@ class MockProfile():
     def write_identity_files(self, role):
         return
 
+    def lock(self):
+        return nullcontext()
+
+    def reload_credentials(self):
+        return
+
 
 class MockBotocoreClient():
     pass
@@ -0,0 +1,170 @@
+""" Stub IdP and STS endpoints for tests that run aws-login processes. """
+import ssl
+import sys
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import path
+from os.path import abspath, dirname
+from typing import Dict, List, Optional
+
+from awscli_login.util import file2bytes
+
+DATA = path.join(dirname(abspath(__file__)), 'data')
+
+IDP_PATH = '/idp'
+STS_PATH = '/sts'
+
+# A self-signed certificate and key for localhost and 127.0.0.1
+TLS_CERT = path.join(DATA, 'localhost.pem')
+
+SAML_SUCCESS = file2bytes(path.join(DATA, 'success.xml'))
+ROLE_ARN = 'arn:aws:iam::378517677616:role/TestShibAdmin'
+
+STS_RESPONSE = b"""<AssumeRoleWithSAMLResponse
+    xmlns="https://sts.amazonaws.com/doc/2011-06-15/">
+  <AssumeRoleWithSAMLResult>
+    <Credentials>
+      <AccessKeyId>ABCDEFGHIJKLMNOPQRSTUVWXYZ</AccessKeyId>
+      <SecretAccessKey>1234567890</SecretAccessKey>
+      <SessionToken>reallycooltoken</SessionToken>
+      <Expiration>2100-07-13T17:54:39Z</Expiration>
+    </Credentials>
+  </AssumeRoleWithSAMLResult>
+  <ResponseMetadata>
+    <RequestId>c6104cbe-af31-11e0-8154-cbc7ccf896c7</RequestId>
+  </ResponseMetadata>
+</AssumeRoleWithSAMLResponse>
+"""
+
+# A failure closing the connection without a response
+DROP = 0
+
+# A cookie jar holding an IdP session cookie for the stub
+COOKIES = """#LWP-Cookies-2.0
+Set-Cookie3: shib_idp_session=abc; path="/"; domain="127.0.0.1"; \
+path_spec; discard; version=0
+"""
+
+RESPONSES = {
+    IDP_PATH: SAML_SUCCESS,
+    STS_PATH: STS_RESPONSE,
+}
+
+
+def expired_credentials(name: str = 'default') -> str:
+    """ Return credentials of the login profile `name` that have expired. """
+    return f"""[{name}]
+aws_access_key_id = abc
+aws_secret_access_key = def
+aws_session_token = ghi
+aws_security_token = ghi
+aws_principal_arn = somearn
+aws_role_arn = {ROLE_ARN}
+username = user
+expiration = 1970-01-01T00:00:00+00:00
+"""
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    """ Answers POSTs with canned responses and counts them. """
+    protocol_version = 'HTTP/1.1'  # Keep connections alive
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        failure = self.server.count(self.path)  # type: ignore[attr-defined]
+        time.sleep(self.server.delay)  # type: ignore[attr-defined]
+
+        if failure == DROP:
+            self.close_connection = True
+            return
+
+        if failure is not None:
+            self.send_error(failure)
+            return
+
+        if self.path not in RESPONSES:
+            self.send_error(404)
+            return
+
+        body = RESPONSES[self.path]
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass  # Keep test output clean
+
+
+def tls_context() -> ssl.SSLContext:
+    """ Return a server context using TLS_CERT. """
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(TLS_CERT)
+    return context
+
+
+class StubServer(ThreadingHTTPServer):
+    """A local IdP and STS.
+
+    Example:
+        >>> with StubServer() as stub:
+        ...     stub.url(IDP_PATH)
+        ...     stub.posts[IDP_PATH]
+        ...     stub.connections
+
+    Faults are injected by setting `delay`, the seconds to wait before
+    answering, or by queueing `failures` for a path. A failure is an
+    HTTP status code to answer with, or DROP:
+
+        >>> stub.failures[IDP_PATH] = [DROP, 503]
+
+    Args:
+        context: If given, serve HTTPS using this TLS context.
+    """
+
+    def __init__(self, context: Optional[ssl.SSLContext] = None) -> None:
+        super().__init__(('127.0.0.1', 0), StubRequestHandler)
+        self.posts: Dict[str, int] = {}
+        self.connections = 0
+        self.resumed = 0  # TLS connections resuming a session
+        self.failures: Dict[str, List[int]] = {}
+        self.delay = 0.0
+        self.scheme = 'http' if context is None else 'https'
+        if context is not None:
+            self.socket = context.wrap_socket(self.socket, server_side=True)
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.serve_forever)
+
+    def process_request(self, request, client_address) -> None:
+        with self._lock:
+            self.connections += 1
+            if getattr(request, 'session_reused', False):
+                self.resumed += 1
+        super().process_request(request, client_address)
+
+    def handle_error(self, request, client_address) -> None:
+        # Clients that time out hang up before they are answered
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def count(self, urlpath: str) -> Optional[int]:
+        """ Count a POST to `urlpath` and return its queued failure. """
+        with self._lock:
+            self.posts[urlpath] = self.posts.get(urlpath, 0) + 1
+            failures = self.failures.get(urlpath)
+            return failures.pop(0) if failures else None
+
+    def url(self, urlpath: str) -> str:
+        return f"{self.scheme}://127.0.0.1:{self.server_port}{urlpath}"
+
+    def __enter__(self) -> 'StubServer':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        self._thread.join()
+        self.server_close()
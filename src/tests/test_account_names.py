@@ -5,6 +5,7 @@ from functools import partial
 from unittest.mock import call, patch
 
 from awscli_login.account_names import _edit_account_names, xargs_handler
+from awscli_login.saml import SamlResponse
 from .login import Login
 
 TEST_CASE_1_ROLES = [
@@ -84,7 +85,8 @@ class TestLoginAccountName(Login):
 
     @patch('awscli_login.account_names.input', return_value='')
     @patch("awscli_login.account_names.refresh",
-           return_value=("SAML", TEST_CASE_1_ROLES))
+           return_value=SamlResponse.from_assertion(
+               "SAML", TEST_CASE_1_ROLES))
     def test_acct_select_prexisting_value(self, mock_refresh, mock_input):
         """ Set account names to prexisting values using return key. """
         self.profile.account_names = TEST_CASE_1_EXISTING
@@ -103,7 +105,8 @@ class TestLoginAccountName(Login):
 
     @patch('awscli_login.account_names.input', return_value='')
     @patch("awscli_login.account_names.refresh",
-           return_value=("SAML", TEST_CASE_1_ROLES))
+           return_value=SamlResponse.from_assertion(
+               "SAML", TEST_CASE_1_ROLES))
     def test_acct_select_default(self, mock_refresh, mock_input):
         """ Set account names to default values using return key. """
         self.session.create_client = partial(create_client_mock,
@@ -121,7 +124,8 @@ class TestLoginAccountName(Login):
 
     @patch('awscli_login.account_names.input', return_value='')
     @patch("awscli_login.account_names.refresh",
-           return_value=("SAML", TEST_CASE_1_ROLES))
+           return_value=SamlResponse.from_assertion(
+               "SAML", TEST_CASE_1_ROLES))
     def test_acct_select_default_auto(self, mock_refresh, mock_input):
         """ Set account names to default values automatically. """
         self.session.create_client = partial(create_client_mock,
@@ -135,7 +139,8 @@ class TestLoginAccountName(Login):
 
     @patch('awscli_login.account_names.input', return_value='')
     @patch("awscli_login.account_names.refresh",
-           return_value=("SAML", TEST_CASE_1_ROLES))
+           return_value=SamlResponse.from_assertion(
+               "SAML", TEST_CASE_1_ROLES))
     def test_acct_select_default_no_alias(self, mock_refresh, mock_input):
         """ Account names w/o an AWS alias are not set by the user. """
         self.session.create_client = partial(create_client_mock, None)
@@ -152,7 +157,8 @@ class TestLoginAccountName(Login):
 
     @patch('awscli_login.account_names.input', return_value="foo")
     @patch("awscli_login.account_names.refresh",
-           return_value=("SAML", TEST_CASE_1_ROLES))
+           return_value=SamlResponse.from_assertion(
+               "SAML", TEST_CASE_1_ROLES))
     def test_acct_name_change_value(self, mock_refresh, mock_input):
         """ Set account names to user supplied value. """
         self.session.create_client = partial(create_client_mock,
@@ -172,7 +178,8 @@ class TestLoginAccountName(Login):
 
     @patch('awscli_login.account_names.input', return_value="foo")
     @patch("awscli_login.account_names.refresh",
-           return_value=("SAML", TEST_CASE_1_ROLES))
+           return_value=SamlResponse.from_assertion(
+               "SAML", TEST_CASE_1_ROLES))
     def test_acct_no_aws_alias(self, mock_refresh, mock_input):
         """ Set account names w/o an AWS alias to user supplied value. """
         self.session.create_client = partial(create_client_mock, None)
@@ -191,7 +198,8 @@ class TestLoginAccountName(Login):
 
     @patch('awscli_login.account_names.input', side_effect=["foo", "bar"])
     @patch("awscli_login.account_names.refresh",
-           return_value=("SAML", TEST_CASE_2_ROLES))
+           return_value=SamlResponse.from_assertion(
+               "SAML", TEST_CASE_2_ROLES))
     def test_acct_dont_ask_twice(self, mock_refresh, mock_input):
         """ Ask for an alias once for each unique account. """
         self.session.create_client = partial(create_client_mock,
@@ -0,0 +1,209 @@
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import unittest
+
+from datetime import datetime, timezone
+from io import StringIO
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from awscli_login.agent import (
+    STS_TIMEOUT,
+    login_timeout,
+    make_server,
+    request_credentials,
+    socket_path,
+)
+from awscli_login.lock import LOCK_TIMEOUT
+from awscli_login.saml import BACKOFF_MAX
+
+from .base import CleanTestEnvironment
+
+CREDENTIALS = """[default]
+aws_access_key_id = ABCDEFGHIJKLMNOPQRSTUVWXYZ
+aws_secret_access_key = 1234567890
+aws_session_token = reallycooltoken
+aws_security_token = reallycooltoken
+aws_principal_arn = somearn
+aws_role_arn = someotherarn
+expiration = %s
+"""
+
+EXPECTED = {
+    "AccessKeyId": "ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+    "SecretAccessKey": "1234567890",
+    "SessionToken": "reallycooltoken",
+    "Expiration": "2100-07-13T17:54:39+00:00",
+    "Version": 1,
+}
+
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), "Requires Unix sockets")
+class AgentTests(CleanTestEnvironment):
+    """ Tests for the credential agent and its client. """
+
+    def setUp(self):
+        super().setUp()
+        self._clear_environ('XDG_RUNTIME_DIR')
+        self._set_environ('XDG_RUNTIME_DIR', self.tmpd.name)
+        self.login_config = "[default]\necp_endpoint_url = foo\n"
+        self.aws_config = "[default]\nregion = us-east-1\n"
+
+    def start_agent(self):
+        """ Run an agent in a background thread until cleanup. """
+        server = make_server(socket_path())
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+
+        self.addCleanup(server.server_close)
+        self.addCleanup(thread.join)
+        self.addCleanup(server.shutdown)
+        return server
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def request(self, stdout):
+        """ Request credentials for the default profile. """
+        with patch('sys.stderr', new_callable=StringIO) as stderr:
+            code = request_credentials('default')
+        return code, stdout.getvalue(), stderr.getvalue()
+
+    def test_no_agent(self):
+        """ The client should return None if no agent is running. """
+        self.assertEqual(self.request(), (None, '', ''))
+
+    def test_no_runtime_dir(self):
+        """ The agent is unsupported if XDG_RUNTIME_DIR is not set. """
+        self._set_environ('XDG_RUNTIME_DIR', None)
+        self.assertIsNone(socket_path())
+
+    def test_cached_credentials(self):
+        """ The agent should return unexpired credentials. """
+        self.login_credentials = CREDENTIALS % "2100-07-13T17:54:39+00:00"
+        self.start_agent()
+
+        code, out, err = self.request()
+
+        self.assertEqual((code, err), (0, ''))
+        self.assertEqual(json.loads(out), EXPECTED)
+
+    @patch('awscli_login.__main__.login')
+    def test_expired_credentials(self, login):
+        """ The agent should log in again if credentials are expired. """
+        self.login_credentials = CREDENTIALS % "1970-01-01T17:54:39+00:00"
+        login.return_value = {'Credentials': {
+            "AccessKeyId": "ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+            "SecretAccessKey": "1234567890",
+            "SessionToken": "reallycooltoken",
+            "Expiration": datetime(2100, 7, 13, 17, 54, 39,
+                                   tzinfo=timezone.utc),
+        }}
+        server = self.start_agent()
+
+        code, out, err = self.request()
+
+        self.assertEqual((code, err), (0, ''))
+        self.assertEqual(json.loads(out), EXPECTED)
+        entry = server.agent._entries['default']  # type: ignore
+        login.assert_called_once_with(entry.profile, entry.session,
+                                      interactive=False, client=entry.sts)
+
+    @patch('awscli_login.agent.ACCEPT_TIMEOUT', 0.1)
+    @patch('awscli_login.__main__.login')
+    def test_slow_login(self, login):
+        """ Clients should wait for logins the agent has accepted. """
+        self.login_credentials = CREDENTIALS % "1970-01-01T17:54:39+00:00"
+
+        def slow_login(*args, **kwargs):
+            time.sleep(0.5)
+            return {'Credentials': {
+                "AccessKeyId": "ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+                "SecretAccessKey": "1234567890",
+                "SessionToken": "reallycooltoken",
+                "Expiration": datetime(2100, 7, 13, 17, 54, 39,
+                                       tzinfo=timezone.utc),
+            }}
+
+        login.side_effect = slow_login
+        self.start_agent()
+
+        code, out, err = self.request()
+
+        self.assertEqual((code, err), (0, ''))
+        self.assertEqual(json.loads(out), EXPECTED)
+
+    @patch('awscli_login.agent.ACCEPT_TIMEOUT', 0.1)
+    def test_stuck_agent(self):
+        """ Clients should not wait long on an agent that does not answer. """
+        spath = socket_path()
+        os.makedirs(os.path.dirname(spath))
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+            server.bind(spath)
+            server.listen()
+
+            start = time.monotonic()
+            self.assertEqual(self.request(), (None, '', ''))
+            self.assertLess(time.monotonic() - start, 5)
+
+    def test_login_timeout(self):
+        """ Logins may take as long as the profile's IdP timeouts allow. """
+        profile = SimpleNamespace(timeout=(10, 90), max_attempts=3)
+        self.assertEqual(login_timeout(profile), LOCK_TIMEOUT +
+                         3 * (100 + BACKOFF_MAX) + STS_TIMEOUT)
+
+        profile.timeout = (10, None)
+        self.assertIsNone(login_timeout(profile))
+
+    def test_logged_out(self):
+        """ The agent should return an error if logged out. """
+        self.start_agent()
+
+        self.assertEqual(self.request(), (3, '', 'Already logged out!\n'))
+
+    def test_profile_reloaded(self):
+        """ The agent should reload profiles changed by other processes. """
+        self.start_agent()
+        self.assertEqual(self.request()[0], 3)
+
+        self.login_credentials = CREDENTIALS % "2100-07-13T17:54:39+00:00"
+        code, out, _ = self.request()
+
+        self.assertEqual(code, 0)
+        self.assertEqual(json.loads(out), EXPECTED)
+
+    def test_different_root(self):
+        """ The agent should decline requests for other login roots. """
+        self.start_agent()
+        self._set_environ('AWSCLI_LOGIN_ROOT', self.tmpd.name + '/other')
+
+        self.assertEqual(self.request(), (None, '', ''))
+
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), "Requires Unix sockets")
+class CredentialProcessAgentTests(CleanTestEnvironment):
+    """ Tests that aws-login consults the agent before logging in. """
+
+    @patch('awscli_login.credentials._main')
+    @patch('awscli_login.agent.request_credentials', return_value=0)
+    def test_agent_used(self, request_credentials, _main):
+        """ aws-login should not log in if the agent answered. """
+        with patch.object(sys, 'argv', ['aws-login', '--profile', 'default']):
+            from awscli_login.credentials import main
+            self.assertEqual(main(), 0)
+
+        request_credentials.assert_called_once_with('default')
+        _main.assert_not_called()
+
+    @patch('awscli_login.credentials._main', return_value=0)
+    @patch('awscli_login.agent.request_credentials', return_value=None)
+    def test_agent_not_running(self, request_credentials, _main):
+        """ aws-login should log in itself if no agent is running. """
+        with patch.object(sys, 'argv', ['aws-login', '--profile', 'default']):
+            from awscli_login.credentials import main
+            self.assertEqual(main(), 0)
+
+        request_credentials.assert_called_once_with('default')
+        _main.assert_called_once()
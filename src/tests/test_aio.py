@@ -0,0 +1,129 @@
+import asyncio
+import os
+
+import awscli_login.saml
+
+from awscli_login.aio import _acquire, profile_names, refresh_profiles
+from awscli_login.const import ASSERTION_DIR
+from awscli_login.credentials import refresh_all
+from awscli_login.exceptions import AlreadyLoggedOut
+from awscli_login.lock import FileLock
+
+from .base import StubTestEnvironment
+from .stub import IDP_PATH, STS_PATH, StubServer
+
+NAMES = ['default', 'dev', 'prod']
+
+
+class RefreshProfilesTests(StubTestEnvironment):
+    """ Tests for refreshing many profiles in one process. """
+
+    def setUp(self):
+        super().setUp()
+        self.aws_config = "[default]\nregion = us-east-1\n" + \
+            ''.join(f"[profile {name}]\nregion = us-east-1\n"
+                    for name in NAMES[1:])
+
+    def expire(self, stub: StubServer, *names: str) -> None:
+        """ Configure expired login profiles using `stub`. """
+        self.configure_stub(stub, dict.fromkeys(NAMES, 'user'), names)
+
+    def test_profile_names(self):
+        """ Every profile in the config should be listed. """
+        with StubServer() as stub:
+            self.expire(stub)
+
+        self.assertEqual(profile_names(), NAMES)
+
+    def test_refresh_profiles(self):
+        """ Expired profiles should be refreshed concurrently. """
+        with StubServer() as stub:
+            self.expire(stub, *NAMES)
+
+            results = asyncio.run(refresh_profiles(NAMES, concurrency=2))
+
+            self.assertEqual(stub.posts, {IDP_PATH: 3, STS_PATH: 3})
+        for name in NAMES:
+            self.assertEqual(
+                results[name]['Credentials']['AccessKeyId'],
+                'ABCDEFGHIJKLMNOPQRSTUVWXYZ', name)
+
+    def test_shared_assertion_file(self):
+        """ Profiles caching one assertion file should all be refreshed. """
+        names = [f'profile{i}' for i in range(8)]
+        self.addCleanup(awscli_login.saml._assertions.clear)
+
+        with StubServer() as stub:
+            self.configure_stub(stub, dict.fromkeys(names, 'user'), names,
+                                cache_saml_assertion='true')
+            self.aws_config = ''.join(f"[profile {name}]\n"
+                                      "region = us-east-1\n"
+                                      for name in names)
+
+            results = asyncio.run(refresh_profiles(names,
+                                                   concurrency=len(names)))
+
+        for name in names:
+            self.assertIn('Credentials', results[name], name)
+        self.assertRegex(' '.join(os.listdir(self._abspath(ASSERTION_DIR))),
+                         r'^user\.\w+\.json$')
+
+    def test_unexpired(self):
+        """ Refreshed profiles should not be refreshed again. """
+        with StubServer() as stub:
+            self.expire(stub, *NAMES)
+            asyncio.run(refresh_profiles(NAMES))
+
+            asyncio.run(refresh_profiles(NAMES))
+
+            self.assertEqual(stub.posts, {IDP_PATH: 3, STS_PATH: 3})
+
+    def test_logged_out(self):
+        """ Errors should be returned for each profile. """
+        with StubServer() as stub:
+            self.expire(stub, 'dev')
+
+            results = asyncio.run(refresh_profiles(NAMES))
+
+            self.assertEqual(stub.posts, {IDP_PATH: 1, STS_PATH: 1})
+        self.assertIsInstance(results['default'], AlreadyLoggedOut)
+        self.assertIsInstance(results['prod'], AlreadyLoggedOut)
+        self.assertIn('Credentials', results['dev'])
+
+    def test_refresh_all(self):
+        """ Logged out profiles should not fail aws-login --refresh-all. """
+        with StubServer() as stub:
+            self.expire(stub, 'dev')
+
+            self.assertEqual(refresh_all(), 0)
+
+    def test_refresh_all_failed(self):
+        """ Failed refreshes should fail aws-login --refresh-all. """
+        with StubServer() as stub:
+            self.expire(stub, 'dev')
+            stub.failures[IDP_PATH] = [401]
+
+            with self.assertLogs('awscli_login', 'ERROR') as logs:
+                self.assertEqual(refresh_all(), 1)
+
+        self.assertRegex(logs.output[0], 'dev: 401 Client Error')
+
+    def test_cancelled_acquire(self):
+        """ A lock taken after its waiter was cancelled is released. """
+        filename = self._abspath('test.lock')
+        holder = FileLock(filename)
+        self.assertTrue(holder.acquire())
+        lock = FileLock(filename, timeout=5)
+
+        async def cancel():
+            task = asyncio.create_task(_acquire(lock))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+            holder.release()
+            return await asyncio.to_thread(FileLock(filename, 2).acquire)
+
+        self.assertTrue(asyncio.run(cancel()))
+        self.assertIsNone(lock._fd)
@@ -0,0 +1,53 @@
+import unittest
+
+from benchmarks.harness import compare, measure, measure_memory, summarize
+
+
+def report(**medians):
+    return {'results': {k: {'median': v} for k, v in medians.items()}}
+
+
+class BenchmarkHarnessTests(unittest.TestCase):
+    """ Tests for the benchmark harness. """
+
+    def test_measure(self):
+        """ Setup should run before each timed call. """
+        calls = []
+        times = measure(lambda: calls.append('run'), 3,
+                        lambda: calls.append('setup'))
+
+        self.assertEqual(len(times), 3)
+        self.assertEqual(calls, ['setup', 'run'] * 3)
+
+    def test_measure_memory(self):
+        """ Peak allocations of each call should be measured. """
+        peaks = measure_memory(lambda: bytearray(2 ** 20), 2)
+
+        self.assertEqual(len(peaks), 2)
+        for peak in peaks:
+            self.assertGreaterEqual(peak, 2 ** 20)
+
+    def test_summarize(self):
+        """ Times should be summarized in milliseconds. """
+        self.assertEqual(summarize([0.001, 0.002, 0.006]), {
+            'min': 1.0,
+            'median': 2.0,
+            'mean': 3.0,
+            'stdev': 2.6457513110645907,
+            'repeat': 3,
+        })
+
+    def test_summarize_memory(self):
+        """ Peak allocations should be summarized in MiB. """
+        self.assertEqual(summarize([2 ** 20, 2 ** 21], 'MiB')['median'], 1.5)
+
+    def test_compare(self):
+        """ Only large slowdowns of the median should be regressions. """
+        baseline = report(fast=1.0, slow=100.0, same=50.0, gone=1.0)
+        current = report(fast=2.5, slow=125.0, same=50.0, new=1.0)
+
+        self.assertEqual(compare(current, baseline), [
+            ('fast', 1.0, 2.5, False),  # Below MIN_DELTA
+            ('slow', 100.0, 125.0, True),
+            ('same', 50.0, 50.0, False),
+        ])
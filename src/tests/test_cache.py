@@ -0,0 +1,215 @@
+import json
+import os
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from os import makedirs, path
+from time import time
+
+from awscli_login.cache import (
+    HEADER,
+    REFRESH_LOCK_TIMEOUT,
+    acquire_refresh_lock,
+    load_cached_credentials,
+    read_cache,
+    refresh_lock_file,
+    release_refresh_lock,
+    remove_cache,
+    write_atomic,
+    write_cache,
+)
+from awscli_login.const import CREDENTIALS_DIR
+
+from .base import CleanAWSLoginEnvironment, TempDir
+
+
+class LoadCachedCredentials(CleanAWSLoginEnvironment):
+    """ Tests for the import-light credentials reader. """
+
+    CREDENTIALS = """[default]
+aws_access_key_id = ABCDEFGHIJKLMNOPQRSTUVWXYZ
+aws_secret_access_key = 1234567890
+aws_session_token = reallycooltoken
+aws_security_token = reallycooltoken
+aws_principal_arn = somearn
+aws_role_arn = someotherarn
+expiration = %s
+"""
+
+    def test_load_cached_credentials(self):
+        """ Unexpired credentials should be returned as a token. """
+        self.login_credentials = self.CREDENTIALS % "2100-07-13T17:54:39"
+        token = {
+            'Credentials': {
+                'AccessKeyId': 'ABCDEFGHIJKLMNOPQRSTUVWXYZ',
+                'SecretAccessKey': '1234567890',
+                'SessionToken': 'reallycooltoken',
+                'Expiration': datetime(2100, 7, 13, 17, 54, 39),
+            }
+        }
+
+        self.assertEqual(load_cached_credentials('default'), token)
+
+    def test_load_cached_credentials_expired(self):
+        """ Expired credentials should not be returned. """
+        self.login_credentials = self.CREDENTIALS % "1970-01-01T17:54:39Z"
+        self.assertIsNone(load_cached_credentials('default'))
+
+    def test_load_cached_credentials_invalid_expiration(self):
+        """ Credentials with an invalid expiration should not be returned. """
+        self.login_credentials = self.CREDENTIALS % "abc"
+        self.assertIsNone(load_cached_credentials('default'))
+
+    def test_load_cached_credentials_logged_out(self):
+        """ Credentials without a role should not be returned. """
+        self.login_credentials = (self.CREDENTIALS % "2100-07-13T17:54:39") \
+            .replace("aws_role_arn = someotherarn\n", "")
+        self.assertIsNone(load_cached_credentials('default'))
+
+    def test_load_cached_credentials_missing_profile(self):
+        """ Credentials of other profiles should not be returned. """
+        self.login_credentials = self.CREDENTIALS % "2100-07-13T17:54:39"
+        self.assertIsNone(load_cached_credentials('foo'))
+
+    def test_load_cached_credentials_shard(self):
+        """ Per-profile credentials files should be read first. """
+        self.login_credentials = self.CREDENTIALS % "1970-01-01T17:54:39"
+        makedirs(self._abspath(CREDENTIALS_DIR))
+        self.write(path.join(CREDENTIALS_DIR, 'default'),
+                   self.CREDENTIALS % "2100-07-13T17:54:39")
+
+        token = load_cached_credentials('default')
+
+        self.assertEqual(token['Credentials']['Expiration'],
+                         datetime(2100, 7, 13, 17, 54, 39))
+
+    def test_load_cached_credentials_no_file(self):
+        """ None should be returned if no credentials are cached. """
+        self.assertIsNone(load_cached_credentials('default'))
+
+
+class PreRenderedCache(TempDir):
+    """ Tests for the pre-rendered credential_process output cache. """
+
+    def setUp(self):
+        super().setUp()
+        self.filename = self._abspath('default')
+
+    def token(self, expiration):
+        return {
+            'Credentials': {
+                'AccessKeyId': 'ABCDEFGHIJKLMNOPQRSTUVWXYZ',
+                'SecretAccessKey': '1234567890',
+                'SessionToken': 'reallycooltoken',
+                'Expiration': expiration,
+            }
+        }
+
+    def test_write_read_cache(self):
+        """ Cached output should equal the credential_process output. """
+        expiration = datetime.now(timezone.utc) + timedelta(hours=1)
+        write_cache(self.filename, self.token(expiration))
+
+        output, refresh = read_cache(self.filename)
+
+        self.assertFalse(refresh)
+        self.assertTrue(output.endswith('\n'))
+        self.assertEqual(json.loads(output), {
+            'AccessKeyId': 'ABCDEFGHIJKLMNOPQRSTUVWXYZ',
+            'SecretAccessKey': '1234567890',
+            'SessionToken': 'reallycooltoken',
+            'Expiration': expiration.isoformat(),
+            'Version': 1,
+        })
+        self.assertHasFilePerms(self.filename, owner='rw')
+
+    def test_read_cache_expired(self):
+        """ Expired credentials should not be read from the cache. """
+        expiration = datetime.now(timezone.utc) - timedelta(seconds=1)
+        write_cache(self.filename, self.token(expiration))
+
+        self.assertEqual(read_cache(self.filename), (None, False))
+
+    def test_read_cache_string_expiration(self):
+        """ An ISO 8601 string expiration should be cached. """
+        write_cache(self.filename, self.token('2100-07-13T17:54:39+00:00'))
+
+        output = json.loads(read_cache(self.filename)[0])
+        self.assertEqual(output['Expiration'], '2100-07-13T17:54:39+00:00')
+
+    def test_read_cache_invalid(self):
+        """ A file without a valid header should not be read. """
+        self.write('default', 'garbage' * HEADER.size)
+        self.assertEqual(read_cache(self.filename), (None, False))
+
+        self.write('default', 'x')
+        self.assertEqual(read_cache(self.filename), (None, False))
+
+    def test_read_cache_missing(self):
+        """ A missing cache file should not be read. """
+        self.assertEqual(read_cache(self.filename), (None, False))
+
+    def test_remove_cache(self):
+        """ Removed caches should not be read. """
+        write_cache(self.filename, self.token('2100-07-13T17:54:39+00:00'))
+        remove_cache(self.filename)
+        remove_cache(self.filename)  # Removing twice is not an error
+
+        self.assertEqual(read_cache(self.filename), (None, False))
+
+    def test_write_atomic_threads(self):
+        """ Threads writing one file should not fail or mix writes. """
+        data = [str(i).encode() * 4096 for i in range(8)]
+
+        with ThreadPoolExecutor(len(data)) as pool:
+            list(pool.map(lambda d: write_atomic(self.filename, d),
+                          data * 8))
+
+        with open(self.filename, 'rb') as f:
+            self.assertIn(f.read(), data)
+        self.assertEqual(os.listdir(self._abspath('.')), ['default'])
+        self.assertHasFilePerms(self.filename, owner='rw')
+
+    def test_read_cache_refresh_ahead(self):
+        """ Credentials within refresh_ahead should be refreshed. """
+        expiration = datetime.now(timezone.utc) + timedelta(hours=1)
+        write_cache(self.filename, self.token(expiration), 600)
+        self.assertFalse(read_cache(self.filename)[1])
+
+        expiration = datetime.now(timezone.utc) + timedelta(minutes=5)
+        write_cache(self.filename, self.token(expiration), 600)
+        self.assertFalse(read_cache(self.filename)[1],
+                         "At most half the lifetime should be refreshed")
+
+        header = HEADER.pack(b'AWL1', time() + 300, time() - 1)
+        with open(self.filename, 'rb') as f:
+            data = header + f.read()[HEADER.size:]
+        with open(self.filename, 'wb') as f:
+            f.write(data)
+        output, refresh = read_cache(self.filename)
+        self.assertIsNotNone(output)
+        self.assertTrue(refresh)
+
+
+class RefreshLock(CleanAWSLoginEnvironment):
+    """ Tests for the background refresh lock. """
+
+    def test_acquire_release(self):
+        """ Only one process should hold the refresh lock at a time. """
+        self.assertTrue(acquire_refresh_lock('default'))
+        self.assertFalse(acquire_refresh_lock('default'))
+        self.assertTrue(acquire_refresh_lock('other'))
+
+        release_refresh_lock('default')
+        release_refresh_lock('default')  # Releasing twice is not an error
+        self.assertTrue(acquire_refresh_lock('default'))
+        self.assertHasFilePerms(refresh_lock_file('default'), owner='rw')
+
+    def test_stale_lock(self):
+        """ A stale refresh lock should be broken. """
+        self.assertTrue(acquire_refresh_lock('default'))
+        stale = time() - REFRESH_LOCK_TIMEOUT - 1
+        os.utime(refresh_lock_file('default'), (stale, stale))
+
+        self.assertTrue(acquire_refresh_lock('default'))
+        self.assertFalse(acquire_refresh_lock('default'))
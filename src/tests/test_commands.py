@@ -0,0 +1,131 @@
+import subprocess
+import sys
+
+from argparse import Namespace
+from unittest.mock import MagicMock, patch
+
+from awscli_login import LazyCommand, inject_commands
+from awscli_login.commands import (
+    AccountNames,
+    Login,
+    Logout,
+    run_in_subprocess,
+)
+
+from .base import CleanEnvironment
+
+# Registers the plugin commands in a fresh interpreter then reports
+# which awscli_login modules were imported.
+INJECT_COMMANDS = """
+import sys
+from unittest.mock import MagicMock
+from awscli_login import inject_commands
+inject_commands({}, MagicMock())
+print(sorted(m for m in sys.modules if m.startswith('awscli_login')))
+"""
+
+
+class CommandTests(CleanEnvironment):
+    """ Tests for running plugin subcommands. """
+
+    def setUp(self):
+        super().setUp()
+        self._clear_environ('AWSCLI_LOGIN_SUBPROCESS')
+        self.session = MagicMock(profile='foo')
+
+    def test_run_in_subprocess(self):
+        """ Subcommands should only run in a subprocess if needed. """
+        self.assertFalse(run_in_subprocess())
+
+        with patch.object(sys, 'frozen', True, create=True):
+            self.assertTrue(run_in_subprocess())
+
+            self._set_environ('AWSCLI_LOGIN_SUBPROCESS', '0')
+            self.assertFalse(run_in_subprocess())
+
+        self._set_environ('AWSCLI_LOGIN_SUBPROCESS', '1')
+        self.assertTrue(run_in_subprocess())
+
+    @patch('subprocess.run')
+    @patch('awscli_login.__main__.logout', return_value=0)
+    def test_logout_in_process(self, logout, run):
+        """ Logout should call logout with the awscli session. """
+        args = Namespace(all=False, verbose=0)
+
+        code = Logout(self.session)._run_main(args, None)
+
+        self.assertEqual(code, 0)
+        logout.assert_called_once_with(args, self.session)
+        run.assert_not_called()
+
+    @patch('awscli_login.account_names.edit_account_names', return_value=0)
+    def test_alias_in_process(self, edit_account_names):
+        """ Alias should call edit_account_names with the awscli session. """
+        args = Namespace(auto=True)
+
+        code = AccountNames(self.session)._run_main(args, None)
+
+        self.assertEqual(code, 0)
+        edit_account_names.assert_called_once_with(args, self.session)
+
+    @patch('awscli_login.commands.exit_if_credential_process_not_set',
+           return_value=0)
+    @patch('awscli_login.__main__.main', return_value=0)
+    def test_login_in_process(self, main, exit_if_not_set):
+        """ Login should call main with the awscli session. """
+        args = Namespace(debug_info=False, verbose=0)
+
+        code = Login(self.session)._run_main(args, None)
+
+        self.assertEqual(code, 0)
+        main.assert_called_once_with(args, self.session)
+
+    @patch('subprocess.run')
+    @patch('awscli_login.__main__.logout')
+    def test_logout_subprocess(self, logout, run):
+        """ Logout should run aws-login when a subprocess is required. """
+        self._set_environ('AWSCLI_LOGIN_SUBPROCESS', '1')
+        run.return_value.returncode = 3
+
+        code = Logout(self.session)._run_main(Namespace(all=True), None)
+
+        self.assertEqual(code, 3)
+        logout.assert_not_called()
+        cmd = run.call_args[0][0]
+        self.assertEqual(cmd[:2], ['aws-login', '--logout'])
+        self.assertEqual(cmd[3:], ['--profile', 'foo'])
+
+
+class PluginTests(CleanEnvironment):
+    """ Tests for registering the plugin commands. """
+
+    def test_inject_commands_imports_nothing(self):
+        """ Registering commands should not import awscli_login.commands. """
+        out = subprocess.run([sys.executable, '-c', INJECT_COMMANDS],
+                             capture_output=True, text=True, check=True)
+
+        self.assertEqual(out.stdout.strip(), "['awscli_login']")
+
+    def test_inject_commands(self):
+        """ Commands should be created on first use. """
+        session = MagicMock(profile='foo')
+        command_table = {}
+
+        inject_commands(command_table, session)
+
+        login = command_table['login']
+        self.assertIsInstance(login, LazyCommand)
+        self.assertIsNone(login._command)
+        self.assertEqual(login.NAME, 'login')
+        self.assertIsInstance(login.command, Login)
+        self.assertIs(login.command._session, session)
+        self.assertIsInstance(command_table['logout'].command, Logout)
+
+    def test_lazy_command_call(self):
+        """ Calling a LazyCommand should call the command. """
+        command = LazyCommand('Logout', MagicMock())
+
+        with patch.object(Logout, '__call__', return_value=0) as call:
+            self.assertEqual(command(['--all'], None), 0)
+
+        call.assert_called_once_with(['--all'], None)
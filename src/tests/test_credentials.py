@@ -1,13 +1,57 @@
+import json
+import os
+import subprocess
+import sys
+
 from unittest.mock import (
     MagicMock,
     patch,
 )
 
+from io import StringIO
+from os import makedirs, path
+from time import time
+
+import awscli_login
+
+from awscli_login.cache import (
+    HEADER,
+    MAGIC,
+    acquire_refresh_lock,
+    render_credentials,
+    write_cache,
+)
+from awscli_login.const import CACHE_DIR
 from awscli_login.credentials import (
+    LazySession,
     get_credentials,
+    main,
 )
 
+from .base import CleanAWSLoginEnvironment, StubTestEnvironment
 from .login import Login
+from .stub import IDP_PATH, STS_PATH, StubServer
+
+HEAVY_MODULES = ['botocore', 'keyring', 'lxml', 'requests', 'vcr']
+
+# Runs aws-login in a fresh interpreter then reports which of the
+# HEAVY_MODULES were imported on stderr.
+AWS_LOGIN = """
+import sys
+from awscli_login.credentials import main
+sys.argv = ['aws-login', '--profile', 'default']
+code = main()
+print(sorted(set(m.split('.')[0] for m in sys.modules) & set(%r)),
+      file=sys.stderr)
+sys.exit(code)
+""" % HEAVY_MODULES
+
+# Runs get_credentials, bypassing the caches read by main.
+GET_CREDENTIALS = AWS_LOGIN.replace(
+    "code = main()",
+    "from argparse import Namespace\n"
+    "from awscli_login.credentials import LazySession, _main\n"
+    "code = _main(Namespace(profile='default'), LazySession('default'))")
 
 
 class awsLoginTests(Login):
@@ -39,6 +83,9 @@ class awsLoginTests(Login):
             self.profile.ecp_endpoint_url,
             self.profile.cookies,
             self.profile.verify_ssl_certificate,
+            timeout=self.profile.timeout,
+            max_attempts=self.profile.max_attempts,
+            assertion_file=self.profile.assertion_file,
         )
         self.profile.get_credentials.assert_not_called()
         authenticate.assert_not_called()
@@ -68,3 +115,252 @@ class awsLoginTests(Login):
         login.assert_not_called()
         self.profile.load_credentials.assert_called()
         print_credentials.assert_called_with(fake_token)
+
+
+class LazySessionTests(CleanAWSLoginEnvironment):
+    """ Tests for the session created on first use. """
+
+    @patch('botocore.session.Session')
+    def test_lazy_session(self, Session):
+        """ The session should only be created when used. """
+        session = LazySession('foo')
+
+        self.assertEqual(session.profile, 'foo')
+        Session.assert_not_called()
+
+        session.create_client('sts')
+        session.create_client('sts')
+
+        Session.assert_called_once_with(profile='foo')
+        self.assertEqual(Session().create_client.call_count, 2)
+
+    @patch('botocore.session.Session')
+    def test_lazy_session_environ(self, Session):
+        """ A missing profile should be read from the environment. """
+        self._clear_environ('AWS_DEFAULT_PROFILE')
+        self._clear_environ('AWS_PROFILE')
+
+        self.assertIsNone(LazySession().profile)
+
+        self._set_environ('AWS_PROFILE', 'foo')
+        self.assertEqual(LazySession().profile, 'foo')
+        self.assertEqual(LazySession('bar').profile, 'bar')
+
+        self._set_environ('AWS_DEFAULT_PROFILE', 'baz')
+        session = LazySession()
+        self.assertEqual(session.profile, 'baz')
+        Session.assert_not_called()
+
+        session.create_client('sts')
+        Session.assert_called_once_with(profile='baz')
+
+
+class awsLoginFastPathTests(CleanAWSLoginEnvironment):
+    """ Tests the aws-login cache hit path. """
+
+    def aws_login(self, script: str = AWS_LOGIN) \
+            -> subprocess.CompletedProcess:
+        """ Runs aws-login in a subprocess rooted in tmpd. """
+        env = os.environ.copy()
+        env['AWSCLI_LOGIN_ROOT'] = self.tmpd.name
+        env['PYTHONPATH'] = os.path.dirname(
+            os.path.dirname(awscli_login.__file__))
+
+        return subprocess.run([sys.executable, '-c', script], env=env,
+                              capture_output=True, text=True)
+
+    def test_cache_hit_skips_heavy_imports(self):
+        """ A cache hit should print credentials without heavy imports. """
+        self.login_credentials = """[default]
+aws_access_key_id = ABCDEFGHIJKLMNOPQRSTUVWXYZ
+aws_secret_access_key = 1234567890
+aws_session_token = reallycooltoken
+aws_security_token = reallycooltoken
+aws_principal_arn = somearn
+aws_role_arn = someotherarn
+expiration = 2100-07-13T17:54:39+00:00
+"""
+        proc = self.aws_login()
+
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertEqual(proc.stderr, "[]\n")
+        self.assertEqual(json.loads(proc.stdout), {
+            "AccessKeyId": "ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+            "SecretAccessKey": "1234567890",
+            "SessionToken": "reallycooltoken",
+            "Expiration": "2100-07-13T17:54:39+00:00",
+            "Version": 1,
+        })
+
+    def test_pre_rendered_cache_hit(self):
+        """ Pre-rendered output should be printed as is. """
+        makedirs(self._abspath(CACHE_DIR))
+        write_cache(self._abspath(path.join(CACHE_DIR, 'default')), {
+            'Credentials': {
+                "AccessKeyId": "ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+                "SecretAccessKey": "1234567890",
+                "SessionToken": "reallycooltoken",
+                "Expiration": "2100-07-13T17:54:39+00:00",
+            }
+        })
+        proc = self.aws_login()
+
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertEqual(proc.stderr, "[]\n")
+        self.assertEqual(proc.stdout, '{"AccessKeyId": '
+                         '"ABCDEFGHIJKLMNOPQRSTUVWXYZ", "SecretAccessKey": '
+                         '"1234567890", "SessionToken": "reallycooltoken", '
+                         '"Expiration": "2100-07-13T17:54:39+00:00", '
+                         '"Version": 1}\n')
+
+    def test_get_credentials_skips_heavy_imports(self):
+        """ get_credentials should not import botocore unless logging in. """
+        self.login_credentials = """[default]
+aws_access_key_id = ABCDEFGHIJKLMNOPQRSTUVWXYZ
+aws_secret_access_key = 1234567890
+aws_session_token = reallycooltoken
+aws_security_token = reallycooltoken
+aws_principal_arn = somearn
+aws_role_arn = someotherarn
+expiration = 2100-07-13T17:54:39+00:00
+"""
+        proc = self.aws_login(GET_CREDENTIALS)
+
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertEqual(proc.stderr, "[]\n")
+        self.assertEqual(json.loads(proc.stdout)['SessionToken'],
+                         "reallycooltoken")
+
+    def test_cache_miss_falls_back(self):
+        """ A logged out profile should fail without heavy imports. """
+        proc = self.aws_login()
+
+        self.assertEqual(proc.returncode, 3)
+        self.assertEqual(proc.stderr, "Already logged out!\n[]\n")
+
+
+class awsLoginRefreshAheadTests(CleanAWSLoginEnvironment):
+    """ Tests the aws-login background refresh. """
+
+    TOKEN = {
+        'Credentials': {
+            "AccessKeyId": "ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+            "SecretAccessKey": "1234567890",
+            "SessionToken": "reallycooltoken",
+            "Expiration": "2100-07-13T17:54:39+00:00",
+        }
+    }
+
+    def setUp(self):
+        super().setUp()
+        makedirs(self._abspath(CACHE_DIR))
+
+    def write_cache(self, refresh: float):
+        """ Writes a pre-rendered cache to be refreshed at `refresh`. """
+        header = HEADER.pack(MAGIC, time() + 300, refresh)
+        output = render_credentials(self.TOKEN) + '\n'
+        with open(self._abspath(path.join(CACHE_DIR, 'default')), 'wb') as f:
+            f.write(header + output.encode('utf-8'))
+        return output
+
+    def aws_login(self, *args):
+        """ Runs aws-login for the default profile in process. """
+        argv = ['aws-login', '--profile', 'default', *args]
+        with patch.object(sys, 'argv', argv), \
+                patch('subprocess.Popen') as popen, \
+                patch('sys.stdout', new_callable=StringIO) as stdout:
+            code = main()
+        return code, stdout.getvalue(), popen
+
+    def test_refresh_started(self):
+        """ Credentials in the refresh window should refresh once. """
+        output = self.write_cache(time() - 1)
+
+        code, out, popen = self.aws_login()
+
+        self.assertEqual((code, out), (0, output))
+        popen.assert_called_once()
+        self.assertEqual(popen.call_args[0][0][-3:],
+                         ['--profile', 'default', '--refresh'])
+
+        code, out, popen = self.aws_login()
+
+        self.assertEqual((code, out), (0, output))
+        popen.assert_not_called()
+
+    def test_refresh_not_started(self):
+        """ Credentials outside the refresh window should not refresh. """
+        output = self.write_cache(time() + 60)
+
+        code, out, popen = self.aws_login()
+
+        self.assertEqual((code, out), (0, output))
+        popen.assert_not_called()
+
+    @patch('awscli_login.credentials.login')
+    def test_refresh(self, login):
+        """ A successful refresh should log in and release the lock. """
+        self.login_credentials = "[default]\naws_role_arn = someotherarn\n"
+        acquire_refresh_lock('default')
+
+        code, out, _ = self.aws_login('--refresh')
+
+        self.assertEqual((code, out), (0, ''))
+        login.assert_called_once()
+        self.assertTrue(acquire_refresh_lock('default'))
+
+    @patch('awscli_login.credentials.login')
+    def test_refresh_logged_out(self, login):
+        """ A failed refresh should keep the lock until it is stale. """
+        acquire_refresh_lock('default')
+
+        with patch('sys.stderr', new_callable=StringIO):
+            code, _, _ = self.aws_login('--refresh')
+
+        self.assertEqual(code, 3)
+        login.assert_not_called()
+        self.assertFalse(acquire_refresh_lock('default'))
+
+
+class awsLoginSingleFlightTests(StubTestEnvironment):
+    """ Tests concurrent aws-login processes with expired credentials. """
+
+    PROCESSES = 8
+
+    def setUp(self):
+        super().setUp()
+        self.stub = StubServer()
+        self.stub.__enter__()
+        self.addCleanup(self.stub.__exit__)
+
+        self.configure_stub(self.stub, expired=['default'])
+        self.aws_config = "[default]\nregion = us-east-1\n"
+
+    def test_one_idp_request(self):
+        """ Concurrent refreshes should make exactly one IdP request. """
+        env = os.environ.copy()
+        env.pop('XDG_RUNTIME_DIR', None)  # Do not use an agent
+        env['AWSCLI_LOGIN_ROOT'] = self.tmpd.name
+        env['PYTHONPATH'] = os.path.dirname(
+            os.path.dirname(awscli_login.__file__))
+
+        procs = [
+            subprocess.Popen(
+                [sys.executable, '-m', 'awscli_login.credentials',
+                 '--profile', 'default'],
+                env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                text=True)
+            for _ in range(self.PROCESSES)
+        ]
+        results = [proc.communicate() for proc in procs]
+
+        for proc, (out, err) in zip(procs, results):
+            self.assertEqual(proc.returncode, 0, err)
+            self.assertEqual(json.loads(out), {
+                "AccessKeyId": "ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+                "SecretAccessKey": "1234567890",
+                "SessionToken": "reallycooltoken",
+                "Expiration": "2100-07-13T17:54:39+00:00",
+                "Version": 1,
+            })
+        self.assertEqual(self.stub.posts, {IDP_PATH: 1, STS_PATH: 1})
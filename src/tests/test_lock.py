@@ -0,0 +1,88 @@
+import os
+import subprocess
+import sys
+
+from unittest.mock import patch
+
+import awscli_login
+
+from awscli_login.lock import FileLock
+
+from .base import TempDir
+
+# Takes a lock then waits to be killed.
+HOLD_LOCK = """
+import sys, time
+from awscli_login.lock import FileLock
+lock = FileLock(sys.argv[1])
+lock.acquire()
+print('locked', flush=True)
+time.sleep(60)
+"""
+
+
+class FileLockTests(TempDir):
+    """ Tests for the advisory file locks. """
+
+    def setUp(self):
+        super().setUp()
+        self.filename = self._abspath('default')
+
+    def is_free(self) -> bool:
+        """ Return True if the lock can be taken immediately. """
+        lock = FileLock(self.filename, timeout=0)
+        with patch('awscli_login.lock.logger'):
+            free = lock.acquire()
+        lock.release()
+        return free
+
+    def test_acquire_release(self):
+        """ A lock should only be held by one holder at a time. """
+        lock = FileLock(self.filename)
+        other = FileLock(self.filename, timeout=0.1)
+
+        self.assertTrue(lock.acquire())
+        with self.assertLogs('awscli_login.lock', 'WARNING'):
+            self.assertFalse(other.acquire())
+
+        lock.release()
+        lock.release()  # Releasing twice is not an error
+        self.assertTrue(other.acquire())
+        other.release()
+        self.assertHasFilePerms(self.filename, owner='rw')
+
+    def test_context_manager(self):
+        """ A lock should be held within a with statement. """
+        with FileLock(self.filename):
+            self.assertFalse(self.is_free())
+
+        self.assertTrue(self.is_free())
+
+    def test_timeout(self):
+        """ A timed out with statement should run without the lock. """
+        lock = FileLock(self.filename)
+        lock.acquire()
+        self.addCleanup(lock.release)
+
+        with self.assertLogs('awscli_login.lock', 'WARNING') as cm:
+            with FileLock(self.filename, timeout=0.1) as other:
+                self.assertIsNone(other._fd)
+
+        self.assertIn(self.filename, cm.output[0])
+
+    def test_dead_holder(self):
+        """ A lock held by a process that died should be free. """
+        env = os.environ.copy()
+        env['PYTHONPATH'] = os.path.dirname(
+            os.path.dirname(awscli_login.__file__))
+        proc = subprocess.Popen([sys.executable, '-c', HOLD_LOCK,
+                                 self.filename], stdout=subprocess.PIPE,
+                                text=True, env=env)
+        self.assertEqual(proc.stdout.readline(), 'locked\n')
+        self.assertFalse(self.is_free())
+
+        proc.kill()
+        proc.wait()
+        proc.stdout.close()
+
+        self.assertTrue(self.is_free())
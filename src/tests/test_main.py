@@ -1,13 +1,23 @@
+import os
+
 from unittest.mock import (
     patch,
 )
 
+from botocore.session import Session
+
 from awscli_login.__main__ import (
     login,
+    main,
     save_sts_token,
 )
+from awscli_login.const import CREDENTIALS_DIR
+from awscli_login.exceptions import LoginsFailed
 
+from .base import StubTestEnvironment
 from .login import saveStsToken, Login
+from .stub import IDP_PATH, STS_PATH, StubServer
+from .util import login_cli_args
 
 
 class saveStsTokenTests(saveStsToken):
@@ -60,12 +70,18 @@ class LoginTests(Login):
             self.profile.ecp_endpoint_url,
             self.profile.cookies,
             self.profile.verify_ssl_certificate,
+            timeout=self.profile.timeout,
+            max_attempts=self.profile.max_attempts,
+            assertion_file=self.profile.assertion_file,
         )
         self.profile.get_credentials.assert_called()
         authenticate.assert_called_with(
             self.profile.ecp_endpoint_url,
             self.profile.cookies,
             self.profile.verify_ssl_certificate,
+            timeout=self.profile.timeout,
+            max_attempts=self.profile.max_attempts,
+            assertion_file=self.profile.assertion_file,
         )
         get_selection.assert_called_with(["PrincipalArn", "RoleArn"],
                                          self.profile.role_arn, True, {})
@@ -95,6 +111,9 @@ class LoginTests(Login):
             self.profile.ecp_endpoint_url,
             self.profile.cookies,
             self.profile.verify_ssl_certificate,
+            timeout=self.profile.timeout,
+            max_attempts=self.profile.max_attempts,
+            assertion_file=self.profile.assertion_file,
         )
         self.profile.get_credentials.assert_not_called()
         authenticate.assert_not_called()
@@ -126,6 +145,9 @@ class LoginTests(Login):
             self.profile.ecp_endpoint_url,
             self.profile.cookies,
             self.profile.verify_ssl_certificate,
+            timeout=self.profile.timeout,
+            max_attempts=self.profile.max_attempts,
+            assertion_file=self.profile.assertion_file,
         )
         self.profile.get_credentials.assert_not_called()
         authenticate.assert_not_called()
@@ -138,3 +160,78 @@ class LoginTests(Login):
             ["PrincipalArn2", "RoleArn2"],
             self.profile.duration
         )
+
+
+class LoginAllTests(StubTestEnvironment):
+    """ Tests for aws login --all-profiles. """
+
+    def setUp(self):
+        super().setUp()
+        self.aws_config = "[default]\nregion = us-east-1\n"
+
+    def main(self, **kwargs) -> int:
+        return main(login_cli_args(all_profiles=True, **kwargs),
+                    Session(profile='default'))
+
+    def configure(self, stub: StubServer) -> None:
+        """ Configure four profiles using two IdP users. """
+        self.configure_stub(stub, {'default': 'user', 'dev': 'user',
+                                   'prod': 'user', 'other': 'other'})
+
+    def test_login_all(self):
+        """ Each IdP user should log in once for all their profiles. """
+        with StubServer() as stub:
+            self.configure(stub)
+
+            self.assertEqual(self.main(), 0)
+
+            self.assertEqual(stub.posts, {IDP_PATH: 2, STS_PATH: 4})
+        for name in ('default', 'dev', 'prod', 'other'):
+            self.assertIn('aws_access_key_id = ABCDEFGHIJKLMNOPQRSTUVWXYZ',
+                          self.read(os.path.join(CREDENTIALS_DIR, name)))
+
+    def test_logged_in(self):
+        """ Profiles that are logged in should be skipped. """
+        with StubServer() as stub:
+            self.configure(stub)
+            self.main()
+
+            self.assertEqual(self.main(), 0)
+            self.assertEqual(self.main(force_refresh=True), 0)
+
+            self.assertEqual(stub.posts, {IDP_PATH: 4, STS_PATH: 8})
+
+    def test_failed(self):
+        """ A failed login should not stop other IdP users. """
+        with StubServer() as stub:
+            self.configure(stub)
+            stub.failures[STS_PATH] = [403]
+
+            with self.assertLogs('awscli_login', 'ERROR') as logs:
+                self.assertEqual(self.main(), LoginsFailed.code)
+
+            self.assertRegex(logs.output[-1], 'Failed to log in to profile')
+
+            self.assertEqual(stub.posts, {IDP_PATH: 2, STS_PATH: 4})
+        logged_in = [name for name in ('default', 'dev', 'prod', 'other')
+                     if os.path.exists(self._abspath(
+                         os.path.join(CREDENTIALS_DIR, name)))]
+        self.assertEqual(len(logged_in), 3)
+
+    def test_broken_profile(self):
+        """ A profile that can not be loaded should not stop the others. """
+        with StubServer() as stub:
+            self.configure(stub)
+            self.login_config += "[broken]\nusername = user\n"
+
+            with self.assertLogs('awscli_login', 'ERROR') as logs:
+                self.assertEqual(self.main(), LoginsFailed.code)
+
+            self.assertEqual(stub.posts, {IDP_PATH: 2, STS_PATH: 4})
+        self.assertIn('broken: The login profile (broken) is missing '
+                      'argument(s): ecp_endpoint_url!', logs.output[0])
+        self.assertIn('Failed to log in to profile(s): broken',
+                      logs.output[-1])
+        for name in ('default', 'dev', 'prod', 'other'):
+            self.assertTrue(os.path.exists(self._abspath(
+                os.path.join(CREDENTIALS_DIR, name))), name)
@@ -0,0 +1,224 @@
+import os
+import sys
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from os import makedirs
+from unittest.mock import MagicMock, patch
+
+from botocore.exceptions import CredentialRetrievalError
+from botocore.session import Session
+
+import awscli_login
+
+from awscli_login import inject_provider, use_provider
+from awscli_login.cache import write_cache
+from awscli_login.const import CACHE_DIR, JAR_DIR
+from awscli_login.provider import (
+    AWSLoginProvider,
+    insert_provider,
+    is_provider_enabled,
+)
+
+from .base import CleanTestEnvironment, StubTestEnvironment
+from .stub import IDP_PATH, STS_PATH, StubServer
+
+TOKEN = {
+    'Credentials': {
+        'AccessKeyId': 'ABCDEFGHIJKLMNOPQRSTUVWXYZ',
+        'SecretAccessKey': '1234567890',
+        'SessionToken': 'reallycooltoken',
+        'Expiration': '2100-07-13T17:54:39+00:00',
+    }
+}
+
+
+class ProviderEnabledTests(CleanTestEnvironment):
+    """ Tests for selecting the profiles served by the provider. """
+
+    def test_credential_process(self):
+        """ Profiles running aws-login for themselves should be served. """
+        for proc in ('aws-login --profile foo',
+                     '/usr/local/bin/aws-login --profile foo',
+                     'aws-login.exe --profile foo'):
+            self.assertTrue(
+                is_provider_enabled({'credential_process': proc}, 'foo'),
+                proc)
+
+        for proc in ('aws-login --profile bar', 'aws-login --profile',
+                     'aws-login', 'foo --profile foo'):
+            self.assertFalse(
+                is_provider_enabled({'credential_process': proc}, 'foo'),
+                proc)
+
+    def test_provider_variable(self):
+        """ Profiles setting aws_login_provider should be served. """
+        self.assertTrue(is_provider_enabled(
+            {'aws_login_provider': 'true'}, 'foo'))
+        self.assertFalse(is_provider_enabled(
+            {'aws_login_provider': 'false'}, 'foo'))
+        self.assertFalse(is_provider_enabled({}, 'foo'))
+
+
+class ProviderTests(StubTestEnvironment):
+    """ Tests for the in-process credential provider. """
+
+    def setUp(self):
+        super().setUp()
+        self._clear_environ('AWSCLI_LOGIN_PROVIDER')
+        self._clear_environ('AWSCLI_LOGIN_SUBPROCESS')
+        self.aws_config = "[default]\nregion = us-east-1\n"
+        self.aws_credentials = \
+            "[default]\ncredential_process = aws-login --profile default\n"
+
+    def session(self) -> Session:
+        session = Session()
+        insert_provider(session)
+        return session
+
+    def test_insert_provider(self):
+        """ The provider should run before the credential_process. """
+        resolver = self.session().get_component('credential_provider')
+        methods = [p.METHOD for p in resolver.providers]
+
+        self.assertEqual(methods.index('awscli-login') + 1,
+                         methods.index('custom-process'))
+
+    def test_use_provider(self):
+        """ The provider should be used unless disabled or frozen. """
+        self._set_environ('AWSCLI_LOGIN_SUBPROCESS', '1')
+        self.assertTrue(use_provider())
+
+        with patch.object(sys, 'frozen', True, create=True):
+            self.assertFalse(use_provider())
+
+            self._set_environ('AWSCLI_LOGIN_PROVIDER', '1')
+            self.assertTrue(use_provider())
+
+        self._set_environ('AWSCLI_LOGIN_PROVIDER', '0')
+        self.assertFalse(use_provider())
+
+    def test_inject_provider_disabled(self):
+        """ The provider should not be inserted if it is disabled. """
+        self._set_environ('AWSCLI_LOGIN_PROVIDER', '0')
+        session = MagicMock()
+
+        inject_provider(session)
+
+        session.get_component.assert_not_called()
+
+    @patch('subprocess.Popen')
+    def test_cached_credentials(self, popen):
+        """ Cached credentials should be served without aws-login. """
+        makedirs(self._abspath(CACHE_DIR))
+        write_cache(self._abspath(os.path.join(CACHE_DIR, 'default')), TOKEN)
+
+        creds = self.session().get_credentials()
+
+        self.assertEqual(creds.method, 'awscli-login')
+        frozen = creds.get_frozen_credentials()
+        self.assertEqual(frozen.access_key, 'ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+        self.assertEqual(frozen.secret_key, '1234567890')
+        self.assertEqual(frozen.token, 'reallycooltoken')
+        popen.assert_not_called()
+
+    def test_not_served(self):
+        """ Other profiles should fall through to other providers. """
+        self.aws_credentials = "[default]\n" \
+            "aws_access_key_id = foo\naws_secret_access_key = bar\n"
+
+        creds = self.session().get_credentials()
+
+        self.assertEqual(creds.method, 'shared-credentials-file')
+        self.assertIsNone(AWSLoginProvider(Session()).load())
+
+    def test_logged_out(self):
+        """ Login errors should be raised as retrieval errors. """
+        self.login_config = "[default]\n" \
+            "ecp_endpoint_url = https://idp.example.com/ecp\n"
+
+        with self.assertRaisesRegex(CredentialRetrievalError,
+                                    'Already logged out'):
+            self.session().get_credentials()
+
+    def expire(self, stub: StubServer) -> None:
+        """ Configure an expired login profile using `stub`. """
+        self.configure_stub(stub, expired=['default'])
+
+    def test_cookies_expired(self):
+        """ Expired IdP cookies should fail without contacting the IdP. """
+        with StubServer() as stub:
+            self.expire(stub)
+            self.write(os.path.join(JAR_DIR, 'user.txt'), "#LWP-Cookies-2.0\n")
+
+            with self.assertRaisesRegex(CredentialRetrievalError,
+                                        'No unexpired IdP session cookies'):
+                self.session().get_credentials()
+
+            self.assertEqual(stub.posts, {})
+
+    def test_expiring_cache(self):
+        """ Cached credentials about to expire should be refreshed. """
+        makedirs(self._abspath(CACHE_DIR))
+        expiring = {'Credentials': dict(
+            TOKEN['Credentials'],
+            Expiration=datetime.now(timezone.utc) + timedelta(minutes=5))}
+        write_cache(self._abspath(os.path.join(CACHE_DIR, 'default')),
+                    expiring)
+
+        with StubServer() as stub:
+            self.expire(stub)
+            creds = self.session().get_credentials()
+
+            self.assertEqual(stub.posts, {IDP_PATH: 1, STS_PATH: 1})
+        self.assertEqual(creds._expiry_time.year, 2100)
+
+    def test_login(self):
+        """ Expired credentials should be refreshed in process. """
+        with StubServer() as stub:
+            self.expire(stub)
+            session = self.session()
+
+            creds = session.get_credentials()
+
+            self.assertEqual(stub.posts, {IDP_PATH: 1, STS_PATH: 1})
+        self.assertEqual(creds.access_key, 'ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+        self.assertIs(session.get_credentials(), creds)
+
+
+class SessionTests(ProviderTests):
+    """ Tests for sessions returned by awscli_login.session. """
+
+    def session(self) -> Session:
+        return awscli_login.session()
+
+    def test_insert_provider(self):
+        """ The session should only use the login profile. """
+        resolver = self.session().get_component('credential_provider')
+
+        self.assertEqual([p.METHOD for p in resolver.providers],
+                         ['awscli-login'])
+
+    def test_not_served(self):
+        """ Profiles should be served without a credential_process. """
+        self.aws_credentials = "[default]\nregion = us-east-1\n"
+        makedirs(self._abspath(CACHE_DIR))
+        write_cache(self._abspath(os.path.join(CACHE_DIR, 'default')), TOKEN)
+
+        creds = self.session().get_credentials()
+
+        self.assertEqual(creds.method, 'awscli-login')
+
+    def test_threads_share_refresh(self):
+        """ Concurrent threads should share one login. """
+        with StubServer() as stub:
+            self.expire(stub)
+            session = self.session()
+
+            with ThreadPoolExecutor(8) as pool:
+                keys = list(pool.map(
+                    lambda _: session.get_credentials().access_key,
+                    range(8)))
+
+            self.assertEqual(stub.posts, {IDP_PATH: 1, STS_PATH: 1})
+        self.assertEqual(set(keys), {'ABCDEFGHIJKLMNOPQRSTUVWXYZ'})
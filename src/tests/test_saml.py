@@ -1,29 +1,50 @@
+import json
+import os
+import pickle
 import requests
+import socket
 import tempfile
 import unittest
+import xml.etree.ElementTree as StdlibET
 
+from base64 import b64decode
 from datetime import datetime
+from http.cookiejar import LWPCookieJar
+from io import BytesIO
 from os import path
 from os.path import dirname, abspath
-from requests.exceptions import HTTPError
+from requests.exceptions import ConnectionError, HTTPError, ReadTimeout
 from typing import Optional
 from unittest.mock import patch, MagicMock
 
-from lxml.etree import XMLSyntaxError
+from lxml.etree import XMLSyntaxError, fromstring, tostring
+
+import awscli_login.saml
 
 from awscli_login.saml import (
+    _parse_instant,
     authenticate,
     authn_request,
+    backoff,
+    has_live_cookie,
+    iter_saml,
     parse_role_arns,
+    parse_role_values,
     parse_soap_response,
+    read_content,
     refresh,
     raise_if_saml_failed,
+    saml_login,
+    SamlResponse,
 )
 
 from awscli_login.exceptions import (
     AuthnFailed,
+    CookiesExpired,
     InvalidSOAP,
+    LxmlRequired,
     MissingCookieJar,
+    ResponseTooLarge,
     RoleParseFail,
 )
 from awscli_login.util import (
@@ -31,6 +52,11 @@ from awscli_login.util import (
     file2bytes,
 )
 
+from awscli_login.transport import transport as get_transport
+from awscli_login._typing import RoleArn
+
+from .stub import COOKIES, DROP, IDP_PATH, StubServer, tls_context
+
 DATA = path.join(dirname(abspath(__file__)), 'data')
 
 ARN = 'arn:aws:iam::378517677616:'
@@ -41,11 +67,19 @@ SAML_SUCCESS_ARNS = [(
 )]
 
 SAML_SUCCESS_B64 = file2str(path.join(DATA, 'success.b64'))
+# The Response element of success.xml exactly as the IdP sent it
+SAML_RESPONSE_B64 = file2str(path.join(DATA, 'response.b64'))
 SAML_AUTHNFAILED = file2bytes(path.join(DATA, 'error.xml'))
 SAML_AUTHNFAILED_HTML = file2bytes(path.join(DATA, 'error.html'))
 AUTHNREQUEST = file2bytes(path.join(DATA, 'authnrequest.xml'))
 
 
+def c14n(assertion: str) -> bytes:
+    """ Return the exclusive canonical form of an encoded assertion. """
+    xml = fromstring(b64decode(assertion))
+    return tostring(xml, method='c14n', exclusive=True)
+
+
 class saml(unittest.TestCase):
     """ Tests various SAML helper functions """
     maxDiff = None
@@ -76,9 +110,107 @@ class saml(unittest.TestCase):
         """ Given a SAML response PSR should return roles and assertion. """
         assertion, arns = parse_soap_response(SAML_SUCCESS)
 
-        self.assertEqual(assertion, SAML_SUCCESS_B64)
+        self.assertEqual(assertion, SAML_RESPONSE_B64)
         self.assertEqual(arns, SAML_SUCCESS_ARNS)
 
+    def test_saml_response(self):
+        """ A SamlResponse should expose its status, roles and assertion. """
+        response = SamlResponse(SAML_SUCCESS)
+
+        self.assertTrue(response.success)
+        self.assertEqual(response.roles, SAML_SUCCESS_ARNS)
+        self.assertEqual(response.expires, datetime(2018, 2, 20, 13, 57, 10))
+        self.assertEqual(response.assertion, SAML_RESPONSE_B64)
+        self.assertEqual(tuple(response),
+                         (SAML_RESPONSE_B64, SAML_SUCCESS_ARNS))
+
+    def test_saml_response_failed(self):
+        """ A failed SamlResponse should raise AuthnFailed. """
+        response = SamlResponse(SAML_AUTHNFAILED)
+
+        self.assertFalse(response.success)
+        self.assertEqual(response.status,
+                         'urn:oasis:names:tc:SAML:2.0:status:Requester')
+        with self.assertRaises(AuthnFailed):
+            response.raise_if_failed()
+
+    def test_saml_response_parsed_once(self):
+        """ A SamlResponse should only parse its SOAP response once. """
+        iterparse = awscli_login.saml.ET.iterparse
+
+        with patch('awscli_login.saml.ET.iterparse',
+                   side_effect=iterparse) as mock, \
+                patch('awscli_login.saml.ET.fromstring') as fromstring:
+            response = SamlResponse(SAML_SUCCESS)
+            response.raise_if_failed()
+            tuple(response)
+            response.expires
+
+        mock.assert_called_once()
+        fromstring.assert_not_called()
+
+    def test_iter_saml(self):
+        """ iter_saml should yield the status, limits and roles. """
+        events = [(kind, value) for kind, value in
+                  iter_saml(BytesIO(SAML_SUCCESS)) if kind != 'response']
+
+        self.assertEqual(events, [
+            ('status', 'urn:oasis:names:tc:SAML:2.0:status:Success'),
+            ('expires', '2018-02-20T13:57:10.051Z'),
+            ('expires', '2018-02-20T13:57:10.047Z'),
+            ('role', ','.join(SAML_SUCCESS_ARNS[0])),
+        ])
+
+    def test_assertion_canonical(self):
+        """ The encoded assertion should be the Response STS expects. """
+        assertion = SamlResponse(SAML_SUCCESS).assertion
+
+        self.assertEqual(c14n(assertion), c14n(SAML_SUCCESS_B64))
+
+    def test_assertion_zero_copy(self):
+        """ The Response should be encoded without serializing it. """
+        with patch('awscli_login.saml.ET.tostring') as mock:
+            assertion = SamlResponse(SAML_SUCCESS).assertion
+
+        mock.assert_not_called()
+        self.assertIn(b64decode(assertion), SAML_SUCCESS)
+
+    def test_assertion_inherited_namespaces(self):
+        """ Namespaces declared by the envelope should be declared. """
+        soap = SAML_SUCCESS.replace(
+            b' xmlns:saml2p="urn:oasis:names:tc:SAML:2.0:protocol"', b''
+        ).replace(
+            b'<soap11:Envelope ', b'<soap11:Envelope xmlns:saml2p='
+            b'"urn:oasis:names:tc:SAML:2.0:protocol" ')
+
+        with patch('awscli_login.saml.ET.tostring') as mock:
+            assertion = SamlResponse(soap).assertion
+
+        mock.assert_not_called()
+        self.assertEqual(c14n(assertion), c14n(SAML_SUCCESS_B64))
+
+    def test_assertion_comments(self):
+        """ Comments and PIs around the Response should not be encoded. """
+        soap = SAML_SUCCESS.replace(
+            b'<soap11:Body>', b'<soap11:Body><!-- a\n- b -->\n<?pi x?>'
+        ).replace(
+            b'</saml2p:Response>', b'</saml2p:Response><!-- c -->')
+
+        with patch('awscli_login.saml.ET.tostring') as mock:
+            assertion = SamlResponse(soap).assertion
+
+        mock.assert_not_called()
+        self.assertEqual(c14n(assertion), c14n(SAML_SUCCESS_B64))
+
+    def test_assertion_serialized(self):
+        """ Responses that can not be located should be serialized. """
+        soap = SAML_SUCCESS.replace(b'</saml2p:Response>',
+                                    b'</saml2p:Response><extra/>')
+
+        assertion = SamlResponse(soap).assertion
+
+        self.assertEqual(assertion, SAML_SUCCESS_B64)
+
     def test_parse_role_arns(self):
         """ Given bad soap PRA should throw a SAML exception. """
         class role:
@@ -87,19 +219,147 @@ class saml(unittest.TestCase):
         with self.assertRaises(RoleParseFail):
             parse_role_arns([role(), role()])
 
+    def test_parse_role_values(self):
+        """ Pairs of ARNs may be in either order, several to a value. """
+        provider, role = SAML_SUCCESS_ARNS[0]
+        gov = 'arn:aws-us-gov:iam::123456789012:'
+
+        self.assertEqual(parse_role_values([
+            f'{provider},{role}',
+            f' {role} , {provider} ',
+            f'{provider},{role},{gov}role/a/b,{gov}saml-provider/idp',
+        ]), [
+            (provider, role),
+            (provider, role),
+            (provider, role),
+            (gov + 'saml-provider/idp', gov + 'role/a/b'),
+        ])
+
+    def test_parse_role_values_fields(self):
+        """ Role ARNs should be returned as RoleArns. """
+        provider = 'arn:aws-cn:iam::123456789012:saml-provider/idp'
+        role = 'arn:aws-cn:iam::123456789012:role/a/b/Admin'
+
+        arn, = parse_role_values([f'{role},{provider}'])
+
+        self.assertIsInstance(arn, RoleArn)
+        self.assertEqual(arn, (provider, role))
+        self.assertEqual((arn.provider, arn.arn), (provider, role))
+        self.assertEqual(arn.partition, 'aws-cn')
+        self.assertEqual(arn.account_id, '123456789012')
+        self.assertEqual(arn.path, '/a/b/')
+        self.assertEqual(arn.name, 'Admin')
+        self.assertFalse(hasattr(arn, '__dict__'))
+
+    def test_role_arn_tuple(self):
+        """ RoleArns should behave like (provider, role) tuples. """
+        provider, role = SAML_SUCCESS_ARNS[0]
+        pair = (provider, role)
+        arn = RoleArn(provider, role)
+
+        self.assertEqual((len(arn), list(arn), arn[-1], arn[:]),
+                         (2, list(pair), role, pair))
+        self.assertEqual(hash(arn), hash(pair))
+        self.assertEqual({pair: 1}[arn], 1)
+        self.assertFalse(arn != pair or pair != arn)
+        self.assertFalse(arn < pair or pair < arn)
+        self.assertEqual(repr(arn), repr(pair))
+        self.assertEqual(json.loads(json.dumps([arn])), [list(pair)])
+        self.assertEqual(pickle.loads(pickle.dumps(arn)).name,
+                         'TestShibAdmin')
+
+    def test_role_arn_invalid(self):
+        """ RoleArns should only hold role ARNs. """
+        provider, role = SAML_SUCCESS_ARNS[0]
+
+        for arn in (provider, 'role/Admin', f'{role}/', f'{role}:x',
+                    'arn:aws:iam:us-east-1:123456789012:role/Admin'):
+            with self.assertRaises(ValueError, msg=arn):
+                RoleArn(provider, arn)
+
+    def test_parse_role_values_bad(self):
+        """ Values without pairs of ARNs should fail to parse. """
+        provider, role = SAML_SUCCESS_ARNS[0]
+
+        for value in ('', provider, f'{role},{role}',
+                      f'{provider},{role},{role}',
+                      f'{provider},{ARN}user/bob',
+                      f'{provider},{role}:x',
+                      f'{provider},arn:aws:iam::abc:role/x',
+                      f'{provider},arn:aws:iam:us-east-1:1:role/x'):
+            with self.assertRaises(RoleParseFail, msg=value):
+                parse_role_values([value])
+
+
+@patch('awscli_login.saml.ET', StdlibET)
+class stdlib(unittest.TestCase):
+    """ Tests for parsing SAML responses without lxml. """
+
+    def tearDown(self):
+        awscli_login.saml._assertions.clear()
+
+    def test_saml_response(self):
+        """ A SamlResponse should be parsed by the standard library. """
+        response = SamlResponse(SAML_SUCCESS)
+
+        self.assertTrue(response.success)
+        self.assertEqual(response.roles, SAML_SUCCESS_ARNS)
+        self.assertEqual(response.expires, datetime(2018, 2, 20, 13, 57, 10))
+        self.assertEqual(response.assertion, SAML_RESPONSE_B64)
+
+    def test_saml_authnfailed(self):
+        """ Failed responses should raise AuthnFailed. """
+        with self.assertRaises(AuthnFailed):
+            raise_if_saml_failed(SAML_AUTHNFAILED)
+
+    def test_saml_bad_soap(self):
+        """ HTML should raise a ParseError. """
+        with self.assertRaises(StdlibET.ParseError):
+            raise_if_saml_failed(SAML_AUTHNFAILED_HTML)
+
+    def test_assertion_serialized(self):
+        """ Responses that must be serialized should require lxml. """
+        soap = SAML_SUCCESS.replace(b'</saml2p:Response>',
+                                    b'</saml2p:Response><extra/>')
+
+        with self.assertRaises(LxmlRequired):
+            SamlResponse(soap).assertion
+
+    def test_refresh(self):
+        """ Logins should not require lxml. """
+        with tempfile.TemporaryDirectory() as tempdir, \
+                StubServer() as stub:
+            cookies = path.join(tempdir, 'cookies.txt')
+            with open(cookies, 'w') as f:
+                f.write(COOKIES)
+
+            assertion, roles = refresh(stub.url(IDP_PATH), cookies)
+
+        self.assertEqual(roles, SAML_SUCCESS_ARNS)
+        self.assertEqual(c14n(assertion), c14n(SAML_SUCCESS_B64))
+
 
 class auth(unittest.TestCase):
     """ Tests for saml.authenticate and saml.refresh. """
     maxDiff = None
+    IDP_HOST = "shibboleth-test.techservices.illinois.edu"
 
     class MockRespone:
         """ A class for mocking a requests' response. """
         status_code: int = 0
         content: Optional[bytes] = None
+        headers: dict = {}
 
         def raise_for_status(self):
             pass
 
+        def iter_content(self, chunk_size=1):
+            for i in range(0, len(self.content), chunk_size):
+                yield self.content[i:i + chunk_size]
+
+        def close(self):
+            pass
+
     class Success(MockRespone):
         status_code = 200
         content = SAML_SUCCESS
@@ -137,9 +397,7 @@ class auth(unittest.TestCase):
         )
 
     def setUp(self):
-        idphost = "shibboleth-test.techservices.illinois.edu"
-
-        self.URL = "https://" + idphost + "/idp/profile/SAML2/SOAP/ECP"
+        self.URL = "https://" + self.IDP_HOST + "/idp/profile/SAML2/SOAP/ECP"
         self.cookies = 'cookies.txt'
 
     @patch('awscli_login.saml.Session')
@@ -164,7 +422,7 @@ class auth(unittest.TestCase):
             cookies = path.join(tempdir, 'cookies.txt')
             if create_cookies:
                 with open(cookies, 'w') as f:
-                    f.write('#LWP-Cookies-2.0')
+                    f.write(COOKIES.replace('127.0.0.1', self.IDP_HOST))
 
             encoded, arns = test_func(cookies)
 
@@ -174,7 +432,7 @@ class auth(unittest.TestCase):
     def test_authenticate_with_username_password(self):
         """ Simulates successful auth with username/password. """
         idp = [self.Success()]
-        self.auth_test(idp, SAML_SUCCESS_B64, SAML_SUCCESS_ARNS,
+        self.auth_test(idp, SAML_RESPONSE_B64, SAML_SUCCESS_ARNS,
                        self.auth)
 
     def test_authenticate_bad_login_401(self):
@@ -201,7 +459,7 @@ class auth(unittest.TestCase):
     def test_refresh_with_cookies(self):
         """ Simulates successful refresh with cookies. """
         idp = [self.Success()]
-        self.auth_test(idp, SAML_SUCCESS_B64, SAML_SUCCESS_ARNS, self.refresh,
+        self.auth_test(idp, SAML_RESPONSE_B64, SAML_SUCCESS_ARNS, self.refresh,
                        create_cookies=True)
 
     def test_refresh_bad_login_401(self):
@@ -225,6 +483,14 @@ class auth(unittest.TestCase):
         with self.assertRaises(InvalidSOAP):
             self.auth_test(idp, "", {}, self.refresh, create_cookies=True)
 
+    def test_read_content_too_large(self):
+        """ Streamed responses should be refused once too large. """
+        response = self.Success()
+
+        with self.assertRaises(ResponseTooLarge):
+            read_content(response, self.URL, max_size=100)
+        self.assertEqual(read_content(response, self.URL), SAML_SUCCESS)
+
     def test_refresh_no_cookie_jar(self):
         """ Simulates a no cookie jar found error on refresh. """
         idp = [self.FailureSoap()]
@@ -233,6 +499,304 @@ class auth(unittest.TestCase):
             self.auth_test(idp, "", {}, self.refresh, create_cookies=False)
 
 
+class transport(unittest.TestCase):
+    """ Tests for sharing connections to an IdP. """
+
+    def test_refresh_then_authenticate(self):
+        """ Falling back to authenticate should reuse the connection. """
+        with StubServer() as stub, tempfile.TemporaryDirectory() as tempdir:
+            url = stub.url(IDP_PATH)
+            cookies = path.join(tempdir, 'cookies.txt')
+            with open(cookies, 'w') as f:
+                f.write(COOKIES)
+
+            refresh(url, cookies)
+            authenticate(url, cookies, 'user', 'pass', {})
+
+            self.assertEqual(stub.posts, {IDP_PATH: 2})
+            self.assertEqual(stub.connections, 1)
+
+    def test_tls_session_resumed(self):
+        """ New connections should resume the last TLS session. """
+        with StubServer(tls_context()) as stub, \
+                tempfile.TemporaryDirectory() as tempdir:
+            url = stub.url(IDP_PATH)
+            cookies = path.join(tempdir, 'cookies.txt')
+            with open(cookies, 'w') as f:
+                f.write(COOKIES)
+
+            for _ in range(3):
+                refresh(url, cookies, verify_cert=False)
+                get_transport(url, False)[1].close()  # Drop connection
+
+            self.assertEqual(stub.connections, 3)
+            self.assertEqual(stub.resumed, 2)
+
+
+class cookies(unittest.TestCase):
+    """ Tests for skipping refreshes with expired cookies. """
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.cookies = path.join(self.tempdir.name, 'cookies.txt')
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def jar(self, *cookies: str) -> LWPCookieJar:
+        with open(self.cookies, 'w') as f:
+            f.write('#LWP-Cookies-2.0\n')
+            for cookie in cookies:
+                f.write(f'Set-Cookie3: {cookie}; version=0\n')
+
+        jar = LWPCookieJar(self.cookies)
+        jar.load(ignore_discard=True)
+        return jar
+
+    def test_has_live_cookie(self):
+        """ Unexpired cookies for the IdP host should be found. """
+        url = 'https://idp.example.com/ecp'
+        for cookie in ('a=b; path="/"; domain="idp.example.com"; discard',
+                       'a=b; path="/"; domain=".example.com"; discard',
+                       'a=b; path="/"; domain="IDP.example.com"; '
+                       'expires="2100-01-01 00:00:00Z"'):
+            self.assertTrue(has_live_cookie(self.jar(cookie), url), cookie)
+
+        for cookie in ('a=b; path="/"; domain="other.example.com"; discard',
+                       'a=b; path="/"; domain="example.org"; discard',
+                       'a=b; path="/"; domain="idp.example.com"; '
+                       'expires="2000-01-01 00:00:00Z"'):
+            self.assertFalse(has_live_cookie(self.jar(cookie), url), cookie)
+
+    def test_refresh_expired(self):
+        """ Refreshing with expired cookies should not contact the IdP. """
+        with StubServer() as stub:
+            self.jar('a=b; path="/"; domain="127.0.0.1"; '
+                     'expires="2000-01-01 00:00:00Z"')
+
+            with self.assertRaises(CookiesExpired):
+                refresh(stub.url(IDP_PATH), self.cookies)
+
+            self.assertEqual(stub.posts, {})
+
+
+@patch('awscli_login.saml.sleep')
+class retry(unittest.TestCase):
+    """ Tests for timeouts, retries and limits of requests to an IdP. """
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.cookies = path.join(self.tempdir.name, 'cookies.txt')
+        with open(self.cookies, 'w') as f:
+            f.write(COOKIES)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_backoff(self, sleep):
+        """ Backoff should grow with each attempt up to a limit. """
+        with patch('awscli_login.saml.uniform', lambda a, b: b):
+            self.assertEqual([backoff(n) for n in range(1, 7)],
+                             [1.0, 2.0, 4.0, 8.0, 10.0, 10.0])
+
+    def test_response_too_large(self, sleep):
+        """ Responses longer than max_size should be refused. """
+        jar = LWPCookieJar(self.cookies)
+        jar.load(ignore_discard=True)
+
+        with StubServer() as stub:
+            with self.assertRaises(ResponseTooLarge):
+                saml_login(stub.url(IDP_PATH), jar, max_size=100)
+
+    def test_response_not_logged(self, sleep):
+        """ Responses should not be logged, since they may be huge. """
+        with StubServer() as stub:
+            with self.assertLogs('awscli_login.saml', 'DEBUG') as logs:
+                refresh(stub.url(IDP_PATH), self.cookies)
+
+        self.assertIn('POST returned 200 with', '\n'.join(logs.output))
+        self.assertNotIn('TestShibAdmin', '\n'.join(logs.output))
+
+    def login(self, url: str) -> SamlResponse:
+        """ Logs in to `url` with a username and password. """
+        jar = LWPCookieJar(self.cookies)
+        jar.load(ignore_discard=True)
+        return saml_login(url, jar, 'user', 'secret')
+
+    def test_server_errors(self, sleep):
+        """ Server errors and dropped refreshes should be retried. """
+        with StubServer() as stub:
+            stub.failures[IDP_PATH] = [503, DROP]
+
+            with self.assertLogs('awscli_login.saml', 'INFO') as logs:
+                refresh(stub.url(IDP_PATH), self.cookies)
+
+            self.assertEqual(stub.posts, {IDP_PATH: 3})
+        self.assertEqual(sleep.call_count, 2)
+        retries = [r.getMessage() for r in logs.records
+                   if r.levelname == 'WARNING']
+        self.assertIn('(attempt 1 of 3): 503', retries[0])
+        self.assertIn('(attempt 2 of 3)', retries[1])
+
+    def test_max_attempts(self, sleep):
+        """ The last server error should be raised. """
+        with StubServer() as stub:
+            stub.failures[IDP_PATH] = [500, 502, 503]
+
+            with self.assertRaises(HTTPError), \
+                    self.assertLogs('awscli_login.saml', 'WARNING'):
+                refresh(stub.url(IDP_PATH), self.cookies, max_attempts=2)
+
+            self.assertEqual(stub.posts, {IDP_PATH: 2})
+        self.assertEqual(sleep.call_count, 1)
+
+    def test_client_errors(self, sleep):
+        """ Client errors should not be retried. """
+        with StubServer() as stub:
+            stub.failures[IDP_PATH] = [401]
+
+            with self.assertRaises(HTTPError):
+                refresh(stub.url(IDP_PATH), self.cookies)
+
+            self.assertEqual(stub.posts, {IDP_PATH: 1})
+        sleep.assert_not_called()
+
+    def test_connection_refused(self, sleep):
+        """ Failed connections should be retried. """
+        with socket.socket() as sock:  # Reserve a port nobody listens on
+            sock.bind(('127.0.0.1', 0))
+            url = f"http://127.0.0.1:{sock.getsockname()[1]}{IDP_PATH}"
+
+            with self.assertRaises(ConnectionError), \
+                    self.assertLogs('awscli_login.saml', 'WARNING'):
+                refresh(url, self.cookies)
+
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_login_server_errors(self, sleep):
+        """ Server errors should not be retried after sending a password. """
+        with StubServer() as stub:
+            stub.failures[IDP_PATH] = [503]
+
+            with self.assertRaises(HTTPError):
+                self.login(stub.url(IDP_PATH))
+
+            self.assertEqual(stub.posts, {IDP_PATH: 1})
+        sleep.assert_not_called()
+
+    def test_login_dropped(self, sleep):
+        """ Dropped connections should not be retried after a password. """
+        with StubServer() as stub:
+            stub.failures[IDP_PATH] = [DROP]
+
+            with self.assertRaises(ConnectionError):
+                self.login(stub.url(IDP_PATH))
+
+            self.assertEqual(stub.posts, {IDP_PATH: 1})
+        sleep.assert_not_called()
+
+    def test_login_connection_refused(self, sleep):
+        """ Connections refused before sending a password are retried. """
+        with socket.socket() as sock:  # Reserve a port nobody listens on
+            sock.bind(('127.0.0.1', 0))
+            url = f"http://127.0.0.1:{sock.getsockname()[1]}{IDP_PATH}"
+
+            with self.assertRaises(ConnectionError), \
+                    self.assertLogs('awscli_login.saml', 'WARNING'):
+                self.login(url)
+
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_read_timeout(self, sleep):
+        """ Slow responses should time out without a retry. """
+        with StubServer() as stub:
+            stub.delay = 0.5
+
+            with self.assertRaises(ReadTimeout):
+                refresh(stub.url(IDP_PATH), self.cookies, timeout=(1, 0.1))
+
+            self.assertEqual(stub.posts, {IDP_PATH: 1})
+        sleep.assert_not_called()
+
+
+@patch('awscli_login.saml.utcnow',
+       return_value=datetime(2018, 2, 20, 13, 53, 0))
+class assertions(unittest.TestCase):
+    """ Tests for caching SAML assertions until they expire. """
+
+    def setUp(self):
+        awscli_login.saml._assertions.clear()
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.cookies = path.join(self.tempdir.name, 'cookies.txt')
+        with open(self.cookies, 'w') as f:
+            f.write(COOKIES)
+
+    def tearDown(self):
+        awscli_login.saml._assertions.clear()
+        self.tempdir.cleanup()
+
+    def test_parse_instant(self, utcnow):
+        """ SAML timestamps should be parsed to UTC. """
+        expected = datetime(2018, 2, 20, 13, 57, 10)
+        for value in ('2018-02-20T13:57:10Z', '2018-02-20T13:57:10.0512345Z',
+                      '2018-02-20T07:57:10.051-06:00', '2018-02-20T13:57:10'):
+            self.assertEqual(_parse_instant(value), expected, value)
+
+    def test_expiration(self, utcnow):
+        """ The assertion should expire with its earliest limit. """
+        self.assertEqual(SamlResponse(SAML_SUCCESS).expires,
+                         datetime(2018, 2, 20, 13, 57, 10))
+
+    def test_refresh(self, utcnow):
+        """ Unexpired assertions should be used without the IdP. """
+        with StubServer() as stub:
+            url = stub.url(IDP_PATH)
+            first = refresh(url, self.cookies)
+
+            second = refresh(url, self.cookies)
+            authenticate(url, self.cookies, 'user', 'pass', {})
+
+            self.assertEqual(stub.posts, {IDP_PATH: 2})
+        self.assertEqual(tuple(first), (SAML_RESPONSE_B64, SAML_SUCCESS_ARNS))
+        self.assertEqual(second, first)
+
+    def test_expiring(self, utcnow):
+        """ Assertions about to expire should not be used. """
+        with StubServer() as stub:
+            url = stub.url(IDP_PATH)
+            refresh(url, self.cookies)
+
+            utcnow.return_value = datetime(2018, 2, 20, 13, 56, 30)
+            refresh(url, self.cookies)
+
+            self.assertEqual(stub.posts, {IDP_PATH: 2})
+
+    def test_other_endpoint(self, utcnow):
+        """ Assertions should only be used for their endpoint and jar. """
+        with StubServer() as stub, StubServer() as other:
+            refresh(stub.url(IDP_PATH), self.cookies)
+
+            refresh(other.url(IDP_PATH), self.cookies)
+
+            self.assertEqual(other.posts, {IDP_PATH: 1})
+
+    def test_file(self, utcnow):
+        """ Assertions cached in a file should be shared. """
+        filename = path.join(self.tempdir.name, 'assertions', 'user.json')
+
+        with StubServer() as stub:
+            url = stub.url(IDP_PATH)
+            first = refresh(url, self.cookies, assertion_file=filename)
+            awscli_login.saml._assertions.clear()  # As in a new process
+
+            second = refresh(url, self.cookies, assertion_file=filename)
+
+            self.assertEqual(stub.posts, {IDP_PATH: 1})
+        self.assertEqual(tuple(second), tuple(first))
+        if os.name == 'posix':
+            self.assertEqual(os.stat(filename).st_mode & 0o777, 0o600)
+
+
 if __name__ == '__main__':
     suite = unittest.TestSuite()
     unittest.main()
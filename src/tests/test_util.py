@@ -11,6 +11,7 @@ from unittest.mock import patch
 from botocore.session import Session
 
 from awscli_login.const import ERROR_INVALID_PROFILE_ROLE
+from awscli_login._typing import RoleArn
 from awscli_login.exceptions import (
     CredentialProcessMisconfigured,
     CredentialProcessNotSet,
@@ -238,6 +239,17 @@ class util(unittest.TestCase):
             '\nExpected: %s' % (output, expected)
         )
 
+    def test_sort_roles_paths(self):
+        """ Roles with paths should be listed by name. """
+        roles = [
+            RoleArn('idp', 'arn:aws:iam::224588347132:role/a/b/Zed'),
+            ('idp', 'arn:aws:iam::224588347132:role/z/Admin'),
+        ]
+
+        self.assertEqual(sort_roles(roles), [
+            ('224588347132', [(1, 'Admin'), (0, 'Zed')]),
+        ])
+
     def test_config_vcr(self):
         self.assertEqual(config_vcr(Namespace()), (None, None))
 
@@ -277,6 +289,15 @@ class SaveDefaultCreds(CleanAWSEnvironment):
                           raise_if_credential_process_not_set,
                           session, self.profile)
 
+    def test_credential_provider(self):
+        """Ensure the plugin's credential provider is accepted"""
+        self.profile = 'default'
+        self.aws_credentials = """[default]
+        aws_login_provider = true
+        """
+        session = Session()
+        raise_if_credential_process_not_set(session, self.profile)
+
     def test_credential_process_valid(self):
         """Ensure does not raise exception"""
         self.profile = 'default'
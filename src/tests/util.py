@@ -100,7 +100,7 @@ def fork():
     return decorator
 
 
-# Defaults MUST match defaults in __main__.py:class Login:ARG_TABLE!
+# Defaults MUST match defaults in commands.py:class Login:ARG_TABLE!
 def login_cli_args(
     # Basic Properites (can be set interactively)
     ecp_endpoint_url=None,
@@ -114,7 +114,13 @@ def login_cli_args(
     http_header_factor=None,
     http_header_passcode=None,
     verify_ssl_certificate=True,
+    refresh_ahead=None,
+    connect_timeout=None,
+    read_timeout=None,
+    max_attempts=None,
+    cache_saml_assertion=None,
     # CLI only
+    all_profiles=False,
     ask_password=False,
     force_refresh=False,
     verbose=0,